@@ -0,0 +1,622 @@
+"""
+AVL tree stored as a struct of arrays instead of one object per node.
+"""
+from array import array
+from BinaryTree import BinaryTree
+from snapshot import write_snapshot
+
+# index of the sentinel that stands in for an empty subtree
+NIL = 0
+
+
+class ArrayAVLTree(BinaryTree):
+    """
+    AVL tree whose nodes are indices into typed arrays holding the keys,
+    the left and right child indices, the heights and the subtree sizes. The arrays are flat
+    buffers, so the garbage collector never has to scan the nodes, and
+    freed slots are chained into a free list through the left array and
+    reused by later inserts.
+
+    Keys must be integers that fit in a signed 64 bit value.
+    """
+    _snapshot_kind = "avl"
+    _snapshot_attributes = ("height",)
+
+    def __init__(self):
+        super().__init__()
+        self._clear()
+        # search path of the current insert or delete, reused between calls
+        self._path = []
+
+    def _clear(self):
+        # slot 0 is the NIL sentinel with height 0
+        self.root = NIL
+        self._keys = array("q", [0])
+        self._left = array("q", [NIL])
+        self._right = array("q", [NIL])
+        self._height = array("b", [0])
+        self._size = array("q", [0])
+        self._free = NIL
+        self._count = 0
+        self._leaf_count = 0
+
+    def __len__(self):
+        return self._count
+
+    def _new_node(self, key):
+        self._count += 1
+        node = self._free
+        if node:
+            self._free = self._left[node]
+            self._keys[node] = key
+            self._left[node] = NIL
+            self._right[node] = NIL
+            self._height[node] = 1
+            self._size[node] = 1
+            return node
+
+        self._keys.append(key)
+        self._left.append(NIL)
+        self._right.append(NIL)
+        self._height.append(1)
+        self._size.append(1)
+        return len(self._keys) - 1
+
+    def _release_node(self, node):
+        self._count -= 1
+        self._left[node] = self._free
+        self._right[node] = NIL
+        self._height[node] = 0
+        self._size[node] = 0
+        self._free = node
+
+    def _get_height(self, node):
+        return self._height[node]
+
+    def _get_size(self, node):
+        return self._size[node]
+
+    def _update_height(self, node):
+        height = self._height
+        height[node] = 1 + max(height[self._left[node]], height[self._right[node]])
+
+    def insert(self, key):
+        """
+        Inserts a new key into the Tree.
+
+        Args:
+            key: The key to be inserted into the Tree.
+        """
+        self._insert(key)
+
+    def _insert(self, key):
+        keys = self._keys
+        left = self._left
+        right = self._right
+        path = self._path
+        path.clear()
+        node = self.root
+        while node:
+            path.append(node)
+            node = left[node] if key < keys[node] else right[node]
+
+        new_node = self._new_node(key)
+        if not path:
+            self.root = new_node
+            self._leaf_count = 1
+            if self.stats is not None:
+                self.stats.record()
+            return (0, 0)
+
+        steps = len(path)
+        size = self._size
+        for node in path:
+            size[node] += 1
+        parent = path[-1]
+        # the new node is a leaf, and only replaces one if the parent was
+        if left[parent] or right[parent]:
+            self._leaf_count += 1
+        if key < keys[parent]:
+            left[parent] = new_node
+        else:
+            right[parent] = new_node
+
+        rotations = self._retrace_insert(key)
+        if self.stats is not None:
+            self.stats.record(comparisons = steps, visits = steps, rotations = rotations)
+        return (steps, rotations)
+
+    def _retrace_insert(self, key):
+        keys = self._keys
+        left = self._left
+        right = self._right
+        height = self._height
+        path = self._path
+        while path:
+            node = path.pop()
+            height_left = height[left[node]]
+            height_right = height[right[node]]
+            bal_factor = height_left - height_right
+
+            if bal_factor > 1:
+                # LL or LR
+                if not key < keys[left[node]]:
+                    left[node] = self._rotate_left(left[node])
+                    self._replace_child(node, self._rotate_right(node))
+                    return 2
+                self._replace_child(node, self._rotate_right(node))
+                return 1
+            if bal_factor < -1:
+                # RR or RL
+                if key < keys[right[node]]:
+                    right[node] = self._rotate_right(right[node])
+                    self._replace_child(node, self._rotate_left(node))
+                    return 2
+                self._replace_child(node, self._rotate_left(node))
+                return 1
+
+            # stop early once the subtree height no longer changes
+            new_height = 1 + max(height_left, height_right)
+            if new_height == height[node]:
+                return 0
+            height[node] = new_height
+
+        return 0
+
+    def delete(self, key):
+        """
+        Removes one occurrence of key from the tree and puts its slot on
+        the free list.
+
+        Parameters:
+        - key: The key to remove.
+
+        Returns:
+        True if the key was found and removed, False otherwise.
+        """
+        return self._delete(key)[0]
+
+    def delete_steps_and_rotations(self, key):
+        """
+        Removes one occurrence of key and returns the number of steps taken
+        and the number of rebalancing rotations performed.
+
+        Parameters:
+        - key: The key to remove.
+
+        Returns:
+        A tuple containing the number of steps taken during the deletion
+        and the number of rotations, a double rotation counting as two.
+        """
+        return self._delete(key)[1:]
+
+    def _delete(self, key):
+        keys = self._keys
+        left = self._left
+        right = self._right
+        path = self._path
+        path.clear()
+        node = self.root
+        while node and key != keys[node]:
+            path.append(node)
+            node = left[node] if key < keys[node] else right[node]
+        if not node:
+            if self.stats is not None:
+                self.stats.record(comparisons = len(path), visits = len(path))
+            return (False, len(path), 0)
+
+        # a node with two children takes its successor's key instead
+        if left[node] and right[node]:
+            path.append(node)
+            successor = right[node]
+            while left[successor]:
+                path.append(successor)
+                successor = left[successor]
+            keys[node] = keys[successor]
+            node = successor
+
+        steps = len(path)
+        size = self._size
+        for ancestor in path:
+            size[ancestor] -= 1
+        if not left[node] and not right[node]:
+            # a leaf goes, and its parent becomes one if it has no other child
+            self._leaf_count -= 1
+            if path and not (left[path[-1]] and right[path[-1]]):
+                self._leaf_count += 1
+        self._replace_child(node, left[node] or right[node])
+        self._release_node(node)
+        rotations = self._retrace_delete()
+        if self.stats is not None:
+            self.stats.record(comparisons = steps, visits = steps, rotations = rotations)
+        return (True, steps, rotations)
+
+    def _retrace_delete(self):
+        left = self._left
+        right = self._right
+        height = self._height
+        path = self._path
+        rotations = 0
+        while path:
+            node = path.pop()
+            old_height = height[node]
+            bal_factor = height[left[node]] - height[right[node]]
+
+            if bal_factor > 1:
+                child = left[node]
+                if height[left[child]] < height[right[child]]:
+                    left[node] = self._rotate_left(child)
+                    rotations += 1
+                node = self._replace_child(node, self._rotate_right(node))
+                rotations += 1
+            elif bal_factor < -1:
+                child = right[node]
+                if height[right[child]] < height[left[child]]:
+                    right[node] = self._rotate_right(child)
+                    rotations += 1
+                node = self._replace_child(node, self._rotate_left(node))
+                rotations += 1
+            else:
+                self._update_height(node)
+
+            # a subtree that kept its height leaves everything above unchanged
+            if height[node] == old_height:
+                break
+
+        return rotations
+
+    def _replace_child(self, node, subtree):
+        # attach subtree where node was, the parent being the top of the path
+        path = self._path
+        if not path:
+            self.root = subtree
+        elif self._left[path[-1]] == node:
+            self._left[path[-1]] = subtree
+        else:
+            self._right[path[-1]] = subtree
+        return subtree
+
+    def _rotate_left(self, node):
+        left = self._left
+        right = self._right
+        right_tree = right[node]
+        # only node and right_tree can change between leaf and inner node
+        self._leaf_count += ((not left[node] and not left[right_tree])
+                             - (not left[right_tree] and not right[right_tree]))
+        right[node] = left[right_tree]
+        left[right_tree] = node
+        size = self._size
+        size[right_tree] = size[node]
+        size[node] = 1 + size[left[node]] + size[right[node]]
+
+        # Reset heights
+        self._update_height(node)
+        self._update_height(right_tree)
+        return right_tree
+
+    def _rotate_right(self, node):
+        left = self._left
+        right = self._right
+        left_tree = left[node]
+        # only node and left_tree can change between leaf and inner node
+        self._leaf_count += ((not right[node] and not right[left_tree])
+                             - (not left[left_tree] and not right[left_tree]))
+        left[node] = right[left_tree]
+        right[left_tree] = node
+        size = self._size
+        size[left_tree] = size[node]
+        size[node] = 1 + size[left[node]] + size[right[node]]
+
+        # Reset heights
+        self._update_height(node)
+        self._update_height(left_tree)
+        return left_tree
+
+    def insertion_steps_and_rotation(self, key):
+        """
+        Perform an insertion of a key into the tree and return the number
+        of steps taken and the number of rotations performed.
+
+        Parameters:
+        - key: The key to be inserted into the tree.
+
+        Returns:
+        A tuple containing the number of nodes visited during the
+        insertion process and the number of rotations, 0, 1 or 2 for a
+        double rotation.
+        """
+        return self._insert(key)
+
+    def _build_from_sorted(self, keys):
+        self._allocate_in_order(keys)
+        self.root = self._build_balanced(0, len(keys))
+
+    def _allocate_in_order(self, keys):
+        # slot i + 1 holds the i-th key, so the arrays are laid out in order
+        count = len(keys)
+        self._clear()
+        self._keys.extend(keys)
+        self._left.extend(array("q", bytes(8 * count)))
+        self._right.extend(array("q", bytes(8 * count)))
+        self._height.extend(array("b", bytes(count)))
+        self._size.extend(array("q", bytes(8 * count)))
+        self._count = count
+
+    def _build_balanced(self, low, high):
+        if low >= high:
+            return NIL
+        mid = (low + high) // 2
+        node = mid + 1
+        if high - low == 1:
+            self._leaf_count += 1
+        self._left[node] = self._build_balanced(low, mid)
+        self._right[node] = self._build_balanced(mid + 1, high)
+        self._update_height(node)
+        self._size[node] = high - low
+        return node
+
+    def save(self, path):
+        """
+        Saves the tree to a snapshot file in the same format as
+        AVLTree.save, so either class can load the other's snapshots.
+
+        Parameters:
+        - path: The file to write. It is replaced atomically.
+        """
+        keys = array("q")
+        heights = array("B")
+        left = self._left
+        right = self._right
+        stack = []
+        node = self.root
+        while stack or node:
+            while node:
+                stack.append(node)
+                node = left[node]
+            node = stack.pop()
+            keys.append(self._keys[node])
+            heights.append(self._height[node])
+            node = right[node]
+        write_snapshot(path, self._snapshot_kind, keys, [heights])
+
+    def _build_from_snapshot(self, keys, metadata):
+        # the Cartesian tree of the saved heights, as in BinaryTree, over
+        # slots laid out in key order
+        heights, = metadata
+        self._allocate_in_order(keys)
+        left = self._left
+        right = self._right
+        height = self._height
+        size = self._size
+        for node, node_height in enumerate(heights, 1):
+            height[node] = node_height
+
+        stack = []
+        for node in range(1, len(keys) + 1):
+            last = NIL
+            while stack and height[stack[-1]] < height[node]:
+                last = stack.pop()
+                self._finish_snapshot_node(last)
+            left[node] = last
+            if stack:
+                right[stack[-1]] = node
+            stack.append(node)
+        self.root = NIL
+        while stack:
+            self.root = stack.pop()
+            self._finish_snapshot_node(self.root)
+
+    def _finish_snapshot_node(self, node):
+        left = self._left[node]
+        right = self._right[node]
+        self._size[node] = 1 + self._size[left] + self._size[right]
+        if left == NIL and right == NIL:
+            self._leaf_count += 1
+
+    def _in_order_keys(self):
+        keys = self._keys
+        left = self._left
+        right = self._right
+        stack = []
+        node = self.root
+        while stack or node:
+            while node:
+                stack.append(node)
+                node = left[node]
+            node = stack.pop()
+            yield keys[node]
+            node = right[node]
+
+    def __reversed__(self):
+        keys = self._keys
+        left = self._left
+        right = self._right
+        stack = []
+        node = self.root
+        while stack or node:
+            while node:
+                stack.append(node)
+                node = right[node]
+            node = stack.pop()
+            yield keys[node]
+            node = left[node]
+
+    def iter_from(self, key):
+        keys = self._keys
+        left = self._left
+        right = self._right
+        stack = []
+        node = self.root
+        while node:
+            if keys[node] < key:
+                node = right[node]
+            else:
+                stack.append(node)
+                node = left[node]
+
+        while stack:
+            node = stack.pop()
+            yield keys[node]
+            node = right[node]
+            while node:
+                stack.append(node)
+                node = left[node]
+
+    def range(self, low, high):
+        for key in self.iter_from(low):
+            if not key < high:
+                return
+            yield key
+
+    def rank(self, key):
+        keys = self._keys
+        size = self._size
+        rank = 0
+        node = self.root
+        while node:
+            if keys[node] < key:
+                rank += 1 + size[self._left[node]]
+                node = self._right[node]
+            else:
+                node = self._left[node]
+        return rank
+
+    def select(self, index):
+        size = self._size
+        node = self.root
+        while node:
+            left_size = size[self._left[node]]
+            if index < left_size:
+                node = self._left[node]
+            elif index == left_size:
+                return self._keys[node]
+            else:
+                index -= left_size + 1
+                node = self._right[node]
+        raise IndexError("tree index out of range")
+
+    def _search(self, node, key):
+        keys = self._keys
+        while node:
+            if key == keys[node]:
+                return True
+            node = self._left[node] if key < keys[node] else self._right[node]
+        return False
+
+    def _counted_search(self, key):
+        keys = self._keys
+        visits = 0
+        node = self.root
+        while node:
+            visits += 1
+            if key == keys[node]:
+                return True, visits
+            node = self._left[node] if key < keys[node] else self._right[node]
+        return False, visits
+
+    def _pre_order_traversal(self, node):
+        if not node:
+            return
+        print(self._keys[node])
+        self._pre_order_traversal(self._left[node])
+        self._pre_order_traversal(self._right[node])
+
+    def _post_order_traversal(self, node):
+        if not node:
+            return
+        self._post_order_traversal(self._left[node])
+        self._post_order_traversal(self._right[node])
+        print(self._keys[node])
+
+    def is_avl_tree(self):
+        return self.validate()
+
+    # the summary of a subtree is its (height, size)
+    _empty_summary = (0, 0)
+
+    def _check_binary(self, node, left_size, right_size):
+        if self._size[node] != 1 + left_size + right_size:
+            return None
+        return self._size[node]
+
+    def _check_node(self, node, left, right):
+        height_left, size_left = left
+        height_right, size_right = right
+        if self._height[node] != 1 + max(height_left, height_right):
+            return None
+        if not -1 <= height_left - height_right <= 1:
+            return None
+        if self._size[node] != 1 + size_left + size_right:
+            return None
+        return (self._height[node], self._size[node])
+
+    def _validate(self, root, low, high, check, empty):
+        keys = self._keys
+        left = self._left
+        right = self._right
+        summaries = []
+        stack = [(root, low, high, False)]
+        # a cycle would otherwise make the walk endless
+        remaining = self._size[root]
+        while stack:
+            node, low, high, children_done = stack.pop()
+            if not node:
+                summaries.append(empty)
+                continue
+
+            if not children_done:
+                key = keys[node]
+                if (low is not None and key < low) or (high is not None and high < key):
+                    return None
+                remaining -= 1
+                if remaining < 0:
+                    return None
+                stack.append((node, low, high, True))
+                stack.append((right[node], key, high, False))
+                stack.append((left[node], low, key, False))
+                continue
+
+            right_summary = summaries.pop()
+            summary = check(node, summaries.pop(), right_summary)
+            if summary is None:
+                return None
+            summaries.append(summary)
+
+        return summaries[0]
+
+    def _random_subtree(self, rng, sample_size):
+        left = self._left
+        right = self._right
+        node = self.root
+        low = high = None
+        while node and self._size[node] > sample_size:
+            if not right[node] or (left[node] and rng.random() < 0.5):
+                high = self._keys[node]
+                node = left[node]
+            else:
+                low = self._keys[node]
+                node = right[node]
+        return node, low, high
+
+    def memory_footprint(self):
+        """
+        Measures the memory held by the tree's arrays, including slots
+        waiting on the free list.
+
+        Returns:
+        A dict with the number of nodes, the bytes taken by the child,
+        height and size arrays, the bytes taken by the key array and the total
+        bytes per key.
+        """
+        def buffer_bytes(buffer):
+            return buffer.itemsize * len(buffer)
+
+        node_bytes = (buffer_bytes(self._left) + buffer_bytes(self._right)
+                      + buffer_bytes(self._height) + buffer_bytes(self._size))
+        key_bytes = buffer_bytes(self._keys)
+        return {
+            "nodes": self._count,
+            "node_bytes": node_bytes,
+            "key_bytes": key_bytes,
+            "bytes_per_key": (node_bytes + key_bytes) / self._count if self._count else 0.0,
+        }
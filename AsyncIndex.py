@@ -0,0 +1,198 @@
+"""
+An asyncio front end to the structures that coalesces concurrent requests
+into batches, and a line-based server for it.
+"""
+import asyncio
+
+class AsyncIndex:
+    """
+    Wraps an AVLTree, RedBlackTree, SkipList or other structure for asyncio
+    callers. Requests are queued and run together as one batch once
+    batch_size of them are waiting or window seconds after the first one,
+    so a burst of concurrent requests costs one pass through the structure
+    and one wake-up instead of one each.
+
+    Within a batch every run of consecutive requests of the same kind is
+    sorted by key before it is applied, which walks the structure in order,
+    and results are handed out in the order the requests came in. Requests
+    of one kind commute, so the outcome is the same as running them one by
+    one.
+    """
+    def __init__(self, index, batch_size = 256, window = 0.0005):
+        """
+        Parameters:
+        - index: The structure, with insert, delete, search and range.
+        - batch_size (int): The number of waiting requests that starts a
+        batch at once.
+        - window (float): The seconds a request waits for others to join
+        its batch.
+        """
+        self.index = index
+        self.batch_size = batch_size
+        self.window = window
+        self._pending = []
+        self._timer = None
+        # number of batches run and requests served, to see how full they were
+        self.batches = 0
+        self.requests = 0
+
+    def _submit(self, operation, *args):
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((operation, args, future))
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.window, self.flush)
+        return future
+
+    def flush(self):
+        """
+        Runs the waiting requests now.
+        """
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        # a caller that gave up, cancelling its future, gets nothing applied
+        batch = [request for request in batch if not request[2].cancelled()]
+        if not batch:
+            return
+        self.batches += 1
+        self.requests += len(batch)
+
+        results = [None] * len(batch)
+        try:
+            start = 0
+            while start < len(batch):
+                operation = batch[start][0]
+                end = start
+                while end < len(batch) and batch[end][0] is operation:
+                    end += 1
+                for position in self._order(batch, start, end):
+                    try:
+                        results[position] = (True, operation(self.index, *batch[position][1]))
+                    except Exception as error:
+                        results[position] = (False, error)
+                start = end
+        finally:
+            # every caller hears back, even if the batch itself broke off
+            for (_, _, future), result in zip(batch, results):
+                if future.done():
+                    continue
+                if result is None:
+                    future.set_exception(RuntimeError("the batch stopped before this request ran"))
+                elif result[0]:
+                    future.set_result(result[1])
+                else:
+                    future.set_exception(result[1])
+
+    def _order(self, batch, start, end):
+        # the positions of a run of one kind of request, sorted by their
+        # first argument the way the index orders it: an item for insert, a
+        # key for the others
+        if batch[start][0] is _insert:
+            convert = getattr(self.index, "_key", None)
+        else:
+            convert = getattr(self.index, "_query", None)
+        convert = convert or (lambda key: key)
+        try:
+            return sorted(range(start, end), key = lambda position: convert(batch[position][1][0]))
+        except Exception:
+            # keys that cannot be compared with each other run in the order
+            # they came in, and fail one by one in the index if they must
+            return range(start, end)
+
+    async def insert(self, key):
+        """
+        Inserts a key.
+        """
+        await self._submit(_insert, key)
+
+    async def delete(self, key):
+        """
+        Removes one occurrence of key.
+
+        Returns:
+        True if the key was found and removed, False otherwise.
+        """
+        return await self._submit(_delete, key)
+
+    async def contains(self, key):
+        """
+        Returns True if key is in the index and False otherwise.
+        """
+        return await self._submit(_contains, key)
+
+    async def range(self, low, high):
+        """
+        Returns a list of the keys k with low <= k < high, in ascending
+        order.
+        """
+        return await self._submit(_range, low, high)
+
+# the operations a batch runs, one function each so runs can be told apart
+def _insert(index, key):
+    index.insert(key)
+
+def _delete(index, key):
+    return index.delete(key)
+
+def _contains(index, key):
+    return index.search(key)
+
+def _range(index, low, high):
+    return list(index.range(low, high))
+
+async def _handle(async_index, reader, writer):
+    # one request per line: "insert k", "delete k", "contains k", "range low high" or "stats"
+    try:
+        while line := await reader.readline():
+            try:
+                command, *arguments = line.decode().split() or [""]
+                arguments = [int(argument) for argument in arguments]
+                if not command:
+                    reply = "error empty command"
+                elif command == "insert":
+                    await async_index.insert(*arguments)
+                    reply = "ok"
+                elif command == "delete":
+                    reply = str(int(await async_index.delete(*arguments)))
+                elif command == "contains":
+                    reply = str(int(await async_index.contains(*arguments)))
+                elif command == "range":
+                    reply = " ".join(map(str, await async_index.range(*arguments)))
+                elif command == "stats":
+                    reply = f"{async_index.batches} {async_index.requests}"
+                else:
+                    reply = f"error unknown command {command}"
+            except (TypeError, ValueError) as error:
+                reply = f"error {error}"
+            writer.write(reply.encode() + b"\n")
+            await writer.drain()
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+async def serve(async_index, host = "127.0.0.1", port = 0, path = None):
+    """
+    Starts a server for an AsyncIndex speaking a line-based protocol: each
+    line is a command, "insert k", "delete k", "contains k", "range low
+    high" or "stats", answered by one line, "ok", "1" or "0", the keys
+    separated by spaces, or the number of batches and requests served.
+    Keys are integers.
+
+    Parameters:
+    - async_index (AsyncIndex): The index to serve.
+    - host, port: The TCP address to listen on, port 0 picking a free one.
+    - path: A Unix socket to listen on instead.
+
+    Returns:
+    The started asyncio.Server.
+    """
+    def handle(reader, writer):
+        return _handle(async_index, reader, writer)
+
+    if path is not None:
+        return await asyncio.start_unix_server(handle, path)
+    return await asyncio.start_server(handle, host, port)
@@ -0,0 +1,517 @@
+"""
+B+-tree: a wide search tree for large numbers of keys.
+"""
+from bisect import bisect_left, bisect_right, insort
+from heapq import merge
+from itertools import pairwise
+from sys import getsizeof
+
+class BTreeNode:
+    __slots__ = ("keys", "children", "next", "previous")
+
+    def __init__(self, keys = None, children = None):
+        # sorted keys; children is None for a leaf, and one longer than keys
+        # for an inner node, whose keys separate the children
+        self.keys = keys if keys is not None else []
+        self.children = children
+        # neighbouring leaves, so that scans never go back up the tree
+        self.next = None
+        self.previous = None
+
+class BTree:
+    """
+    B+-tree. Every key is stored in a leaf, a plain sorted list of up to
+    order - 1 keys, and the leaves are linked in both directions. Inner
+    nodes hold up to order children and only route searches: the keys of
+    children[i] lie between keys[i - 1] and keys[i], inclusive. A search
+    touches one node per level, so for wide nodes the tree is only a few
+    levels deep and most of the work is a binary search over a contiguous
+    list, rather than one pointer to chase per comparison as in the binary
+    trees.
+
+    Like the binary trees it keeps duplicate keys.
+    """
+    def __init__(self, order = 64):
+        """
+        Parameters:
+        - order (int): The most children of an inner node, at least 3.
+        Every node but the root holds at least (order - 1) // 2 keys.
+        """
+        if order < 3:
+            raise ValueError("order must be at least 3")
+        self.order = order
+        self.min_keys = (order - 1) // 2
+        self.root = BTreeNode()
+        self.len = 0
+        self.levels = 1
+        # a stats.Stats that operations report to, if set
+        self.stats = None
+
+    def __len__(self):
+        return self.len
+
+    @property
+    def size(self):
+        """
+        The number of keys in the tree, in O(1).
+        """
+        return self.len
+
+    @property
+    def height(self):
+        """
+        The number of levels of nodes, 0 when empty, in O(1).
+        """
+        return self.levels if self.len else 0
+
+    @classmethod
+    def from_sorted(cls, iterable, order = 64):
+        """
+        Builds a tree directly from keys in non-decreasing order in O(n),
+        with full leaves, without going through insert.
+
+        Parameters:
+        - iterable: The sorted keys.
+        - order (int): As in the constructor.
+
+        Returns:
+        A new BTree containing every key.
+
+        Raises:
+        - ValueError: If the keys are not sorted.
+        """
+        keys = list(iterable)
+        if any(previous > key for previous, key in pairwise(keys)):
+            raise ValueError("keys must be sorted in non-decreasing order")
+        tree = cls(order)
+        tree._build_from_sorted(keys)
+        return tree
+
+    def bulk_insert(self, iterable):
+        """
+        Inserts many keys at once by sorting them, merging them with the
+        keys already stored and rebuilding the tree in O(n + m log m).
+
+        Parameters:
+        - iterable: The keys to insert, in any order.
+        """
+        keys = sorted(iterable)
+        if self.len:
+            keys = list(merge(self, keys))
+        self._build_from_sorted(keys)
+
+    def _build_from_sorted(self, keys):
+        self.len = len(keys)
+        self.levels = 1
+        if not keys:
+            self.root = BTreeNode()
+            return
+
+        level = [BTreeNode(keys[start:end]) for start, end in self._chunks(len(keys), self.order - 1)]
+        for left, right in pairwise(level):
+            left.next = right
+            right.previous = left
+        # the smallest key under each node of the level, its separator
+        lows = [leaf.keys[0] for leaf in level]
+        while len(level) > 1:
+            parents = []
+            for start, end in self._chunks(len(level), self.order):
+                parents.append(BTreeNode(lows[start + 1:end], level[start:end]))
+            lows = [lows[start] for start, _ in self._chunks(len(level), self.order)]
+            level = parents
+            self.levels += 1
+        self.root = level[0]
+
+    def _chunks(self, count, capacity):
+        # splits range(count) into as few runs of at most capacity as
+        # possible, with lengths differing by at most one, so that every
+        # run is at least half full
+        parts = -(-count // capacity)
+        for part in range(parts):
+            yield part * count // parts, (part + 1) * count // parts
+
+    def _first_leaf(self):
+        node = self.root
+        while node.children:
+            node = node.children[0]
+        return node
+
+    def __iter__(self):
+        """
+        Iterates over the keys in ascending order, lazily, along the leaves.
+        """
+        leaf = self._first_leaf()
+        while leaf:
+            yield from leaf.keys
+            leaf = leaf.next
+
+    def __reversed__(self):
+        """
+        Iterates over the keys in descending order, lazily.
+        """
+        node = self.root
+        while node.children:
+            node = node.children[-1]
+        while node:
+            yield from reversed(node.keys)
+            node = node.previous
+
+    def _find_leaf(self, key):
+        # the leftmost leaf that can hold key, and the position of the first
+        # key not smaller than it; if key is bigger than every key of that
+        # leaf its first copy, if any, starts the next leaf
+        node = self.root
+        while node.children:
+            node = node.children[bisect_left(node.keys, key)]
+        return node, bisect_left(node.keys, key)
+
+    def iter_from(self, key):
+        """
+        Iterates lazily, in ascending order, over the keys greater than or
+        equal to key, in O(log n) for the first one and O(1) after.
+
+        Parameters:
+        - key: The smallest key to yield.
+        """
+        leaf, position = self._find_leaf(key)
+        while leaf:
+            for index in range(position, len(leaf.keys)):
+                yield leaf.keys[index]
+            leaf = leaf.next
+            position = 0
+
+    def range(self, low, high):
+        """
+        Iterates lazily, in ascending order, over the keys k with
+        low <= k < high, in O(log n + k).
+
+        Parameters:
+        - low: The inclusive lower bound.
+        - high: The exclusive upper bound.
+        """
+        for key in self.iter_from(low):
+            if not key < high:
+                return
+            yield key
+
+    def search(self, key):
+        """
+        Search for a key in the tree.
+
+        Parameters:
+        - key: The key to search for.
+
+        Returns:
+        - True if found and False if otherwise
+        """
+        leaf, position = self._find_leaf(key)
+        if self.stats is not None:
+            self._record_search(key, leaf, position)
+        if position == len(leaf.keys):
+            leaf = leaf.next
+            position = 0
+        return leaf is not None and leaf.keys[position] == key
+
+    def _record_search(self, key, leaf, position):
+        # the walk of _find_leaf again, costing each binary search as the
+        # bit length of its list
+        comparisons = visits = 0
+        node = self.root
+        while True:
+            comparisons += len(node.keys).bit_length()
+            visits += 1
+            if not node.children:
+                break
+            node = node.children[bisect_left(node.keys, key)]
+        if position == len(leaf.keys) and leaf.next:
+            comparisons += 1
+            visits += 1
+        self.stats.record(comparisons = comparisons, visits = visits)
+
+    def search_many(self, keys):
+        """
+        Searches for a batch of keys.
+
+        Returns:
+        A list of booleans, True where the key at the same position of
+        keys is in the tree.
+        """
+        return [self.search(key) for key in keys]
+
+    def insert(self, key):
+        """
+        Inserts a new key into the tree.
+
+        Parameters:
+        - key: The key to be inserted.
+        """
+        self._insert(key)
+
+    def insertion_steps_and_rotation(self, key):
+        """
+        Inserts a key into the tree and returns the number of nodes visited
+        on the way down and the number of nodes split on the way back up,
+        the counterparts of the binary trees' steps and rotations.
+
+        Parameters:
+        - key: The key to be inserted.
+
+        Returns:
+        A tuple containing the number of steps and of splits.
+        """
+        return self._insert(key)
+
+    def _insert(self, key):
+        path = []
+        node = self.root
+        while node.children:
+            index = bisect_right(node.keys, key)
+            path.append((node, index))
+            node = node.children[index]
+        if self.stats is not None:
+            # a binary search over k keys makes about k.bit_length() comparisons
+            comparisons = sum(len(parent.keys).bit_length() for parent, _ in path)
+            comparisons += len(node.keys).bit_length()
+        insort(node.keys, key)
+        self.len += 1
+        steps = len(path) + 1
+
+        # a full node is split in two and the separator moves up
+        splits = 0
+        while len(node.keys) >= self.order:
+            splits += 1
+            middle = len(node.keys) // 2
+            if node.children is None:
+                sibling = BTreeNode(node.keys[middle:])
+                separator = sibling.keys[0]
+                sibling.next = node.next
+                sibling.previous = node
+                if node.next:
+                    node.next.previous = sibling
+                node.next = sibling
+            else:
+                sibling = BTreeNode(node.keys[middle + 1:], node.children[middle + 1:])
+                separator = node.keys[middle]
+                del node.children[middle + 1:]
+            del node.keys[middle:]
+
+            if not path:
+                self.root = BTreeNode([separator], [node, sibling])
+                self.levels += 1
+                break
+            node, index = path.pop()
+            node.keys.insert(index, separator)
+            node.children.insert(index + 1, sibling)
+        if self.stats is not None:
+            self.stats.record(comparisons = comparisons, visits = steps, splits = splits)
+        return (steps, splits)
+
+    def delete(self, key):
+        """
+        Removes one occurrence of a key.
+
+        Parameters:
+        - key: The key to remove.
+
+        Returns:
+        True if the key was found and removed, False otherwise.
+        """
+        return self._delete(key)[0]
+
+    def delete_steps_and_merges(self, key):
+        """
+        Removes one occurrence of a key and returns the number of nodes
+        visited and the number of nodes merged into a sibling.
+
+        Returns:
+        A tuple containing the number of steps and of merges.
+        """
+        _, steps, merges = self._delete(key)
+        return (steps, merges)
+
+    def _delete(self, key):
+        path = []
+        node = self.root
+        while node.children:
+            index = bisect_left(node.keys, key)
+            path.append((node, index))
+            node = node.children[index]
+        steps = len(path) + 1
+        if self.stats is not None:
+            comparisons = sum(len(parent.keys).bit_length() for parent, _ in path)
+            comparisons += len(node.keys).bit_length()
+        position = bisect_left(node.keys, key)
+        if position == len(node.keys) and node.next:
+            # the first copy starts the next leaf: move the path over to it
+            while True:
+                parent, index = path.pop()
+                if index + 1 < len(parent.children):
+                    path.append((parent, index + 1))
+                    node = parent.children[index + 1]
+                    break
+            while node.children:
+                path.append((node, 0))
+                node = node.children[0]
+            position = 0
+            steps += 1
+        if position == len(node.keys) or node.keys[position] != key:
+            if self.stats is not None:
+                self.stats.record(comparisons = comparisons, visits = steps)
+            return (False, steps, 0)
+        del node.keys[position]
+        self.len -= 1
+        merges = self._rebalance(node, path)
+        if self.stats is not None:
+            self.stats.record(comparisons = comparisons, visits = steps, merges = merges)
+        return (True, steps, merges)
+
+    def _rebalance(self, node, path):
+        # refills an underfull node from a sibling, or merges it with one,
+        # working up the path; returns the number of merges
+        merges = 0
+        while path and len(node.keys) < self.min_keys:
+            parent, index = path.pop()
+            left = parent.children[index - 1] if index > 0 else None
+            right = parent.children[index + 1] if index + 1 < len(parent.children) else None
+            leaf = node.children is None
+
+            if left and len(left.keys) > self.min_keys:
+                if leaf:
+                    node.keys.insert(0, left.keys.pop())
+                    parent.keys[index - 1] = node.keys[0]
+                else:
+                    node.keys.insert(0, parent.keys[index - 1])
+                    parent.keys[index - 1] = left.keys.pop()
+                    node.children.insert(0, left.children.pop())
+                return merges
+            if right and len(right.keys) > self.min_keys:
+                if leaf:
+                    node.keys.append(right.keys.pop(0))
+                    parent.keys[index] = right.keys[0]
+                else:
+                    node.keys.append(parent.keys[index])
+                    parent.keys[index] = right.keys.pop(0)
+                    node.children.append(right.children.pop(0))
+                return merges
+
+            # both siblings are at the minimum, so the two fit in one node
+            if left:
+                left, right, index = left, node, index - 1
+            else:
+                left, right = node, right
+            if leaf:
+                left.keys.extend(right.keys)
+                left.next = right.next
+                if right.next:
+                    right.next.previous = left
+            else:
+                left.keys.append(parent.keys[index])
+                left.keys.extend(right.keys)
+                left.children.extend(right.children)
+            del parent.keys[index]
+            del parent.children[index + 1]
+            merges += 1
+            node = parent
+
+        if self.root.children and not self.root.keys:
+            self.root = self.root.children[0]
+            self.levels -= 1
+        return merges
+
+    def traverse(self, string):
+        """
+        Traverses the tree in the specified order, printing the keys.
+
+        Parameters:
+        - string (str): The traversal order. Valid values are "in_order",
+        which prints every key, and "pre_order" and "post_order", which
+        print the key list of every node.
+        """
+        order = string.lower()
+        if order == "in_order":
+            for key in self:
+                print(key)
+        elif order in ("pre_order", "post_order"):
+            # iterative; a node is pushed back once to print it after its children
+            stack = [(self.root, False)]
+            while stack:
+                node, visited = stack.pop()
+                if node.children is None or visited or order == "pre_order":
+                    print(node.keys)
+                if node.children is None or visited:
+                    continue
+                if order == "post_order":
+                    stack.append((node, True))
+                stack.extend((child, False) for child in reversed(node.children))
+
+    def validate(self):
+        """
+        Checks every invariant of the tree in one pass: keys are sorted and
+        within the bounds set by the separators above them, nodes are
+        neither over nor, except the root, under full, every leaf is at the
+        same depth, the leaf links visit the leaves in order in both
+        directions, and len and height are right.
+
+        Returns:
+        True if no violation was found, False otherwise.
+        """
+        leaves = []
+        count = 0
+        stack = [(self.root, None, None, 1)]
+        while stack:
+            node, low, high, depth = stack.pop()
+            keys = node.keys
+            if len(keys) >= self.order or (node is not self.root and len(keys) < self.min_keys):
+                return False
+            if any(previous > key for previous, key in pairwise(keys)):
+                return False
+            if keys and ((low is not None and keys[0] < low)
+                         or (high is not None and keys[-1] > high)):
+                return False
+            if node.children is None:
+                if depth != self.levels:
+                    return False
+                leaves.append(node)
+                count += len(keys)
+                continue
+            if len(node.children) != len(keys) + 1:
+                return False
+            bounds = [low, *keys, high]
+            for index in reversed(range(len(node.children))):
+                stack.append((node.children[index], bounds[index], bounds[index + 1], depth + 1))
+
+        if count != self.len:
+            return False
+        if leaves[0].previous is not None or leaves[-1].next is not None:
+            return False
+        return all(left.next is right and right.previous is left
+                   for left, right in pairwise(leaves))
+
+    def memory_footprint(self):
+        """
+        Measures the memory held by the tree, for sizing hosts.
+
+        Returns:
+        A dict with the number of nodes, the bytes taken by the nodes and
+        their key and child lists, the bytes taken by the keys (small ints
+        are shared by Python, so this is an upper bound) and the total
+        bytes per key.
+        """
+        nodes = node_bytes = key_bytes = 0
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            nodes += 1
+            node_bytes += getsizeof(node) + getsizeof(node.keys)
+            if node.children is None:
+                key_bytes += sum(getsizeof(key) for key in node.keys)
+            else:
+                node_bytes += getsizeof(node.children)
+                stack.extend(node.children)
+
+        return {
+            "nodes": nodes,
+            "node_bytes": node_bytes,
+            "key_bytes": key_bytes,
+            "bytes_per_key": (node_bytes + key_bytes) / self.len if self.len else 0.0,
+        }
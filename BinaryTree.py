@@ -1,14 +1,627 @@
 from abc import ABC, abstractmethod
+from array import array
+from heapq import merge
+from itertools import pairwise
+from multiprocessing import Pool
+from operator import attrgetter
+from random import Random
+from sys import getsizeof
+from time import perf_counter
+from ordering import make_key, make_query
+from snapshot import SnapshotView, write_snapshot
+
+# an empty subtree, as the (node, rank) pairs split and join pass around
+_EMPTY = (None, 0)
+
+def _run_set_operation(cls, operation, tree, other):
+    # the work of one process of BinaryTree._parallel
+    return getattr(cls(), operation)(tree, other)
 
 class BinaryTree(ABC):
-    def __init__(self):
+    def __init__(self, key = None, cmp = None):
+        """
+        Parameters:
+        - key: A function giving the key an item is ordered by, computed
+        once when the item is inserted and cached in its node. Lookups
+        such as search, delete, rank and range then take keys, not items.
+        - cmp: An old style comparison function of two keys, see
+        ordering.make_key.
+        """
         self.root = None
+        # kept up to date by inserts, deletes and rotations
+        self._leaf_count = 0
+        # None unless items are ordered by something other than themselves,
+        # in which case nodes also hold the item
+        self._key = make_key(key, cmp)
+        self._query = make_query(cmp)
+        self._item = attrgetter("key" if self._key is None else "item")
+        # a stats.Stats that operations report to, if set
+        self.stats = None
+        # set when split or join moved nodes without counting the leaves
+        self._leaves_stale = False
+
+    def _query_key(self, key):
+        # what a key passed to a lookup is compared as
+        return key if self._query is None else self._query(key)
+
+    @classmethod
+    def from_sorted(cls, iterable, **kwargs):
+        """
+        Builds a balanced tree directly from keys in non-decreasing order
+        in O(n), without going through insert.
+
+        Parameters:
+        - iterable: The sorted keys, or items sorted by key.
+        - kwargs: Passed on to the constructor.
+
+        Returns:
+        A new tree containing every key.
+
+        Raises:
+        - ValueError: If the keys are not sorted.
+        """
+        items = list(iterable)
+        tree = cls(**kwargs)
+        keys = items if tree._key is None else list(map(tree._key, items))
+        if any(previous > key for previous, key in pairwise(keys)):
+            raise ValueError("keys must be sorted in non-decreasing order")
+        tree._build_from_sorted(items)
+        return tree
+
+    def bulk_insert(self, iterable):
+        """
+        Inserts many keys at once. The keys are sorted, merged with the
+        keys already in the tree and the tree is rebuilt balanced in
+        O(n + m log m), which beats m separate inserts for large batches.
+
+        Parameters:
+        - iterable: The keys, or items, to insert, in any order.
+        """
+        items = sorted(iterable, key = self._key)
+        if self.root:
+            items = list(merge(self._in_order_items(), items, key = self._key))
+        self._build_from_sorted(items)
+
+    @abstractmethod
+    def _build_from_sorted(self, items):
+        """
+        Replaces the contents of the tree with a balanced tree built from
+        the list items, sorted by key.
+        """
+
+    # snapshot kind and the node attributes saved next to each key
+    _snapshot_kind = None
+    _snapshot_attributes = ()
+
+    def save(self, path):
+        """
+        Saves the tree to a snapshot file: the keys in order plus, for every
+        key, the node metadata needed to rebuild exactly the same shape.
+
+        Parameters:
+        - path: The file to write. It is replaced atomically.
+
+        Raises:
+        - TypeError, OverflowError: If a key is not an integer that fits in
+        64 bits, or the tree orders its items by a key function.
+        """
+        if self._key is not None:
+            raise TypeError("only trees of plain integer keys can be saved")
+        keys = array("q")
+        metadata = [array("B") for _ in self._snapshot_attributes]
+        for node in self._in_order_nodes():
+            keys.append(node.key)
+            for values, name in zip(metadata, self._snapshot_attributes):
+                values.append(getattr(node, name))
+        write_snapshot(path, self._snapshot_kind, keys, metadata)
+
+    @classmethod
+    def load(cls, path, lazy = False):
+        """
+        Loads a tree saved with save().
+
+        Parameters:
+        - path: The snapshot file.
+        - lazy (bool): Instead of building nodes, return a read-only
+        SnapshotView that answers search, range, rank and select straight
+        from the memory mapped file. It is ready in O(1) whatever the size
+        of the snapshot, and must be closed when done.
+
+        Returns:
+        A tree with exactly the shape that was saved, or a SnapshotView.
+
+        Raises:
+        - ValueError: If the file is not a snapshot of this kind of tree.
+        """
+        snapshot = SnapshotView(path)
+        if (snapshot.kind != cls._snapshot_kind
+                or len(snapshot.metadata) != len(cls._snapshot_attributes)):
+            snapshot.close()
+            raise ValueError(f"{path} is not a {cls.__name__} snapshot")
+        if lazy:
+            return snapshot
+        with snapshot:
+            tree = cls()
+            tree._build_from_snapshot(snapshot.keys, snapshot.metadata)
+        return tree
+
+    def _build_from_snapshot(self, keys, metadata):
+        # every node is taller than its children, so the shape is the
+        # Cartesian tree of the heights in key order; it is built in O(n)
+        # with a stack holding the right spine of the tree so far, and a
+        # node is finished once it is popped
+        self._leaf_count = 0
+        stack = []
+        for key, *values in zip(keys, *metadata):
+            node = self._snapshot_node(key, *values)
+            last = None
+            while stack and stack[-1].height < node.height:
+                last = stack.pop()
+                self._finish_snapshot_node(last)
+            node.left = last
+            if stack:
+                stack[-1].right = node
+            stack.append(node)
+        root = None
+        while stack:
+            root = stack.pop()
+            self._finish_snapshot_node(root)
+        self.root = root
+
+    def _snapshot_node(self, key, *values):
+        raise NotImplementedError(f"{type(self).__name__} cannot be loaded from a snapshot")
+
+    def _finish_snapshot_node(self, node):
+        node.size = 1 + self._get_size(node.left) + self._get_size(node.right)
+        if node.left is None and node.right is None:
+            self._leaf_count += 1
+
+    def _in_order_nodes(self):
+        # iterative so that degenerate trees do not hit the recursion limit
+        stack = []
+        node = self.root
+        while stack or node:
+            while node:
+                stack.append(node)
+                node = node.left
+            node = stack.pop()
+            yield node
+            node = node.right
+
+    def _in_order_keys(self):
+        for node in self._in_order_nodes():
+            yield node.key
+
+    def _in_order_items(self):
+        # the keys themselves unless items are ordered by a key function
+        if self._key is None:
+            return self._in_order_keys()
+        return map(self._item, self._in_order_nodes())
+
+    def __iter__(self):
+        """
+        Iterates over the keys, or items, in ascending order, lazily.
+        """
+        return self._in_order_items()
+
+    def __reversed__(self):
+        """
+        Iterates over the keys, or items, in descending order, lazily.
+        """
+        return map(self._item, self._reversed_nodes())
+
+    def _reversed_nodes(self):
+        stack = []
+        node = self.root
+        while stack or node:
+            while node:
+                stack.append(node)
+                node = node.right
+            node = stack.pop()
+            yield node
+            node = node.left
+
+    def iter_from(self, key):
+        """
+        Iterates lazily, in ascending order, over the keys (or items) whose
+        key is greater than or equal to key. Finding the first one costs
+        O(log n) and every one after it O(1) amortised.
+
+        Parameters:
+        - key: The smallest key to yield.
+        """
+        return map(self._item, self._nodes_from(self._query_key(key)))
+
+    def _nodes_from(self, key):
+        # the stack holds the ancestors still to be visited, smallest on top
+        stack = []
+        node = self.root
+        while node:
+            if node.key < key:
+                node = node.right
+            else:
+                stack.append(node)
+                node = node.left
+
+        while stack:
+            node = stack.pop()
+            yield node
+            node = node.right
+            while node:
+                stack.append(node)
+                node = node.left
+
+    def range(self, low, high):
+        """
+        Iterates lazily, in ascending order, over the keys (or items) whose
+        key k is such that low <= k < high, in O(log n + k).
+
+        Parameters:
+        - low: The inclusive lower bound.
+        - high: The exclusive upper bound.
+        """
+        high = self._query_key(high)
+        for node in self._nodes_from(self._query_key(low)):
+            if not node.key < high:
+                return
+            yield self._item(node)
+
+    def memory_footprint(self):
+        """
+        Measures the memory held by the tree, for sizing hosts.
+
+        Returns:
+        A dict with the number of nodes, the bytes taken by the nodes, the
+        bytes taken by the keys (small ints are shared by Python, so this
+        is an upper bound) and the total bytes per key.
+        """
+        nodes = node_bytes = key_bytes = 0
+        for node in self._in_order_nodes():
+            nodes += 1
+            node_bytes += getsizeof(node)
+            key_bytes += getsizeof(node.key)
+
+        return {
+            "nodes": nodes,
+            "node_bytes": node_bytes,
+            "key_bytes": key_bytes,
+            "bytes_per_key": (node_bytes + key_bytes) / nodes if nodes else 0.0,
+        }
 
     def _get_height(self, node):
         if not node:
             return 0
         return node.height
 
+    def _get_size(self, node):
+        if not node:
+            return 0
+        return node.size
+
+    def __len__(self):
+        return self._get_size(self.root)
+
+    def rank(self, key):
+        """
+        Returns the number of keys strictly smaller than key, in O(log n)
+        using the subtree sizes.
+
+        Parameters:
+        - key: The key to rank.
+        """
+        key = self._query_key(key)
+        rank = 0
+        node = self.root
+        while node:
+            if node.key < key:
+                rank += 1 + self._get_size(node.left)
+                node = node.right
+            else:
+                node = node.left
+        return rank
+
+    def select(self, index):
+        """
+        Returns the key, or item, at position index of the sorted order, in
+        O(log n).
+
+        Parameters:
+        - index (int): The zero based position.
+
+        Raises:
+        - IndexError: If index is not in range(len(self)).
+        """
+        node = self.root
+        while node:
+            left_size = self._get_size(node.left)
+            if index < left_size:
+                node = node.left
+            elif index == left_size:
+                return self._item(node)
+            else:
+                index -= left_size + 1
+                node = node.right
+        raise IndexError("tree index out of range")
+
+    def count_range(self, low, high):
+        """
+        Returns the number of keys k with low <= k < high, in O(log n).
+        """
+        return max(0, self.rank(high) - self.rank(low))
+
+    # Split, join and the set operations built on them, after Blelloch,
+    # Ferizovic and Sun, "Just Join for Parallel Ordered Sets". Subtrees
+    # are passed around as (node, rank) pairs, the rank being what _join
+    # balances by. Nodes are moved, never copied. Leaves are not tracked
+    # through them, and are counted again when next asked for.
+
+    def split(self, key):
+        """
+        Splits the tree in two around key in O(log n).
+
+        Parameters:
+        - key: The key to split at.
+
+        Returns:
+        A tuple of two trees ordered like this one, the first holding the
+        keys less than key and the second the rest. This tree is left
+        empty.
+        """
+        low, high = self._split(self._take(), self._query_key(key), False)
+        return self._tree_of(low), self._tree_of(high)
+
+    @classmethod
+    def join(cls, left, key, right):
+        """
+        Joins two trees and a key lying between them into one balanced
+        tree, in O(log n), without looking at the nodes below the spines.
+
+        Parameters:
+        - left, right: Trees of this class ordered the same way, no key of
+        left larger than key and no key of right smaller. Both are left
+        empty.
+        - key: The key, or item, to put between them.
+
+        Returns:
+        The joined tree.
+
+        Raises:
+        - TypeError: If left and right are not trees of this class ordered
+        the same way.
+        - ValueError: If key does not lie between the keys of left and
+        right.
+        """
+        if not isinstance(left, cls):
+            raise TypeError(f"expected a {cls.__name__}, got {type(left).__name__}")
+        left._check_compatible(right)
+        node = left._new_node(key)
+        largest = left.root
+        while largest and largest.right:
+            largest = largest.right
+        smallest = right.root
+        while smallest and smallest.left:
+            smallest = smallest.left
+        if (largest and node.key < largest.key) or (smallest and smallest.key < node.key):
+            raise ValueError("key must lie between the keys of left and right")
+        return left._tree_of(left._join(left._take(), node, right._take()))
+
+    def union(self, other, processes = None):
+        """
+        Adds every key of other to this tree, as inserting them one by one
+        would, in O(m log(n / m + 1)) for trees of n and m <= n keys: the
+        larger tree is split around the root of the smaller one, the halves
+        are merged recursively and joined back together. An other less
+        than a sixteenth the size of this tree is simply inserted.
+
+        Parameters:
+        - other: A tree of the same class ordered the same way. It is left
+        empty, its nodes having moved into this tree.
+        - processes (int): Split the trees into this many parts and work
+        on them in as many worker processes. The parts are pickled there
+        and back, so this only pays for very large trees of similar size.
+
+        Raises:
+        - TypeError: If other is not a tree of this class ordered the same
+        way.
+        """
+        self._set_operation(other, "_union", processes)
+
+    def intersection(self, other, processes = None):
+        """
+        Keeps only the keys of this tree that other also holds, in
+        O(m log(n / m + 1)) for trees of n and m <= n keys.
+
+        Parameters:
+        - other: A tree of the same class ordered the same way. It is left
+        empty.
+        - processes (int): As for union.
+
+        Raises:
+        - TypeError: If other is not a tree of this class ordered the same
+        way.
+        """
+        self._set_operation(other, "_intersection", processes)
+
+    def difference(self, other, processes = None):
+        """
+        Removes every occurrence of the keys other holds from this tree,
+        in O(m log(n / m + 1)) for trees of n and m <= n keys.
+
+        Parameters:
+        - other: A tree of the same class ordered the same way. It is left
+        empty.
+        - processes (int): As for union.
+
+        Raises:
+        - TypeError: If other is not a tree of this class ordered the same
+        way.
+        """
+        self._set_operation(other, "_difference", processes)
+
+    def _rank(self, node):
+        # what _join balances subtrees by, for the subtree rooted at node
+        raise NotImplementedError(f"{type(self).__name__} does not support split and join")
+
+    def _detach(self, node, rank):
+        # cuts node off its children, returning them as (node, rank) pairs
+        raise NotImplementedError(f"{type(self).__name__} does not support split and join")
+
+    def _join(self, left, node, right):
+        # a balanced subtree, as a (node, rank) pair, of the subtrees left
+        # and right with the lone node between them
+        raise NotImplementedError(f"{type(self).__name__} does not support split and join")
+
+    def _check_compatible(self, other):
+        if type(self)._join is BinaryTree._join:
+            raise NotImplementedError(f"{type(self).__name__} does not support split and join")
+        if type(other) is not type(self) or (other._key is None) != (self._key is None):
+            raise TypeError(f"expected a {type(self).__name__} ordered like this one")
+
+    def _take(self):
+        # the whole tree as a (node, rank) pair, leaving the tree empty
+        tree = (self.root, self._rank(self.root))
+        self._set_root(None)
+        return tree
+
+    def _set_root(self, node):
+        self.root = node
+        self._leaves_stale = True
+
+    def _tree_of(self, tree):
+        # a new tree ordered like this one holding the subtree
+        result = type(self)()
+        result._key, result._query, result._item = self._key, self._query, self._item
+        result._set_root(tree[0])
+        return result
+
+    def _set_operation(self, other, operation, processes):
+        self._check_compatible(other)
+        if operation == "_union" and 16 * len(other) < len(self):
+            # splitting costs more than a descent, so a tree this much
+            # smaller is inserted key by key instead
+            items = list(other._in_order_items())
+            other._set_root(None)
+            for item in items:
+                self.insert(item)
+            return
+        tree = self._take()
+        other = other._take()
+        if processes and processes > 1 and tree[0] and other[0]:
+            tree = self._parallel(operation, tree, other, processes)
+        else:
+            tree = getattr(self, operation)(tree, other)
+        self._set_root(tree[0])
+
+    def _parallel(self, operation, tree, other, processes):
+        # splits both trees at the same processes - 1 keys, spread evenly
+        # through the first, and runs the operation on every pair of parts
+        # in its own process before joining the results in order
+        pivots = []
+        for part in range(1, processes):
+            index = tree[0].size * part // processes
+            node = tree[0]
+            while index != self._get_size(node.left):
+                if index < self._get_size(node.left):
+                    node = node.left
+                else:
+                    index -= self._get_size(node.left) + 1
+                    node = node.right
+            pivots.append(node.key)
+
+        parts = []
+        for pivot in pivots:
+            low, tree = self._split(tree, pivot, False)
+            other_low, other = self._split(other, pivot, False)
+            parts.append((type(self), operation, low, other_low))
+        parts.append((type(self), operation, tree, other))
+        with Pool(processes) as pool:
+            results = pool.starmap(_run_set_operation, parts)
+
+        tree = _EMPTY
+        for result in results:
+            tree = self._join2(tree, result)
+        return tree
+
+    def _split(self, tree, key, inclusive):
+        # the keys of tree less than key, or no more than key when
+        # inclusive, and the rest, as two (node, rank) pairs
+        node, rank = tree
+        if node is None:
+            return _EMPTY, _EMPTY
+        left, right = self._detach(node, rank)
+        goes_right = key < node.key if inclusive else not node.key < key
+        if goes_right:
+            low, high = self._split(left, key, inclusive)
+            return low, self._join(high, node, right)
+        low, high = self._split(right, key, inclusive)
+        return self._join(left, node, low), high
+
+    def _split_equal(self, tree, key):
+        # the keys of tree less than, equal to and greater than key
+        node, rank = tree
+        if node is None:
+            return _EMPTY, _EMPTY, _EMPTY
+        left, right = self._detach(node, rank)
+        if key < node.key:
+            low, equal, high = self._split_equal(left, key)
+            return low, equal, self._join(high, node, right)
+        if node.key < key:
+            low, equal, high = self._split_equal(right, key)
+            return self._join(left, node, low), equal, high
+        # equal keys may sit on both sides
+        low, equal_low = self._split(left, key, False)
+        equal_high, high = self._split(right, key, True)
+        return low, self._join(equal_low, node, equal_high), high
+
+    def _join2(self, left, right):
+        # left and right joined with no node between them
+        if left[0] is None:
+            return right
+        if right[0] is None:
+            return left
+        left, last = self._split_last(left)
+        return self._join(left, last, right)
+
+    def _split_last(self, tree):
+        # the subtree without its last node, and that node
+        node, rank = tree
+        left, right = self._detach(node, rank)
+        if right[0] is None:
+            return left, node
+        right, last = self._split_last(right)
+        return self._join(left, node, right), last
+
+    def _union(self, tree, other):
+        if tree[0] is None:
+            return other
+        if other[0] is None:
+            return tree
+        # recurse over the structure of the smaller tree
+        if other[0].size > tree[0].size:
+            tree, other = other, tree
+        node, rank = other
+        left, right = self._detach(node, rank)
+        low, high = self._split(tree, node.key, False)
+        return self._join(self._union(low, left), node, self._union(high, right))
+
+    def _intersection(self, tree, other):
+        if tree[0] is None or other[0] is None:
+            return _EMPTY
+        node, rank = other
+        left, right = self._detach(node, rank)
+        low, equal, high = self._split_equal(tree, node.key)
+        low = self._intersection(low, left)
+        high = self._intersection(high, right)
+        return self._join2(self._join2(low, equal), high)
+
+    def _difference(self, tree, other):
+        if tree[0] is None or other[0] is None:
+            return tree
+        node, rank = other
+        left, right = self._detach(node, rank)
+        low, _, high = self._split_equal(tree, node.key)
+        return self._join2(self._difference(low, left), self._difference(high, right))
+
     def traverse(self, string):
         """
         Traverses the  tree in the specified order.
@@ -24,23 +637,17 @@ class BinaryTree(ABC):
         - None
         """
         if string.lower() == "in_order":
-            self._in_order_traversal(self.root)
+            for key in self:
+                print(key)
         elif string.lower() == "post_order":
             self._post_order_traversal(self.root)
         elif string.lower() == "pre_order":
             self._pre_order_traversal(self.root)
 
-    def _in_order_traversal(self, node):
-        if not node:
-            return
-        self._in_order_traversal(node.left)
-        print(node.key)
-        self._in_order_traversal(node.right)
-
     def _pre_order_traversal(self, node):
         if not node:
             return
-        print(node.key)
+        print(self._item(node))
         self._pre_order_traversal(node.left)
         self._pre_order_traversal(node.right)
 
@@ -49,25 +656,107 @@ class BinaryTree(ABC):
             return
         self._post_order_traversal(node.left)
         self._post_order_traversal(node.right)
-        print(node.key)
+        print(self._item(node))
 
     def is_binary_tree(self):
-        return self._is_binary_tree(self.root)
+        """
+        Checks that the keys are in order, against the bounds set by every
+        ancestor rather than only the parent, and that subtree sizes add up.
+        Equal keys may sit on either side of each other.
+        """
+        return self._validate(self.root, None, None, self._check_binary, 0) is not None
 
-    def _is_binary_tree(self, node):
-        if node is None:
-            return True
+    def validate(self, time_budget=None, seed=None, sample_size=1024):
+        """
+        Checks every invariant of the tree in one iterative post-order pass:
+        key order against the bounds of all ancestors, subtree sizes and
+        the balancing invariants of the structure.
 
-        if node.left and node.left.key >= node.key:
-            return False
+        Parameters:
+        - time_budget (float): If given, only random subtrees of about
+        sample_size nodes are checked, until this many seconds have passed.
+        At least one subtree is always checked.
+        - seed: Seed for choosing the sampled subtrees.
+        - sample_size (int): The size of the sampled subtrees.
 
-        if node.right and node.right.key <= node.key:
+        Returns:
+        True if no violation was found, False otherwise.
+        """
+        if not self._validate_root():
             return False
+        if time_budget is None:
+            return self._validate(self.root, None, None, self._check_node,
+                                  self._empty_summary) is not None
+
+        rng = Random(seed)
+        deadline = perf_counter() + time_budget
+        while True:
+            node, low, high = self._random_subtree(rng, sample_size)
+            if self._validate(node, low, high, self._check_node, self._empty_summary) is None:
+                return False
+            if perf_counter() >= deadline:
+                return True
+
+    # summary of an empty subtree and the per node check used by validate
+    _empty_summary = 0
+
+    def _check_node(self, node, left, right):
+        return self._check_binary(node, left, right)
+
+    def _validate_root(self):
+        return True
 
-        left_is_binary = self._is_binary_tree(node.left)
-        right_is_binary = self._is_binary_tree(node.right)
+    def _check_binary(self, node, left_size, right_size):
+        # the summary of a subtree is its size
+        if node.size != 1 + left_size + right_size:
+            return None
+        return node.size
 
-        return left_is_binary and right_is_binary
+    def _validate(self, root, low, high, check, empty):
+        # Iterative post-order walk; check combines a node with the summaries
+        # of its subtrees and returns the node's summary, or None if invalid
+        summaries = []
+        stack = [(root, low, high, False)]
+        # a cycle would otherwise make the walk endless
+        remaining = self._get_size(root)
+        while stack:
+            node, low, high, children_done = stack.pop()
+            if node is None:
+                summaries.append(empty)
+                continue
+
+            if not children_done:
+                if (low is not None and node.key < low) or (high is not None and high < node.key):
+                    return None
+                remaining -= 1
+                if remaining < 0:
+                    return None
+                stack.append((node, low, high, True))
+                stack.append((node.right, node.key, high, False))
+                stack.append((node.left, low, node.key, False))
+                continue
+
+            right = summaries.pop()
+            summary = check(node, summaries.pop(), right)
+            if summary is None:
+                return None
+            summaries.append(summary)
+
+        return summaries[0]
+
+    def _random_subtree(self, rng, sample_size):
+        # random descent to a subtree of at most sample_size nodes, keeping
+        # the key bounds its ancestors impose
+        node = self.root
+        low = high = None
+        while node and self._get_size(node) > sample_size:
+            if node.right is None or (node.left is not None and rng.random() < 0.5):
+                high = node.key
+                node = node.left
+            else:
+                low = node.key
+                node = node.right
+        return node, low, high
 
     def search(self, key):
         """
@@ -79,17 +768,77 @@ class BinaryTree(ABC):
         Returns:
         - True if found and False if otherwise
         """
-        return self._search(self.root, key)
+        if self.stats is None:
+            return self._search(self.root, self._query_key(key))
+        found, visits = self._counted_search(self._query_key(key))
+        self.stats.record(comparisons = visits, visits = visits)
+        return found
+
+    def search_many(self, keys):
+        """
+        Searches for a batch of keys with one in-order walk of the tree.
+        The batch is sorted and merged against the stored keys, so the
+        cost is O(n + m log m) rather than m separate searches.
+
+        Parameters:
+        - keys: The keys to search for.
+
+        Returns:
+        A list of booleans, True where the key at the same position of
+        keys is in the tree.
+        """
+        keys = [self._query_key(key) for key in keys]
+        found = [False] * len(keys)
+        stored = self._in_order_keys()
+        end = object()
+        current = next(stored, end)
+        for index in sorted(range(len(keys)), key=keys.__getitem__):
+            key = keys[index]
+            while current is not end and current < key:
+                current = next(stored, end)
+            if current is end:
+                break
+            found[index] = current == key
+        return found
+
+    def _find_node(self, key):
+        # a node holding key, or None
+        node = self.root
+        while node:
+            if key == node.key:
+                return node
+            node = node.left if key < node.key else node.right
+        return None
+
+    def _floor_node(self, key):
+        # the node of the largest key that is at most key, or None
+        floor = None
+        node = self.root
+        while node:
+            if key < node.key:
+                node = node.left
+            else:
+                floor = node
+                node = node.right
+        return floor
 
     def _search(self, node, key):
-        if not node:
-            return False
-        if key == node.key:
-            return True
-        if key < node.left:
-            return self._search(node.left, key)
+        while node:
+            if key == node.key:
+                return True
+            node = node.left if key < node.key else node.right
+        return False
 
-        return self._search(node.right, key)
+    def _counted_search(self, key):
+        # _search that also counts the nodes it looks at, for stats
+        visits = 0
+        node = self.root
+        while node:
+            visits += 1
+            if key == node.key:
+                return True, visits
+            node = node.left if key < node.key else node.right
+        return False, visits
 
     @abstractmethod
     def insert(self, key):
@@ -107,28 +856,47 @@ class BinaryTree(ABC):
         Returns:
             int: The number of leaves in the tree.
         """
-        leaves = 0
-        return self._get_leaves(self.root, leaves)
+        return self.leaf_count
 
-    def _get_leaves(self, node, count):
-        if not node:
-            return count
-        if not node.left and not node.right:
-            return count + 1
+    @property
+    def size(self):
+        """
+        The number of keys in the tree, in O(1).
+        """
+        return len(self)
 
-        new_count = self._get_leaves(node.left, count)
-        return self._get_leaves(node.right, new_count)
+    @property
+    def height(self):
+        """
+        The height of the tree, 0 when empty, in O(1).
+        """
+        return self._get_height(self.root)
+
+    @property
+    def leaf_count(self):
+        """
+        The number of leaves in the tree, in O(1) except for the first time
+        after a split, join or set operation.
+        """
+        if self._leaves_stale:
+            self._leaf_count = sum(1 for node in self._in_order_nodes()
+                                   if not node.left and not node.right)
+            self._leaves_stale = False
+        return self._leaf_count
 
     @abstractmethod
     def insertion_steps_and_rotation(self, key):
         """
         Perform an insertion of a key into the tree and return the number 
-        of steps taken and whether a rotation was performed or not.
+        of steps taken and the number of rotations performed.
 
         Parameters:
         - key: The key to be inserted into the tree.
 
         Returns:
         A tuple containing the number of steps taken during the 
-        insertion process and 1 if a rotation occured or 0 otherwise.
+        insertion process and the number of single rotations, a double
+        rotation counting as two. An AVL insert makes at most two; a
+        red-black insert rotates at every red-red conflict it resolves on
+        the way down, so it has no fixed upper bound.
         """
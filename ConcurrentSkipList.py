@@ -0,0 +1,230 @@
+"""
+Skip list that many threads can read and write at the same time.
+"""
+from random import Random
+from threading import Lock
+from time import sleep
+from SkipList import SkipNode
+
+class ConcurrentSkipNode(SkipNode):
+    __slots__ = ("lock", "marked", "fully_linked")
+
+    def __init__(self, height = 1, value = None):
+        # no back pointers or widths, they cannot be kept consistent
+        # while only the predecessors are locked
+        self.value = value
+        self.next = [None] * height
+        self.previous = None
+        self.width = None
+        self.lock = Lock()
+        # set once the node is being removed / once it is linked on all levels
+        self.marked = False
+        self.fully_linked = False
+
+class ConcurrentSkipList:
+    """
+    Lazy skip list (Herlihy, Lev, Luchangco and Shavit). Readers never
+    take a lock: a value is present when a fully linked, unmarked node
+    holds it. Writers lock only the predecessors of the node on the levels
+    they change, check that nothing moved underneath them and retry if it
+    did, so writers on different parts of the list do not wait on each
+    other.
+
+    Unlike SkipList and the trees, which keep duplicates, this is a set:
+    every value is stored at most once and insert returns False for one
+    already present. The benchmark sweep leaves it out of the workloads
+    that repeat keys.
+    """
+    def __init__(self, max_level = 32, seed = None):
+        """
+        Parameters:
+        - max_level (int): The highest level a node can reach.
+        - seed: Seeds the generator of node levels.
+        """
+        self.max_level = max_level
+        self._rng = Random(seed)
+        self.head = ConcurrentSkipNode(max_level)
+        self.head.fully_linked = True
+        self.max_height = 0
+        self.len = 0
+        self._height_lock = Lock()
+        self._len_lock = Lock()
+
+    def __len__(self):
+        return self.len
+
+    def __iter__(self):
+        """
+        Iterates over the values in ascending order. The iteration is
+        weakly consistent: it never fails, and sees every value that was
+        present for its whole duration.
+        """
+        current_node = self.head.next[0]
+        while current_node:
+            if current_node.fully_linked and not current_node.marked:
+                yield current_node.value
+            current_node = current_node.next[0]
+
+    def _get_new_height(self):
+        # one plus the trailing zero bits of a random word, as in SkipList
+        word = self._rng.getrandbits(self.max_level)
+        if word == 0:
+            return self.max_level
+        return min((word & -word).bit_length(), self.max_level)
+
+    def _find(self, value, predecessors, successors):
+        # fills in the neighbours of value on every level and returns the
+        # highest level on which value was found, or -1
+        found = -1
+        predecessor = self.head
+        for level in reversed(range(self.max_height)):
+            current_node = predecessor.next[level]
+            while current_node and current_node.value < value:
+                predecessor = current_node
+                current_node = predecessor.next[level]
+            if found == -1 and current_node and current_node.value == value:
+                found = level
+            predecessors[level] = predecessor
+            successors[level] = current_node
+        return found
+
+    def search(self, value):
+        """
+        Search for a value without taking any lock.
+
+        Parameters:
+        - value: The value to search for.
+
+        Returns:
+        - True if found and False if otherwise
+        """
+        predecessor = self.head
+        for level in reversed(range(self.max_height)):
+            current_node = predecessor.next[level]
+            while current_node and current_node.value < value:
+                predecessor = current_node
+                current_node = predecessor.next[level]
+            if current_node and current_node.value == value:
+                return current_node.fully_linked and not current_node.marked
+        return False
+
+    def _lock_predecessors(self, predecessors, height, is_valid):
+        # locks the distinct predecessors bottom up, stopping at the first
+        # level where is_valid fails; returns (valid, locked nodes)
+        locked = []
+        for level in range(height):
+            predecessor = predecessors[level]
+            # a node is the predecessor on a run of consecutive levels
+            if not locked or locked[-1] is not predecessor:
+                predecessor.lock.acquire()
+                locked.append(predecessor)
+            if not is_valid(level):
+                return False, locked
+        return True, locked
+
+    def insert(self, value):
+        """
+        Inserts a value unless it is already present.
+
+        Parameters:
+        - value: The value to be inserted.
+
+        Returns:
+        True if the value was added, False if it was already there.
+        """
+        height = self._get_new_height()
+        if height > self.max_height:
+            with self._height_lock:
+                self.max_height = max(self.max_height, height)
+
+        predecessors = [self.head] * self.max_level
+        successors = [None] * self.max_level
+
+        def is_valid(level):
+            predecessor = predecessors[level]
+            successor = successors[level]
+            return (not predecessor.marked
+                    and (successor is None or not successor.marked)
+                    and predecessor.next[level] is successor)
+
+        while True:
+            found = self._find(value, predecessors, successors)
+            if found != -1:
+                node = successors[found]
+                if not node.marked:
+                    # another writer is still linking it, wait until it is done,
+                    # giving up the GIL so that writer can get on with it
+                    while not node.fully_linked:
+                        sleep(0)
+                    return False
+                # it is being removed, try again once it is gone
+                continue
+
+            valid, locked = self._lock_predecessors(predecessors, height, is_valid)
+            try:
+                if not valid:
+                    continue
+                new_node = ConcurrentSkipNode(height, value)
+                for level in range(height):
+                    new_node.next[level] = successors[level]
+                for level in range(height):
+                    predecessors[level].next[level] = new_node
+                new_node.fully_linked = True
+                with self._len_lock:
+                    self.len += 1
+                return True
+            finally:
+                for node in locked:
+                    node.lock.release()
+
+    def delete(self, value):
+        """
+        Removes a value.
+
+        Parameters:
+        - value: The value to remove.
+
+        Returns:
+        True if the value was found and removed, False otherwise.
+        """
+        predecessors = [self.head] * self.max_level
+        successors = [None] * self.max_level
+        victim = None
+        is_marked = False
+
+        def is_valid(level):
+            predecessor = predecessors[level]
+            return not predecessor.marked and predecessor.next[level] is victim
+
+        while True:
+            found = self._find(value, predecessors, successors)
+            if not is_marked:
+                if found == -1:
+                    return False
+                victim = successors[found]
+                # only a fully linked node found on its top level can be removed
+                if (not victim.fully_linked or victim.marked
+                        or len(victim.next) - 1 != found):
+                    return False
+                victim.lock.acquire()
+                if victim.marked:
+                    victim.lock.release()
+                    return False
+                victim.marked = True
+                is_marked = True
+
+            height = len(victim.next)
+            valid, locked = self._lock_predecessors(predecessors, height, is_valid)
+            try:
+                if not valid:
+                    continue
+                for level in reversed(range(height)):
+                    predecessors[level].next[level] = victim.next[level]
+                victim.lock.release()
+                with self._len_lock:
+                    self.len -= 1
+                return True
+            finally:
+                for node in locked:
+                    node.lock.release()
+
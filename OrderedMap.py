@@ -0,0 +1,168 @@
+"""
+An ordered mapping stored in one of the trees or the skip list.
+"""
+from collections.abc import ItemsView, MutableMapping, ValuesView
+from operator import attrgetter
+from avl import AVLTree
+from RedBlack import RedBlackTree
+from SkipList import SkipList
+
+BACKENDS = {"avl": AVLTree, "rb": RedBlackTree, "skip_list": SkipList}
+
+_missing = object()
+
+class OrderedMap(MutableMapping):
+    """
+    A dict-like mapping that keeps its keys sorted. Each value is stored in
+    the node of its key, so there is no second structure to keep in step,
+    and assigning to a key that is present replaces the value in place
+    without allocating a node.
+
+    Keys are unique; iteration, items() and values() are in ascending key
+    order.
+    """
+    def __init__(self, items = (), backend = "avl", **options):
+        """
+        Parameters:
+        - items: A mapping or an iterable of (key, value) pairs to start with.
+        - backend (str): The structure to store the entries in, one of
+        BACKENDS.
+        - options: Passed to the constructor of the backend, such as seed
+        for the skip list. Orderings go through cmp; key is not supported.
+
+        Raises:
+        - ValueError: If backend is not one of BACKENDS.
+        - TypeError: If a key function is passed.
+        """
+        if backend not in BACKENDS:
+            raise ValueError(f"unknown backend {backend!r}, expected one of {', '.join(BACKENDS)}")
+        if options.get("key") is not None:
+            raise TypeError("OrderedMap orders by its keys; pass cmp for a custom ordering")
+        self.backend = backend
+        self._options = options
+        self._index = BACKENDS[backend](**options)
+        # with cmp the backend stores cmp_to_key wrappers, which keep the key as obj
+        stored = attrgetter("value" if backend == "skip_list" else "key")
+        self._key_of = stored if options.get("cmp") is None else lambda node: stored(node).obj
+        self.update(items)
+
+    def _node(self, key):
+        return self._index._find_node(self._index._query_key(key))
+
+    def __getitem__(self, key):
+        node = self._node(key)
+        if node is None:
+            raise KeyError(key)
+        return node.item
+
+    def __setitem__(self, key, value):
+        node = self._node(key)
+        if node is None:
+            self._index._insert_entry(self._index._query_key(key), value)
+        else:
+            node.item = value
+
+    def __delitem__(self, key):
+        if not self._index.delete(key):
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        return self._node(key) is not None
+
+    def __len__(self):
+        return len(self._index)
+
+    def __iter__(self):
+        return map(self._key_of, self._index._in_order_nodes())
+
+    def __reversed__(self):
+        if self._options.get("cmp") is None:
+            return reversed(self._index)
+        return reversed(list(self))
+
+    def get(self, key, default = None):
+        """
+        Returns the value of key, or default if key is missing.
+        """
+        node = self._node(key)
+        return default if node is None else node.item
+
+    def setdefault(self, key, default = None):
+        """
+        Returns the value of key, first inserting it with the value default
+        if it is missing.
+        """
+        node = self._node(key)
+        if node is not None:
+            return node.item
+        self._index._insert_entry(self._index._query_key(key), default)
+        return default
+
+    def pop(self, key, default = _missing):
+        """
+        Removes key and returns its value.
+
+        Parameters:
+        - key: The key to remove.
+        - default: Returned if key is missing.
+
+        Raises:
+        - KeyError: If key is missing and no default was given.
+        """
+        node = self._node(key)
+        if node is None:
+            if default is _missing:
+                raise KeyError(key)
+            return default
+        value = node.item
+        self._index.delete(key)
+        return value
+
+    def floor(self, key):
+        """
+        Returns the largest key less than or equal to key, or None if there
+        is none.
+        """
+        node = self._index._floor_node(self._index._query_key(key))
+        return None if node is None else self._key_of(node)
+
+    def ceiling(self, key):
+        """
+        Returns the smallest key greater than or equal to key, or None if
+        there is none.
+        """
+        node = next(self._index._nodes_from(self._index._query_key(key)), None)
+        return None if node is None else self._key_of(node)
+
+    def _entries(self):
+        key_of = self._key_of
+        for node in self._index._in_order_nodes():
+            yield key_of(node), node.item
+
+    def items(self):
+        """
+        A view of the (key, value) pairs in ascending key order.
+        """
+        return _ItemsView(self)
+
+    def values(self):
+        """
+        A view of the values in ascending key order.
+        """
+        return _ValuesView(self)
+
+    def clear(self):
+        self._index = BACKENDS[self.backend](**self._options)
+
+    def __repr__(self):
+        entries = ", ".join(f"{key!r}: {value!r}" for key, value in self._entries())
+        return f"{type(self).__name__}({{{entries}}}, backend={self.backend!r})"
+
+class _ItemsView(ItemsView):
+    def __iter__(self):
+        return self._mapping._entries()
+
+class _ValuesView(ValuesView):
+    def __iter__(self):
+        for _, value in self._mapping._entries():
+            yield value
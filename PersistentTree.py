@@ -0,0 +1,266 @@
+"""
+Persistent AVL and red-black trees: insert leaves the tree it is called on
+untouched and returns a new version, sharing every node off the path to
+the new key with the old one.
+"""
+from avl import AVLNode, AVLTree, KeyedAVLNode
+from BinaryTree import BinaryTree
+
+def _immutable(self, *args, **kwargs):
+    raise TypeError(f"{type(self).__name__} versions cannot change, insert returns a new one")
+
+def _new_version(tree):
+    # a tree object sharing the nodes, ordering and stats of tree
+    version = object.__new__(type(tree))
+    version.__dict__.update(tree.__dict__)
+    return version
+
+def _bulk_insert(self, iterable):
+    """
+    Returns a new version holding the keys of this one and of iterable,
+    built from scratch in O(n + m log m), so sharing no nodes.
+    """
+    version = _new_version(self)
+    BinaryTree.bulk_insert(version, iterable)
+    return version
+
+
+class PersistentAVLTree(AVLTree):
+    """
+    AVL tree whose versions never change once built. insert copies the
+    O(log n) nodes on the path to the new key, then rebalances the copies
+    with the same retrace and rotations as AVLTree: the nodes a rotation
+    moves always lie on that path, so no shared node is ever written to.
+
+    Holding on to a version is an O(1) snapshot. Readers keep a
+    consistent view for as long as they like while writers go on
+    inserting, and everything that reads a tree works on any version.
+    The methods of AVLTree that would change a version in place raise
+    TypeError.
+    """
+    def insert(self, key):
+        """
+        Inserts a key into a copy of the path to it.
+
+        Parameters:
+        - key: The key, or item, to insert.
+
+        Returns:
+        The new version. This one is unchanged.
+        """
+        version = _new_version(self)
+        # the new version needs its own scratch path, and the spine of this
+        # one would point into the old nodes
+        path = version._path = []
+        version._spine = None
+        new_node = self._new_node(key)
+        key = new_node.key
+
+        parent = None
+        node = self.root
+        while node:
+            node = _copy_avl_node(node)
+            if parent is None:
+                version.root = node
+            elif key < parent.key:
+                parent.left = node
+            else:
+                parent.right = node
+            path.append(node)
+            parent = node
+            node = node.left if key < node.key else node.right
+        version._attach(new_node, len(path))
+        path.clear()
+        return version
+
+    bulk_insert = _bulk_insert
+    delete = delete_steps_and_rotations = insertion_steps_and_rotation = _immutable
+    finger_insert = split = join = union = intersection = difference = _immutable
+    _insert_entry = _immutable
+
+
+def _copy_avl_node(node):
+    if type(node) is AVLNode:
+        copy = AVLNode(node.key)
+    else:
+        copy = KeyedAVLNode(node.key, node.item)
+    copy.left = node.left
+    copy.right = node.right
+    copy.height = node.height
+    copy.size = node.size
+    return copy
+
+
+class PersistentRedBlackNode:
+    # no parent pointer, as a node shared by several versions has several
+    # parents
+    __slots__ = ("key", "red", "left", "right", "size", "height")
+
+    def __init__(self, key, red = True):
+        self.key = key
+        self.red = red
+        self.left = None
+        self.right = None
+        self.size = 1
+        self.height = 1
+
+
+class KeyedPersistentRedBlackNode(PersistentRedBlackNode):
+    __slots__ = ("item",)
+
+    def __init__(self, key, item, red = True):
+        super().__init__(key, red)
+        self.item = item
+
+
+class PersistentRedBlackTree(BinaryTree):
+    """
+    Red-black tree whose versions never change once built, inserting as
+    in Okasaki's "Red-black trees in a functional setting": the path to
+    the new key is copied, and on the way back up every black copy with a
+    red child and a red grandchild on the path is rebuilt as a red node
+    with two black children. Only copies are rebuilt, so no shared node
+    is ever written to.
+
+    RedBlackTree itself cannot share nodes as its nodes point to their
+    parents, so this tree has nodes of its own. As with
+    PersistentAVLTree, a version is an O(1) snapshot and the methods that
+    would change it in place raise TypeError.
+    """
+    _snapshot_kind = "rb"
+    _snapshot_attributes = ("height", "red")
+
+    def insert(self, key):
+        """
+        Inserts a key into a copy of the path to it.
+
+        Parameters:
+        - key: The key, or item, to insert.
+
+        Returns:
+        The new version. This one is unchanged.
+        """
+        version = _new_version(self)
+        new_node = self._new_node(key)
+        root = self._insert_below(self.root, new_node)
+        root.red = False
+        version.root = root
+        # rebuilding changes which nodes are leaves, so they are counted
+        # when asked for
+        version._leaves_stale = True
+        if self.stats is not None:
+            steps = 0
+            node = self.root
+            while node:
+                steps += 1
+                node = node.left if new_node.key < node.key else node.right
+            self.stats.record(comparisons = steps, visits = steps)
+        return version
+
+    def _new_node(self, item):
+        if self._key is None:
+            return PersistentRedBlackNode(item)
+        return KeyedPersistentRedBlackNode(self._key(item), item)
+
+    def _insert_below(self, node, new_node):
+        # the copy of the subtree with new_node inserted
+        if node is None:
+            return new_node
+        if type(node) is PersistentRedBlackNode:
+            copy = PersistentRedBlackNode(node.key, node.red)
+        else:
+            copy = KeyedPersistentRedBlackNode(node.key, node.item, node.red)
+        if new_node.key < node.key:
+            copy.left = self._insert_below(node.left, new_node)
+            copy.right = node.right
+        else:
+            copy.left = node.left
+            copy.right = self._insert_below(node.right, new_node)
+        return self._balance(copy)
+
+    def _balance(self, node):
+        # a red-red pair below a black node can only be on the insert path,
+        # so the three nodes rebuilt here are all copies
+        if not node.red:
+            left = node.left
+            right = node.right
+            if left is not None and left.red:
+                if left.left is not None and left.left.red:
+                    return self._rebuild(left.left, left, node, left.left.left,
+                                         left.left.right, left.right, right)
+                if left.right is not None and left.right.red:
+                    return self._rebuild(left, left.right, node, left.left,
+                                         left.right.left, left.right.right, right)
+            if right is not None and right.red:
+                if right.left is not None and right.left.red:
+                    return self._rebuild(node, right.left, right, left,
+                                         right.left.left, right.left.right, right.right)
+                if right.right is not None and right.right.red:
+                    return self._rebuild(node, right, right.right, left,
+                                         right.left, right.right.left, right.right.right)
+        return self._update(node)
+
+    def _rebuild(self, low, middle, high, a, b, c, d):
+        # middle, red, over low and high, black, over a to d in key order
+        low.left, low.right, low.red = a, b, False
+        high.left, high.right, high.red = c, d, False
+        middle.left, middle.right, middle.red = self._update(low), self._update(high), True
+        return self._update(middle)
+
+    def _update(self, node):
+        left = node.left
+        right = node.right
+        node.size = 1 + self._get_size(left) + self._get_size(right)
+        node.height = 1 + max(self._get_height(left), self._get_height(right))
+        return node
+
+    def _build_from_sorted(self, items):
+        # as RedBlackTree: only the deepest level of a midpoint build is red
+        red_depth = len(items).bit_length() - 1
+        self._leaf_count = 0
+        self._leaves_stale = False
+        self.root = self._build_balanced(items, 0, len(items), 0, red_depth)
+
+    def _build_balanced(self, items, low, high, depth, red_depth):
+        if low >= high:
+            return None
+        mid = (low + high) // 2
+        node = self._new_node(items[mid])
+        node.red = 0 < depth == red_depth
+        if high - low == 1:
+            self._leaf_count += 1
+        node.left = self._build_balanced(items, low, mid, depth + 1, red_depth)
+        node.right = self._build_balanced(items, mid + 1, high, depth + 1, red_depth)
+        return self._update(node)
+
+    def _snapshot_node(self, key, height, red):
+        node = PersistentRedBlackNode(key, bool(red))
+        node.height = height
+        return node
+
+    def is_rb_tree(self):
+        return self.validate()
+
+    def _validate_root(self):
+        return self.root is None or not self.root.red
+
+    # the summary of a subtree is its (black height, size, height)
+    _empty_summary = (0, 0, 0)
+
+    def _check_node(self, node, left, right):
+        black_left, size_left, height_left = left
+        black_right, size_right, height_right = right
+        if black_left != black_right:
+            return None
+        if node.red and any(child is not None and child.red for child in (node.left, node.right)):
+            return None
+        if node.size != 1 + size_left + size_right:
+            return None
+        if node.height != 1 + max(height_left, height_right):
+            return None
+        return (black_left + (not node.red), node.size, node.height)
+
+    bulk_insert = _bulk_insert
+    delete = delete_steps_and_rotations = insertion_steps_and_rotation = _immutable
+    finger_insert = split = join = union = intersection = difference = _immutable
+    _insert_entry = _immutable
@@ -1,32 +1,80 @@
 from BinaryTree import BinaryTree
+from stats import measure
 
 class RedBlackNode:
+    __slots__ = ("key", "red", "left", "right", "parent", "size", "height")
+
     def __init__(self, key, is_red=True, parent=None):
         self.key = key
         self.red = is_red
         self.left = None
         self.right = None
         self.parent = parent
+        # number of nodes in and height of the subtree rooted here
+        self.size = 1
+        self.height = 1
 
     def is_red(self):
         return self.red
 
+class KeyedRedBlackNode(RedBlackNode):
+    # holds an item besides its key: the item a key function was applied
+    # to, or the value of an OrderedMap entry
+    __slots__ = ("item",)
+
+    def __init__(self, key, item, parent=None):
+        super().__init__(key, parent=parent)
+        self.item = item
+
 class RedBlackTree(BinaryTree):
+    _snapshot_kind = "rb"
+    _snapshot_attributes = ("height", "red")
+
+    def __init__(self, key = None, cmp = None):
+        """
+        Parameters:
+        - key, cmp: Order the items by a key function or a comparison
+        function instead of by themselves, see BinaryTree.
+        """
+        super().__init__(key, cmp)
+        # the node the last finger operation ended at; deletes clear it
+        self._finger = None
+        # the node of the largest key, kept by finger inserts only
+        self._last = None
+
     def insert(self, key):
-        self._insert(self.root, key)
+        self._insert(self.root, self._new_node(key))
+
+    def _new_node(self, item, parent=None):
+        if self._key is None:
+            return RedBlackNode(item, parent=parent)
+        return KeyedRedBlackNode(self._key(item), item, parent)
 
-    def _insert(self, node, key):
+    def _insert_entry(self, key, item):
+        # inserts a node holding item under key
+        self._insert(self.root, KeyedRedBlackNode(key, item))
+
+    def _insert(self, node, new_node):
+        self._last = None
+        key = new_node.key
         parent = None
         current_node = node
+        # fix-ups are rare, so counting them costs nothing measurable
+        steps = rotations = recolorings = 0
         while True:
             # insert here
             if current_node is None:
-                current_node = RedBlackNode(key, parent=parent)
+                current_node = new_node
+                current_node.parent = parent
                 # new node is root
                 if not current_node.parent:
                     current_node.red = False
                     self.root = current_node
+                    self._leaf_count = 1
                 else:
+                    # the new node is a leaf, and only replaces one if the parent was
+                    if parent.left or parent.right:
+                        self._leaf_count += 1
                     # set parents pointer to new node
                     if current_node.key < parent.key:
                         parent.left = current_node
@@ -34,10 +82,16 @@ class RedBlackTree(BinaryTree):
                         parent.right = current_node
                     # check for conflicts
                     if parent.red:
-                        self._resolve_problems(current_node)
+                        rotations += self._resolve_problems(current_node)
+                        recolorings += 2
+                    self._update_to_root(current_node)
 
-                break
+                if self.stats is not None:
+                    self.stats.record(comparisons = steps, visits = steps,
+                                      rotations = rotations, recolorings = recolorings)
+                return
 
+            steps += 1
             parent = current_node.parent
 
             # remove red uncles
@@ -47,12 +101,15 @@ class RedBlackTree(BinaryTree):
                     if current_node.right and current_node.right.red:
                         current_node.left.red = False
                         current_node.right.red = False
+                        recolorings += 2
                         if parent:
                             current_node.red = True
+                            recolorings += 1
 
                         # check for red red violations and then rotate
                         if parent and parent.red:
-                            self._resolve_problems(current_node)
+                            rotations += self._resolve_problems(current_node)
+                            recolorings += 2
 
             parent = current_node
             if key < current_node.key:
@@ -60,8 +117,442 @@ class RedBlackTree(BinaryTree):
             else:
                 current_node = current_node.right
 
+    def finger_insert(self, key):
+        """
+        Inserts a key starting from the node the previous finger_insert or
+        finger_search ended at rather than from the root. The search climbs
+        the parent pointers only until the subtree below must hold the
+        key, so its comparisons grow with the log of the distance from the
+        previous key rather than of the size of the tree. A key no smaller
+        than the largest one goes straight below it. The fix-up works
+        bottom-up. Sizes and heights are still updated up to the root.
+
+        Parameters:
+        - key: The key to be inserted into the tree.
+        """
+        new_node = self._new_node(key)
+        key = new_node.key
+        last = self._last
+        if last is not None and not key < last.key:
+            parent = last
+            visits = 1
+            last = new_node
+        else:
+            parent = None
+            node, visits = self._finger_start(key)
+            # whether the new node will be the largest, as when it is only
+            # ever put right of the nodes below the root
+            rightmost = node is self.root
+            while node:
+                parent = node
+                if key < node.key:
+                    node = node.left
+                    rightmost = False
+                else:
+                    node = node.right
+                visits += 1
+            if rightmost:
+                last = new_node
+
+        new_node.parent = parent
+        if parent is None:
+            new_node.red = False
+            self.root = new_node
+            self._leaf_count = 1
+        else:
+            # the new node is a leaf, and only replaces one if the parent was
+            if parent.left or parent.right:
+                self._leaf_count += 1
+            if key < parent.key:
+                parent.left = new_node
+            else:
+                parent.right = new_node
+        rotations, recolorings = self._fix_insert(new_node)
+        self._update_to_root(new_node)
+        self._finger = new_node
+        self._last = last
+        if self.stats is not None:
+            self.stats.record(comparisons = visits, visits = visits,
+                              rotations = rotations, recolorings = recolorings)
+
+    def finger_search(self, key):
+        """
+        Search for a key starting from the node the previous finger_insert
+        or finger_search ended at, climbing only as far as needed.
+
+        Returns:
+        - True if found and False if otherwise
+        """
+        key = self._query_key(key)
+        node, visits = self._finger_start(key)
+        found = False
+        while node:
+            self._finger = node
+            visits += 1
+            if key == node.key:
+                found = True
+                break
+            node = node.left if key < node.key else node.right
+        if self.stats is not None:
+            self.stats.record(comparisons = visits, visits = visits)
+        return found
+
+    def _finger_start(self, key):
+        # the lowest ancestor of the finger whose subtree holds every key
+        # strictly between its bounds, key among them, and the number of
+        # nodes climbed through
+        node = self._finger
+        if node is None:
+            return self.root, 0
+        climbed = 0
+        if key < node.key:
+            # stop below the first ancestor whose right subtree we are in
+            # and whose key is smaller than key
+            while node.parent and not (node is node.parent.right and node.parent.key < key):
+                node = node.parent
+                climbed += 1
+        else:
+            while node.parent and not (node is node.parent.left and key < node.parent.key):
+                node = node.parent
+                climbed += 1
+        return node, climbed
+
+    def _fix_insert(self, node):
+        # bottom-up fix of a red node with a red parent: red uncles are
+        # recoloured, moving the problem up, and a black one ends it with
+        # rotations; returns the number of rotations and of colour changes
+        rotations = recolorings = 0
+        while node.parent and node.parent.red:
+            parent = node.parent
+            grandparent = parent.parent
+            uncle = grandparent.right if parent is grandparent.left else grandparent.left
+            if uncle and uncle.red:
+                parent.red = uncle.red = False
+                grandparent.red = True
+                recolorings += 3
+                node = grandparent
+                continue
+            rotations += self._resolve_problems(node)
+            recolorings += 2
+            break
+        if self.root.red:
+            self.root.red = False
+            recolorings += 1
+        return rotations, recolorings
+
+    def delete(self, key):
+        """
+        Removes one occurrence of key from the tree.
+
+        Parameters:
+        - key: The key to remove.
+
+        Returns:
+        True if the key was found and removed, False otherwise.
+        """
+        return self._delete(key)[0]
+
+    def delete_steps_and_rotations(self, key):
+        """
+        Removes one occurrence of key and returns the number of steps taken
+        and the number of rotations performed by the fix-up.
+
+        Parameters:
+        - key: The key to remove.
+
+        Returns:
+        A tuple containing the number of steps taken during the deletion
+        and the number of rotations that occurred.
+        """
+        return self._delete(key)[1:]
+
+    def _delete(self, key):
+        self._finger = self._last = None
+        key = self._query_key(key)
+        steps = 0
+        node = self.root
+        while node and key != node.key:
+            steps += 1
+            node = node.left if key < node.key else node.right
+        if not node:
+            if self.stats is not None:
+                self.stats.record(comparisons = steps, visits = steps)
+            return (False, steps, 0)
+
+        # a node with two children takes its successor's key instead
+        if node.left and node.right:
+            successor = node.right
+            while successor.left:
+                steps += 1
+                successor = successor.left
+            node.key = successor.key
+            if isinstance(node, KeyedRedBlackNode):
+                node.item = successor.item
+            node = successor
+
+        # splice out the node, which has at most one child
+        child = node.left or node.right
+        parent = node.parent
+        if not child:
+            # a leaf goes, and its parent becomes one if it has no other child
+            self._leaf_count -= 1
+            if parent and not (parent.left and parent.right):
+                self._leaf_count += 1
+        if child:
+            child.parent = parent
+        if not parent:
+            self.root = child
+        elif parent.left is node:
+            parent.left = child
+        else:
+            parent.right = child
+
+        rotations = recolorings = 0
+        if not node.red:
+            # a red child absorbs the missing black, otherwise fix it up
+            if child and child.red:
+                child.red = False
+                recolorings = 1
+            else:
+                rotations, recolorings = self._resolve_double_black(child, parent)
+
+        self._update_to_root(parent)
+        if self.stats is not None:
+            self.stats.record(comparisons = steps + 1, visits = steps + 1,
+                              rotations = rotations, recolorings = recolorings)
+        return (True, steps + 1, rotations)
+
+    def _resolve_double_black(self, node, parent):
+        # node (possibly None) is one black short compared to its sibling;
+        # returns the number of rotations and of colour changes
+        rotations = recolorings = 0
+        while node is not self.root and not self._is_red(node):
+            if node is parent.left:
+                sibling = parent.right
+                if sibling.red:
+                    sibling.red = False
+                    parent.red = True
+                    self._left_rotate(parent)
+                    rotations += 1
+                    recolorings += 2
+                    sibling = parent.right
+                if not self._is_red(sibling.left) and not self._is_red(sibling.right):
+                    sibling.red = True
+                    recolorings += 1
+                    node = parent
+                    parent = node.parent
+                    continue
+                if not self._is_red(sibling.right):
+                    sibling.left.red = False
+                    sibling.red = True
+                    self._right_rotate(sibling)
+                    rotations += 1
+                    recolorings += 2
+                    sibling = parent.right
+                sibling.red = parent.red
+                parent.red = False
+                sibling.right.red = False
+                self._left_rotate(parent)
+            else:
+                sibling = parent.left
+                if sibling.red:
+                    sibling.red = False
+                    parent.red = True
+                    self._right_rotate(parent)
+                    rotations += 1
+                    recolorings += 2
+                    sibling = parent.left
+                if not self._is_red(sibling.left) and not self._is_red(sibling.right):
+                    sibling.red = True
+                    recolorings += 1
+                    node = parent
+                    parent = node.parent
+                    continue
+                if not self._is_red(sibling.left):
+                    sibling.right.red = False
+                    sibling.red = True
+                    self._left_rotate(sibling)
+                    rotations += 1
+                    recolorings += 2
+                    sibling = parent.left
+                sibling.red = parent.red
+                parent.red = False
+                sibling.left.red = False
+                self._right_rotate(parent)
+
+            rotations += 1
+            recolorings += 3
+            node = self.root
+
+        if node and node.red:
+            node.red = False
+            recolorings += 1
+        return rotations, recolorings
+
+    def _is_red(self, node):
+        return node is not None and node.red
+
+    def _update_to_root(self, node):
+        # recompute the size and height of node and every ancestor; every
+        # insert walks this to the root, so the child lookups are inlined
+        while node:
+            left = node.left
+            right = node.right
+            if left is None:
+                if right is None:
+                    node.size = node.height = 1
+                else:
+                    node.size = 1 + right.size
+                    node.height = 1 + right.height
+            elif right is None:
+                node.size = 1 + left.size
+                node.height = 1 + left.height
+            else:
+                node.size = 1 + left.size + right.size
+                node.height = 1 + (left.height if left.height > right.height else right.height)
+            node = node.parent
+
+    def _build_from_sorted(self, keys):
+        self._finger = self._last = None
+        # Every leaf of a midpoint build sits on one of the two deepest levels,
+        # so colouring only the deepest level red gives equal black heights
+        red_depth = len(keys).bit_length() - 1
+        self._leaf_count = 0
+        self.root = self._build_balanced(keys, 0, len(keys), None, 0, red_depth)
+
+    def _build_balanced(self, keys, low, high, parent, depth, red_depth):
+        if low >= high:
+            return None
+        mid = (low + high) // 2
+        node = self._new_node(keys[mid], parent)
+        node.red = 0 < depth == red_depth
+        if high - low == 1:
+            self._leaf_count += 1
+        node.left = self._build_balanced(keys, low, mid, node, depth + 1, red_depth)
+        node.right = self._build_balanced(keys, mid + 1, high, node, depth + 1, red_depth)
+        node.size = high - low
+        node.height = 1 + max(self._get_height(node.left), self._get_height(node.right))
+        return node
+
+    def _set_root(self, node):
+        super()._set_root(node)
+        self._finger = self._last = None
+        if node:
+            node.parent = None
+            node.red = False
+
+    def _rank(self, node):
+        # the black height, counting node itself; every path down has the
+        # same, so the leftmost one will do
+        black_height = 0
+        while node:
+            black_height += not node.red
+            node = node.left
+        return black_height
+
+    def _detach(self, node, rank):
+        left, right = node.left, node.right
+        node.left = node.right = None
+        rank -= not node.red
+        if left:
+            left.parent = None
+        if right:
+            right.parent = None
+        return (left, rank), (right, rank)
+
+    def _join(self, left, node, right):
+        left, left_rank = left
+        right, right_rank = right
+        if left_rank > right_rank:
+            node = self._join_right(left, left_rank, node, right, right_rank)
+            rank = left_rank
+        elif right_rank > left_rank:
+            node = self._join_left(left, left_rank, node, right, right_rank)
+            rank = right_rank
+        else:
+            node.red = not self._is_red(left) and not self._is_red(right)
+            self._link(node, left, right)
+            rank = left_rank + (not node.red)
+        # a red root with a red child is fixed by turning it black
+        if node.red and (self._is_red(node.left) or self._is_red(node.right)):
+            node.red = False
+            rank += 1
+        node.parent = None
+        return node, rank
+
+    def _link(self, node, left, right):
+        # makes left and right the children of node and updates it
+        node.left = left
+        node.right = right
+        if left is None:
+            node.size = 1 + (right.size if right else 0)
+            node.height = 1 + (right.height if right else 0)
+        elif right is None:
+            left.parent = node
+            node.size = 1 + left.size
+            node.height = 1 + left.height
+        else:
+            left.parent = node
+            node.size = 1 + left.size + right.size
+            node.height = 1 + (left.height if left.height > right.height else right.height)
+        if right:
+            right.parent = node
+        return node
+
+    def _join_right(self, tree, rank, node, right, right_rank):
+        # hangs node, red with right below it, from the right spine of the
+        # tree of larger black height where the black heights match; a
+        # red node with a red right child is rotated away one level up
+        if tree is None or (not tree.red and rank == right_rank):
+            node.red = True
+            return self._link(node, tree, right)
+        joined = self._join_right(tree.right, rank - (not tree.red), node, right, right_rank)
+        self._link(tree, tree.left, joined)
+        if not tree.red and joined.red and self._is_red(joined.right):
+            joined.right.red = False
+            return self._rotated_left(tree)
+        return tree
+
+    def _join_left(self, left, left_rank, node, tree, rank):
+        # the mirror image of _join_right
+        if tree is None or (not tree.red and rank == left_rank):
+            node.red = True
+            return self._link(node, left, tree)
+        joined = self._join_left(left, left_rank, node, tree.left, rank - (not tree.red))
+        self._link(tree, joined, tree.right)
+        if not tree.red and joined.red and self._is_red(joined.left):
+            joined.left.red = False
+            return self._rotated_right(tree)
+        return tree
+
+    def _rotated_left(self, node):
+        # a left rotation of a detached subtree, returning its new root
+        child = node.right
+        self._link(node, node.left, child.left)
+        return self._link(child, node, child.right)
+
+    def _rotated_right(self, node):
+        child = node.left
+        self._link(node, child.right, node.right)
+        return self._link(child, child.left, node)
+
+    def _snapshot_node(self, key, height, red):
+        node = RedBlackNode(key, bool(red))
+        node.height = height
+        return node
+
+    def _finish_snapshot_node(self, node):
+        super()._finish_snapshot_node(node)
+        if node.left:
+            node.left.parent = node
+        if node.right:
+            node.right.parent = node
+
     def _left_rotate(self, node):
         right_child = node.right
+        # only node and right_child can change between leaf and inner node
+        self._leaf_count += ((not node.left and not right_child.left)
+                             - (not right_child.left and not right_child.right))
         node.right = right_child.left
 
         if right_child.left:
@@ -79,8 +570,17 @@ class RedBlackTree(BinaryTree):
         right_child.left = node
         node.parent = right_child
 
+        right_child.size = node.size
+        node.size = 1 + self._get_size(node.left) + self._get_size(node.right)
+        node.height = 1 + max(self._get_height(node.left), self._get_height(node.right))
+        right_child.height = 1 + max(self._get_height(right_child.left),
+                                     self._get_height(right_child.right))
+
     def _right_rotate(self, node):
         left_child = node.left
+        # only node and left_child can change between leaf and inner node
+        self._leaf_count += ((not node.right and not left_child.right)
+                             - (not left_child.left and not left_child.right))
         node.left = left_child.right
 
         if left_child.right:
@@ -98,17 +598,27 @@ class RedBlackTree(BinaryTree):
         left_child.right = node
         node.parent = left_child
 
+        left_child.size = node.size
+        node.size = 1 + self._get_size(node.left) + self._get_size(node.right)
+        node.height = 1 + max(self._get_height(node.left), self._get_height(node.right))
+        left_child.height = 1 + max(self._get_height(left_child.left),
+                                    self._get_height(left_child.right))
+
     def _resolve_problems(self, node):
+        # returns the number of rotations, 2 for an inside case
         parent = node.parent
         grandparent = parent.parent
+        rotations = 1
 
         # check for inside
         if parent is grandparent.left and node is parent.right:
             self._left_rotate(parent)
             parent = node
+            rotations = 2
         elif parent is grandparent.right and node is parent.left:
             self._right_rotate(parent)
             parent = node
+            rotations = 2
 
         # check for outside
         if parent is grandparent.left:
@@ -123,90 +633,42 @@ class RedBlackTree(BinaryTree):
         if not parent.parent:
             self.root = parent
             parent.red = False
+        return rotations
 
     def insertion_steps_and_rotation(self, key):
-        return self._insertion_steps_and_rotation(self.root, key, 0, 0)
-
-    def _insertion_steps_and_rotation(self, node, key, steps, rotations):
-        parent = None
-        current_node = node
-        while True:
-            steps += 1
-            # insert here
-            if current_node is None:
-                current_node = RedBlackNode(key, parent=parent)
-                # new node is root
-                if not current_node.parent:
-                    current_node.red = False
-                    self.root = current_node
-                else:
-                    # set parents pointer to new node
-                    if current_node.key < parent.key:
-                        parent.left = current_node
-                    else:
-                        parent.right = current_node
-                    # check for conflicts
-                    if parent.red:
-                        self._resolve_problems(current_node)
-                        rotations += 1
-
-                break
-
-            parent = current_node.parent
-
-            # remove red uncles
-            if not current_node.red:
-                # black node with red children
-                if current_node.left and current_node.left.red:
-                    if current_node.right and current_node.right.red:
-                        current_node.left.red = False
-                        current_node.right.red = False
-                        if parent:
-                            current_node.red = True
-
-                        # check for red red violations and then rotate
-                        if parent and parent.red:
-                            self._resolve_problems(current_node)
-                            rotations += 1
-
-            parent = current_node
-            if key < current_node.key:
-                current_node = current_node.left
-            else:
-                current_node = current_node.right
-
-        return (steps, rotations)
+        """
+        Inserts a key and returns the number of nodes visited on the way
+        down and the number of rotations performed by the fix-ups.
+        """
+        stats = measure(self, "insert", key)
+        return (stats.visits, stats.rotations)
 
     def is_rb_tree(self):
-        return self._is_rb_tree(self.root)[0]
-
-    def _is_rb_tree(self, node):
-        if not node:  # if node is a leaf, check #3
-            return True, 1
-
-        if not node.parent and node.red:  # If node is the root, check #2
-            return False, 0
-
-        if node.red:  # if node is red, check #4
-            n_blacks = 0
-            if (node.left and node.left.red) or (node.right and node.right.red):
-                return False, -1
-        else:  # else, the number of black nodes to the leaves includes the same node
-            n_blacks = 1
-
-        # Check the subtrees for #5
-        right, n_blacks_right = self._is_rb_tree(node.right)
-        left, n_blacks_left = self._is_rb_tree(node.left)
-
-        return all([right, left, n_blacks_right == n_blacks_left]), n_blacks_right + n_blacks
+        return self.validate()
+
+    def _validate_root(self):
+        # the root is black and has no parent
+        return self.root is None or (self.root.parent is None and not self.root.red)
+
+    # the summary of a subtree is its (black height, size, height)
+    _empty_summary = (0, 0, 0)
+
+    def _check_node(self, node, left, right):
+        black_left, size_left, height_left = left
+        black_right, size_right, height_right = right
+        if black_left != black_right:
+            return None
+        for child in (node.left, node.right):
+            if child is not None and (child.parent is not node or (node.red and child.red)):
+                return None
+        if node.size != 1 + size_left + size_right:
+            return None
+        if node.height != 1 + max(height_left, height_right):
+            return None
+        return (black_left + (not node.red), node.size, node.height)
 
     def get_height(self):
-        return self._get_height(self.root)
-
-    def _get_height(self, node):
-        if not node:
-            return 0
-
-        left_height = self._get_height(node.left)
-        right_height = self._get_height(node.right)
-        return 1 + max(left_height, right_height)
+        """
+        Returns the height of the tree, 0 when empty, in O(1).
+        """
+        return self.height
@@ -0,0 +1,283 @@
+"""
+An index range-partitioned across worker processes, so that building and
+querying it can use more than one core.
+"""
+import os
+import pickle
+from array import array
+from bisect import bisect_left, bisect_right
+from multiprocessing import Pipe, Process, resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from avl import AVLTree
+
+def _serve(connection, structure, options):
+    # the loop of a shard process: one request in, one reply out, the reply
+    # being the exception if the request failed
+    index = structure(**options)
+    while True:
+        request = connection.recv()
+        operation = request[0]
+        if operation == "close":
+            connection.close()
+            return
+        try:
+            if operation == "build":
+                _, name, start, stop = request
+                memory = SharedMemory(name)
+                try:
+                    keys = memory.buf.cast("q")[start:stop]
+                    index = structure.from_sorted(keys.tolist(), **options)
+                    keys.release()
+                finally:
+                    memory.close()
+                reply = len(index)
+            elif operation == "insert":
+                keys = array("q", request[1])
+                # merging a big batch in O(n + m) beats m inserts of O(log n)
+                if 4 * len(keys) >= len(index):
+                    index.bulk_insert(keys)
+                else:
+                    for key in keys:
+                        index.insert(key)
+                reply = len(index)
+            elif operation == "search":
+                search = index.search
+                reply = bytes(map(search, array("q", request[1])))
+            elif operation == "range":
+                bounds = array("q", request[1])
+                counts = array("q")
+                found = array("q")
+                for position in range(0, len(bounds), 2):
+                    before = len(found)
+                    found.extend(index.range(bounds[position], bounds[position + 1]))
+                    counts.append(len(found) - before)
+                reply = (counts.tobytes(), found.tobytes())
+            elif operation == "len":
+                reply = len(index)
+            else:
+                raise ValueError(f"unknown shard operation {operation!r}")
+        except Exception as error:
+            reply = _sendable(error)
+        connection.send(reply)
+
+def _sendable(error):
+    # the error itself if it survives pickling, which not every exception does
+    try:
+        pickle.dumps(error)
+        return error
+    except Exception:
+        return RuntimeError(f"{type(error).__name__}: {error}")
+
+class ShardedIndex:
+    """
+    Index of 64 bit integer keys split by key range across worker
+    processes, each holding one of the single-threaded structures. Shard i
+    holds the keys k with boundaries[i - 1] <= k < boundaries[i], so a key
+    is routed with one binary search and the shards, taken in order, hold
+    the keys in order.
+
+    Work is sent in batches, one message per shard, and the shards work on
+    their part of a batch in parallel. A bulk build hands every shard its
+    slice of one shared memory buffer rather than a copy of the keys.
+
+    Call build first, or pass boundaries, so that keys spread over the
+    shards; otherwise every key goes to the first one. An exception raised
+    in a shard is sent back and raised again by the call that made the
+    request, once every other shard involved has answered.
+    """
+    def __init__(self, shards = None, structure = AVLTree, boundaries = None, **options):
+        """
+        Parameters:
+        - shards (int): The number of worker processes, one per CPU by
+        default.
+        - structure: The class every shard holds, with from_sorted, insert,
+        bulk_insert, search and range, such as AVLTree or SkipList.
+        - boundaries: The shards - 1 sorted keys that split the key range.
+        - options: Passed to the constructor of the structure.
+
+        Raises:
+        - ValueError: If boundaries does not have shards - 1 sorted keys.
+        """
+        self.shards = shards or os.cpu_count()
+        if boundaries is not None:
+            boundaries = list(boundaries)
+            if (len(boundaries) != self.shards - 1
+                    or any(low > high for low, high in zip(boundaries, boundaries[1:]))):
+                raise ValueError("boundaries must be shards - 1 keys in sorted order")
+        self.boundaries = boundaries
+        self._connections = []
+        self._processes = []
+        # shared with the workers; one they started themselves would remove
+        # the build buffers they attach to when they exit
+        resource_tracker.ensure_running()
+        for _ in range(self.shards):
+            connection, child = Pipe()
+            process = Process(target = _serve, args = (child, structure, options), daemon = True)
+            process.start()
+            child.close()
+            self._connections.append(connection)
+            self._processes.append(process)
+
+    def _shard(self, key):
+        return bisect_right(self.boundaries, key) if self.boundaries else 0
+
+    def _split(self, keys):
+        # the positions where the shards' runs of the sorted keys start
+        if not self.boundaries:
+            return [0] + [len(keys)] * self.shards
+        return [0] + [bisect_left(keys, boundary) for boundary in self.boundaries] + [len(keys)]
+
+    def _gather(self, shards):
+        # every shard is heard out before an error is raised, so no reply is
+        # left behind to be read as the answer to the next request
+        replies = [self._connections[shard].recv() for shard in shards]
+        for reply in replies:
+            if isinstance(reply, Exception):
+                raise reply
+        return replies
+
+    def build(self, keys):
+        """
+        Replaces the contents of every shard with keys, building the shards
+        in parallel. Without boundaries these are chosen so that every
+        shard gets the same number of keys.
+
+        Parameters:
+        - keys: The keys, in any order.
+        """
+        keys = array("q", sorted(keys))
+        if self.boundaries is None and len(keys) >= self.shards:
+            self.boundaries = [keys[len(keys) * shard // self.shards]
+                               for shard in range(1, self.shards)]
+        splits = self._split(keys)
+
+        memory = SharedMemory(create = True, size = max(8 * len(keys), 1))
+        try:
+            memory.buf[:8 * len(keys)] = keys.tobytes()
+            for shard, connection in enumerate(self._connections):
+                connection.send(("build", memory.name, splits[shard], splits[shard + 1]))
+            self._gather(range(self.shards))
+        finally:
+            memory.close()
+            memory.unlink()
+
+    def insert(self, key):
+        """
+        Inserts one key, with a round trip to its shard; insert_many is
+        much faster for many keys.
+        """
+        self.insert_many([key])
+
+    def insert_many(self, keys):
+        """
+        Inserts a batch of keys, every shard inserting its part in parallel.
+        """
+        keys = array("q", sorted(keys))
+        splits = self._split(keys)
+        shards = [shard for shard in range(self.shards) if splits[shard] < splits[shard + 1]]
+        for shard in shards:
+            self._connections[shard].send(("insert", keys[splits[shard]:splits[shard + 1]].tobytes()))
+        self._gather(shards)
+
+    def search(self, key):
+        """
+        Search for a key in its shard.
+
+        Returns:
+        - True if found and False if otherwise
+        """
+        shard = self._shard(key)
+        self._connections[shard].send(("search", array("q", [key]).tobytes()))
+        return self._gather([shard])[0] == b"\x01"
+
+    def search_many(self, keys):
+        """
+        Searches for a batch of keys, every shard searching for its part in
+        parallel.
+
+        Returns:
+        A list of booleans, True where the key at the same position of
+        keys is in the index.
+        """
+        keys = list(keys)
+        order = sorted(range(len(keys)), key = keys.__getitem__)
+        ordered = array("q", [keys[position] for position in order])
+        splits = self._split(ordered)
+        shards = [shard for shard in range(self.shards) if splits[shard] < splits[shard + 1]]
+        for shard in shards:
+            self._connections[shard].send(
+                ("search", ordered[splits[shard]:splits[shard + 1]].tobytes()))
+
+        found = [False] * len(keys)
+        for shard, replies in zip(shards, self._gather(shards)):
+            for position, reply in zip(order[splits[shard]:splits[shard + 1]], replies):
+                found[position] = reply == 1
+        return found
+
+    def range(self, low, high):
+        """
+        Returns a list of the keys k with low <= k < high, in ascending
+        order, from every shard whose key range overlaps it.
+        """
+        return self.range_many([(low, high)])[0]
+
+    def range_many(self, queries):
+        """
+        Runs a batch of range queries. Every shard gets the queries that
+        overlap its key range in one message and answers them in parallel
+        with the others; since the shards hold consecutive key ranges, the
+        ordered answers of a query are merged by concatenating them in
+        shard order.
+
+        Parameters:
+        - queries: Pairs (low, high) of an inclusive lower bound and an
+        exclusive upper bound.
+
+        Returns:
+        A list with the sorted keys of every query.
+        """
+        queries = list(queries)
+        routed = [[] for _ in range(self.shards)]
+        for number, (low, high) in enumerate(queries):
+            if low < high:
+                # high is exclusive, so a shard starting at high is not needed
+                for shard in range(self._shard(low), self._shard(high - 1) + 1):
+                    routed[shard].append(number)
+        shards = [shard for shard in range(self.shards) if routed[shard]]
+        for shard in shards:
+            bounds = array("q")
+            for number in routed[shard]:
+                bounds.extend(queries[number])
+            self._connections[shard].send(("range", bounds.tobytes()))
+
+        results = [[] for _ in queries]
+        for shard, (counts, found) in zip(shards, self._gather(shards)):
+            found = array("q", found)
+            start = 0
+            for number, count in zip(routed[shard], array("q", counts)):
+                results[number].extend(found[start:start + count])
+                start += count
+        return results
+
+    def __len__(self):
+        for connection in self._connections:
+            connection.send(("len",))
+        return sum(self._gather(range(self.shards)))
+
+    def close(self):
+        """
+        Stops the worker processes.
+        """
+        for connection, process in zip(self._connections, self._processes):
+            if process.is_alive():
+                connection.send(("close",))
+            process.join()
+            connection.close()
+        self._connections = []
+        self._processes = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -1,54 +1,66 @@
-from random import randint
+from array import array
+from heapq import merge
+from itertools import pairwise
+from math import ceil, log
+from operator import attrgetter
+from random import Random
+from sys import getsizeof
+from time import perf_counter
+from ordering import make_key, make_query
+from snapshot import SnapshotView, write_snapshot
 
 class SkipNode:
-    def __init__(self, height = 1, value = None):
+    __slots__ = ("value", "next", "previous", "width")
+
+    def __init__(self, height = 1, value = None, back_pointers = True):
         self.value = value
         self.next = [None] * height
-        self.previous = [None] * height
+        # number of bottom level steps covered by the link on each level
+        self.width = [1] * height
+        self.previous = [None] * height if back_pointers else None
 
     def __lt__(self, other):
         if isinstance(other, SkipNode):
             return self.value < other.value
-        elif isinstance(other, int):
-            return self.value < other
-        return NotImplemented
+        return self.value < other
 
     def __le__(self, other):
         if isinstance(other, SkipNode):
             return self.value <= other.value
-        elif isinstance(other, int):
-            return self.value <= other
-        return NotImplemented
+        return self.value <= other
 
     def __gt__(self, other):
         if isinstance(other, SkipNode):
             return self.value > other.value
-        elif isinstance(other, int):
-            return self.value > other
-        return NotImplemented
+        return self.value > other
 
     def __ge__(self, other):
         if isinstance(other, SkipNode):
             return self.value >= other.value
-        elif isinstance(other, int):
-            return self.value >= other
-        return NotImplemented
+        return self.value >= other
 
     def __eq__(self, other):
         if isinstance(other, SkipNode):
             return self.value == other.value
-        elif isinstance(other, int):
-            return self.value == other
-        return NotImplemented
+        return self.value == other
 
     def __ne__(self, other):
         if isinstance(other, SkipNode):
             return self.value != other.value
-        elif isinstance(other, int):
-            return self.value != other
-        return NotImplemented
+        return self.value != other
+
+class KeyedSkipNode(SkipNode):
+    # holds an item besides its value: the item a key function was applied
+    # to, value caching the result, or the value of an OrderedMap entry
+    __slots__ = ("item",)
+
+    def __init__(self, height, value, back_pointers, item):
+        super().__init__(height, value, back_pointers)
+        self.item = item
 
 class Head(SkipNode):
+    __slots__ = ()
+
     def __lt__(self, other):
         return True
 
@@ -68,74 +80,843 @@ class Head(SkipNode):
         return True
 
 class SkipList:
-    def __init__(self):
-        self.head = Head()
+    def __init__(self, back_pointers = True, seed = None, p = 0.5, expected_n = None,
+                 key = None, cmp = None):
+        """
+        Parameters:
+        - back_pointers (bool): Whether nodes keep previous pointers. Without
+        them every node saves one list, but the list can only be walked
+        forwards.
+        - seed: Seeds the generator of node levels, so that runs can be
+        reproduced. Every skip list has its own generator.
+        - p (float): The probability that a node is promoted one more level.
+        - expected_n (int): The number of values the list is expected to
+        hold. Levels are capped at log base 1/p of it, plus one, since
+        higher levels would rarely be used; without it the cap is 64.
+        - key: A function giving the key an item is ordered by, computed
+        once when the item is inserted and cached in its node. Lookups
+        such as search, delete, rank and range then take keys, not items.
+        - cmp: An old style comparison function of two keys, see
+        ordering.make_key.
+        """
+        if not 0 < p < 1:
+            raise ValueError("p must be between 0 and 1")
+        self.back_pointers = back_pointers
+        self.p = p
+        self._rng = Random(seed)
+        self._random_word = self._rng.getrandbits
+        self.max_level = 64
+        if expected_n is not None:
+            self.max_level = max(1, ceil(log(max(expected_n, 2), 1 / p))) + 1
+        # when p is 1 / 2**k a level is k zero bits of a random word
+        inverse = round(1 / p)
+        power_of_two = inverse * p == 1 and inverse & (inverse - 1) == 0
+        self._bits_per_level = inverse.bit_length() - 1 if power_of_two else 0
+        self.head = Head(back_pointers = back_pointers)
         self.len = 0
         self.max_height = 0
+        # None unless items are ordered by something other than themselves,
+        # in which case nodes also hold the item
+        self._key = make_key(key, cmp)
+        self._query = make_query(cmp)
+        self._item = attrgetter("value" if self._key is None else "item")
+        # a stats.Stats that operations report to, if set
+        self.stats = None
+        # the last node before the value of the last finger operation on
+        # every level, and their positions; cleared by other updates
+        self._finger = None
 
     def __len__(self):
         return self.len
 
+    @property
+    def size(self):
+        """
+        The number of values in the skip list, in O(1).
+        """
+        return self.len
+
+    @property
+    def height(self):
+        """
+        The number of levels in use, in O(1).
+        """
+        return self.max_height
+
+    @classmethod
+    def from_sorted(cls, iterable, **kwargs):
+        """
+        Builds a skip list directly from values in non-decreasing order in
+        O(n). Levels are deterministic: the i-th value (counting from 1) is
+        promoted once for every trailing zero bit of i, which gives the
+        same level distribution as fair coin flips (once for every k
+        trailing zero bits when p is 1 / 2**k; for other values of p the
+        levels are drawn from the seeded generator).
+
+        Parameters:
+        - iterable: The sorted values.
+        - kwargs: Passed on to the SkipList constructor.
+
+        Returns:
+        A new SkipList containing every value.
+
+        Raises:
+        - ValueError: If the values are not sorted.
+        """
+        values = list(iterable)
+        skip_list = cls(**kwargs)
+        keys = values if skip_list._key is None else list(map(skip_list._key, values))
+        if any(previous > key for previous, key in pairwise(keys)):
+            raise ValueError("values must be sorted in non-decreasing order")
+        skip_list._build_from_sorted(values)
+        return skip_list
+
+    def bulk_insert(self, iterable):
+        """
+        Inserts many values at once by sorting them, merging them with the
+        values already stored and rebuilding the list in O(n + m log m).
+
+        Parameters:
+        - iterable: The values to insert, in any order.
+        """
+        values = sorted(iterable, key = self._key)
+        if self.head.next[0]:
+            values = list(merge(self._items(), values, key = self._key))
+        self._build_from_sorted(values)
+
+    def union(self, other):
+        """
+        Adds every value of other to this skip list, as inserting them one
+        by one would, by merging the two bottom levels and rebuilding in
+        O(n + m).
+
+        Parameters:
+        - other: A SkipList ordered the same way. It is left empty.
+
+        Raises:
+        - TypeError: If other is not a SkipList ordered the same way.
+        """
+        self._check_compatible(other)
+        values = list(merge(self._items(), other._items(), key = self._key))
+        other._build_from_sorted([])
+        self._build_from_sorted(values)
+
+    def intersection(self, other):
+        """
+        Keeps only the values of this skip list that other also holds, in
+        O(n + m).
+
+        Parameters:
+        - other: A SkipList ordered the same way. It is left empty.
+
+        Raises:
+        - TypeError: If other is not a SkipList ordered the same way.
+        """
+        self._merge_filter(other, True)
+
+    def difference(self, other):
+        """
+        Removes every occurrence of the values other holds from this skip
+        list, in O(n + m).
+
+        Parameters:
+        - other: A SkipList ordered the same way. It is left empty.
+
+        Raises:
+        - TypeError: If other is not a SkipList ordered the same way.
+        """
+        self._merge_filter(other, False)
+
+    def _merge_filter(self, other, common):
+        # rebuilds from the values that other holds when common, or that
+        # it does not otherwise, walking both bottom levels side by side
+        self._check_compatible(other)
+        values = []
+        other_nodes = other._in_order_nodes()
+        other_node = next(other_nodes, None)
+        for node in self._in_order_nodes():
+            while other_node is not None and other_node.value < node.value:
+                other_node = next(other_nodes, None)
+            if (other_node is not None and other_node.value == node.value) == common:
+                values.append(self._item(node))
+        other._build_from_sorted([])
+        self._build_from_sorted(values)
+
+    def _check_compatible(self, other):
+        if type(other) is not type(self) or (other._key is None) != (self._key is None):
+            raise TypeError(f"expected a {type(self).__name__} ordered like this one")
+
+    def save(self, path):
+        """
+        Saves the skip list to a snapshot file: the values in order plus the
+        level of every node, so load() rebuilds exactly the same list.
+
+        Parameters:
+        - path: The file to write. It is replaced atomically.
+
+        Raises:
+        - TypeError, OverflowError: If a value is not an integer that fits
+        in 64 bits, or the list orders its items by a key function.
+        """
+        if self._key is not None:
+            raise TypeError("only skip lists of plain integer values can be saved")
+        values = array("q")
+        heights = array("B")
+        node = self.head.next[0]
+        while node:
+            values.append(node.value)
+            heights.append(len(node.next))
+            node = node.next[0]
+        write_snapshot(path, "skip_list", values, [heights])
+
+    @classmethod
+    def load(cls, path, lazy = False, **kwargs):
+        """
+        Loads a skip list saved with save().
+
+        Parameters:
+        - path: The snapshot file.
+        - lazy (bool): Instead of building nodes, return a read-only
+        SnapshotView that answers search, range, rank and select straight
+        from the memory mapped file. It is ready in O(1) whatever the size
+        of the snapshot, and must be closed when done.
+        - kwargs: Passed on to the SkipList constructor.
+
+        Returns:
+        A SkipList with the saved values and levels, or a SnapshotView.
+
+        Raises:
+        - ValueError: If the file is not a skip list snapshot.
+        """
+        snapshot = SnapshotView(path)
+        if snapshot.kind != "skip_list" or len(snapshot.metadata) != 1:
+            snapshot.close()
+            raise ValueError(f"{path} is not a skip list snapshot")
+        if lazy:
+            return snapshot
+        with snapshot:
+            skip_list = cls(**kwargs)
+            skip_list._build_from_sorted(snapshot.keys, snapshot.metadata[0])
+        return skip_list
+
+    def _build_from_sorted(self, values, heights = None):
+        self._finger = None
+        back_pointers = self.back_pointers
+        head = self.head = Head(back_pointers = back_pointers)
+        # last node linked on each level so far, and its position
+        tails = [head]
+        tail_positions = [0]
+        for index, value in enumerate(values, 1):
+            if heights is None:
+                height = self._sorted_height(index)
+            else:
+                height = heights[index - 1]
+            if self._key is None:
+                new_node = SkipNode(height, value, back_pointers)
+            else:
+                new_node = KeyedSkipNode(height, self._key(value), back_pointers, value)
+            while len(tails) < height:
+                self._add_head_level()
+                tails.append(head)
+                tail_positions.append(0)
+            for level in range(height):
+                if back_pointers:
+                    new_node.previous[level] = tails[level]
+                tails[level].next[level] = new_node
+                tails[level].width[level] = index - tail_positions[level]
+                tails[level] = new_node
+                tail_positions[level] = index
+
+        self.max_height = len(head.next) if values else 0
+        self.len = len(values)
+
+    def _add_head_level(self):
+        self.head.next.append(None)
+        self.head.width.append(1)
+        if self.back_pointers:
+            self.head.previous.append(None)
+
+    def _values(self):
+        node = self.head.next[0]
+        while node:
+            yield node.value
+            node = node.next[0]
+
+    def _items(self):
+        # the values themselves unless items are ordered by a key function
+        if self._key is None:
+            return self._values()
+        return map(self._item, self._in_order_nodes())
+
+    def _in_order_nodes(self):
+        return self._walk_from(self.head.next[0])
+
+    def _walk_from(self, node):
+        # the nodes from node to the end of the bottom level
+        while node:
+            yield node
+            node = node.next[0]
+
+    def __iter__(self):
+        """
+        Iterates over the values in ascending order along the bottom level.
+        """
+        return self._items()
+
+    def __reversed__(self):
+        """
+        Iterates over the values in descending order. With back pointers
+        this walks the previous pointers from the last node; without them
+        the values have to be collected first.
+        """
+        if not self.back_pointers:
+            yield from reversed(list(self._items()))
+            return
+
+        # find the last node by running to the end of every level
+        current_node = self.head
+        for level in reversed(range(self.max_height)):
+            while current_node.next[level]:
+                current_node = current_node.next[level]
+
+        while current_node is not self.head:
+            yield self._item(current_node)
+            current_node = current_node.previous[0]
+
+    def iter_from(self, value):
+        """
+        Iterates lazily, in ascending order, over the values greater than
+        or equal to value, in O(log n) for the first one and O(1) after.
+
+        Parameters:
+        - value: The smallest value to yield.
+        """
+        return map(self._item, self._nodes_from(self._query_key(value)))
+
+    def _nodes_from(self, value):
+        current_node = self.head
+        for level in reversed(range(self.max_height)):
+            while current_node.next[level] and current_node.next[level].value < value:
+                current_node = current_node.next[level]
+        return self._walk_from(current_node.next[0])
+
+    def _find_node(self, value):
+        # the first node holding value, or None
+        node = next(self._nodes_from(value), None)
+        return node if node is not None and node.value == value else None
+
+    def _floor_node(self, value):
+        # the last node whose value is at most value, or None
+        current_node = self.head
+        for level in reversed(range(self.max_height)):
+            while current_node.next[level] and current_node.next[level].value <= value:
+                current_node = current_node.next[level]
+        return None if current_node is self.head else current_node
+
+    def _query_key(self, value):
+        # what a key passed to a lookup is compared as
+        return value if self._query is None else self._query(value)
+
+    def range(self, low, high):
+        """
+        Iterates lazily, in ascending order, over the values v with
+        low <= v < high, in O(log n + k).
+
+        Parameters:
+        - low: The inclusive lower bound.
+        - high: The exclusive upper bound.
+        """
+        high = self._query_key(high)
+        for node in self._nodes_from(self._query_key(low)):
+            if not node.value < high:
+                return
+            yield self._item(node)
+
+    def validate(self, time_budget = None, seed = None, sample_size = 1024):
+        """
+        Checks every invariant of the skip list in one pass along the bottom
+        level: values are in order, every link on every level points to the
+        next node tall enough for that level, link widths match the
+        positions, previous pointers mirror next pointers, and len and
+        max_height are right.
+
+        Parameters:
+        - time_budget (float): If given, only random runs of sample_size
+        consecutive nodes are checked, until this many seconds have passed.
+        At least one run is always checked.
+        - seed: Seed for choosing the sampled runs.
+        - sample_size (int): The length of the sampled runs.
+
+        Returns:
+        True if no violation was found, False otherwise.
+        """
+        head = self.head
+        if any(head.next[level] for level in range(self.max_height, len(head.next))):
+            return False
+        if self.max_height and not head.next[self.max_height - 1]:
+            return False
+        if time_budget is None:
+            return self._validate_run([head] * self.max_height, [0] * self.max_height, None)
+
+        rng = Random(seed)
+        deadline = perf_counter() + time_budget
+        while True:
+            predecessors, positions = self._predecessors_at(rng.randrange(self.len + 1))
+            if not self._validate_run(predecessors, positions, sample_size):
+                return False
+            if perf_counter() >= deadline:
+                return True
+
+    def _predecessors_at(self, position):
+        # the last node at or before the position on each level, and where it is
+        predecessors = [self.head] * self.max_height
+        positions = [0] * self.max_height
+        current_position = 0
+        current_node = self.head
+        for level in reversed(range(self.max_height)):
+            while (current_node.next[level]
+                   and current_position + current_node.width[level] <= position):
+                current_position += current_node.width[level]
+                current_node = current_node.next[level]
+            predecessors[level] = current_node
+            positions[level] = current_position
+        return predecessors, positions
+
+    def _validate_run(self, predecessors, positions, count):
+        # walks count nodes (all of them if None) after predecessors[0],
+        # checking each against the last node seen on every level it is on
+        predecessors = list(predecessors)
+        positions = list(positions)
+        current_node = predecessors[0] if predecessors else self.head
+        position = positions[0] if positions else 0
+        previous_value = current_node.value
+        while count is None or count > 0:
+            current_node = current_node.next[0]
+            if current_node is None:
+                break
+            position += 1
+            if count is not None:
+                count -= 1
+            if position > self.len or len(current_node.next) > self.max_height:
+                return False
+            if position > 1 and current_node.value < previous_value:
+                return False
+            previous_value = current_node.value
+            for level in range(len(current_node.next)):
+                predecessor = predecessors[level]
+                if predecessor.next[level] is not current_node:
+                    return False
+                if predecessor.width[level] != position - positions[level]:
+                    return False
+                if self.back_pointers and current_node.previous[level] is not predecessor:
+                    return False
+                predecessors[level] = current_node
+                positions[level] = position
+
+        # a full walk must end with every level's last link pointing nowhere
+        if count is None:
+            if position != self.len:
+                return False
+            return all(node.next[level] is None for level, node in enumerate(predecessors))
+        return True
+
+    def memory_footprint(self):
+        """
+        Measures the memory held by the skip list, for sizing hosts.
+
+        Returns:
+        A dict with the number of nodes, the bytes taken by the nodes and
+        their pointer lists, the bytes taken by the values (small ints are
+        shared by Python, so this is an upper bound) and the total bytes
+        per value.
+        """
+        nodes = value_bytes = 0
+        node_bytes = self._node_bytes(self.head)
+        node = self.head.next[0]
+        while node:
+            nodes += 1
+            node_bytes += self._node_bytes(node)
+            value_bytes += getsizeof(node.value)
+            node = node.next[0]
+
+        return {
+            "nodes": nodes,
+            "node_bytes": node_bytes,
+            "key_bytes": value_bytes,
+            "bytes_per_key": (node_bytes + value_bytes) / nodes if nodes else 0.0,
+        }
+
+    def _node_bytes(self, node):
+        size = getsizeof(node) + getsizeof(node.next) + getsizeof(node.width)
+        if node.previous is not None:
+            size += getsizeof(node.previous)
+        return size
+
     def _get_new_height(self):
+        # one 64 bit word per node instead of a call per coin flip: the
+        # number of trailing zero bits is geometric with p = 1/2, and every
+        # k zero bits are one promotion when p = 1 / 2**k
+        bits = self._bits_per_level
+        if bits:
+            word = self._random_word(64)
+            if not word:
+                return self.max_level
+            # word & -word keeps only the lowest set bit
+            height = ((word & -word).bit_length() - 1) // bits + 1
+            return height if height < self.max_level else self.max_level
+
         height = 1
-        while randint(0, 1) == 0:
+        random = self._rng.random
+        while height < self.max_level and random() < self.p:
             height += 1
         return height
 
-    def insert(self, value):
-        new_node = SkipNode(self._get_new_height(), value)
-        head = self.head
+    def _sorted_height(self, index):
+        # the deterministic level of the index-th value of a bulk build,
+        # with the same distribution as _get_new_height
+        bits = self._bits_per_level
+        if bits:
+            zeros = (index & -index).bit_length() - 1
+            return min(zeros // bits + 1, self.max_level)
+        return self._get_new_height()
 
-        # update max height and head next values
-        self.max_height = max(self.max_height, len(new_node.next))
-        while len(head.next) < len(new_node.next):
-            head.next.append(None)
-            head.previous.append(None)
+    def search(self, value):
+        """
+        Search for a value in the skip list.
+
+        Parameters:
+        - value: The value to search for.
+
+        Returns:
+        - True if found and False if otherwise
+        """
+        value = self._query_key(value)
+        if self.stats is not None:
+            return self._counted_search(value)
 
-        # find the correct place at each level
         current_node = self.head
         for level in reversed(range(self.max_height)):
-            while current_node.next[level] and current_node.next[level] < value:
+            while current_node.next[level] and current_node.next[level].value < value:
                 current_node = current_node.next[level]
 
-            # update next and previous pointers
-            if level < len(new_node.next):
-                new_node.previous[level] = current_node
-                new_node.next[level] = current_node.next[level]
-                current_node.next[level] = new_node
-                # Node isn't at the end of a list
-                if new_node.next[level]:
-                    next_node = new_node.next[level]
-                    next_node.previous[level] = new_node
+        current_node = current_node.next[0]
+        return current_node is not None and current_node.value == value
+
+    def _counted_search(self, value):
+        # search that records its hops, and a comparison ending every level
+        visits = 0
+        current_node = self.head
+        for level in reversed(range(self.max_height)):
+            while current_node.next[level] and current_node.next[level].value < value:
+                current_node = current_node.next[level]
+                visits += 1
+
+        current_node = current_node.next[0]
+        self.stats.record(comparisons = visits + self.max_height, visits = visits)
+        return current_node is not None and current_node.value == value
+
+    def search_many(self, values):
+        """
+        Searches for a batch of values with a single forward sweep of the
+        bottom level. The batch is sorted and merged against the stored
+        values, so the cost is O(n + m log m).
+
+        Parameters:
+        - values: The values to search for.
+
+        Returns:
+        A list of booleans, True where the value at the same position of
+        values is in the skip list.
+        """
+        values = [self._query_key(value) for value in values]
+        found = [False] * len(values)
+        current_node = self.head.next[0]
+        for index in sorted(range(len(values)), key=values.__getitem__):
+            value = values[index]
+            while current_node and current_node.value < value:
+                current_node = current_node.next[0]
+            if current_node is None:
+                break
+            found[index] = current_node.value == value
+        return found
+
+    def insert(self, value):
+        """
+        Inserts a new value into the skip list.
+
+        Parameters:
+        - value: The value to be inserted.
+        """
+        self._insert(value)
 
     def insert_steps_and_promotions(self, value):
+        """
+        Inserts a value and returns the number of horizontal steps taken
+        and the number of levels it was promoted above the bottom one.
+        """
+        return self._insert(value)
+
+    def _insert(self, value):
+        height = self._get_new_height()
+        if self._key is None:
+            return self._insert_node(SkipNode(height, value, self.back_pointers))
+        return self._insert_node(KeyedSkipNode(height, self._key(value), self.back_pointers, value))
+
+    def _insert_entry(self, value, item):
+        # inserts a node holding item under value
+        return self._insert_node(KeyedSkipNode(self._get_new_height(), value,
+                                               self.back_pointers, item))
+
+    def _insert_node(self, new_node):
         steps = 0
-        promotions = self._get_new_height()
-        new_node = SkipNode(promotions, value)
+        value = new_node.value
+        height = len(new_node.next)
         head = self.head
+        self._finger = None
 
         # update max height and head next values
-        self.max_height = max(self.max_height, len(new_node.next))
-        while len(head.next) < len(new_node.next):
-            head.next.append(None)
-            head.previous.append(None)
+        self.max_height = max(self.max_height, height)
+        while len(head.next) < height:
+            self._add_head_level()
 
-        # find the correct place at each level
-        current_node = self.head
+        # find the correct place at each level, keeping track of the
+        # position of the predecessor on the bottom level
+        predecessors = [head] * height
+        positions = [0] * height
+        position = 0
+        current_node = head
         for level in reversed(range(self.max_height)):
-            while current_node.next[level] and current_node.next[level] < value:
+            while current_node.next[level] and current_node.next[level].value < value:
+                position += current_node.width[level]
                 current_node = current_node.next[level]
                 steps += 1
 
-            # update next and previous pointers
-            if level < len(new_node.next):
+            if level < height:
+                predecessors[level] = current_node
+                positions[level] = position
+            elif current_node.next[level]:
+                # the link now jumps over the new node as well
+                current_node.width[level] += 1
+
+        self._link(new_node, predecessors, positions, position + 1)
+        self.len += 1
+        if self.stats is not None:
+            self.stats.record(comparisons = steps + self.max_height, visits = steps,
+                              promotions = height - 1)
+        # height - 1 because by default it will be in the bottom list
+        return (steps, height - 1)
+
+    def _link(self, new_node, predecessors, positions, position):
+        # update next, previous and width of the links the node splits,
+        # position being the one the node takes
+        for level in range(len(new_node.next)):
+            current_node = predecessors[level]
+            next_node = current_node.next[level]
+            distance = position - positions[level]
+            new_node.next[level] = next_node
+            current_node.next[level] = new_node
+            if next_node:
+                new_node.width[level] = current_node.width[level] - distance + 1
+            current_node.width[level] = distance
+            if self.back_pointers:
                 new_node.previous[level] = current_node
-                new_node.next[level] = current_node.next[level]
-                current_node.next[level] = new_node
                 # Node isn't at the end of a list
-                if new_node.next[level]:
-                    next_node = new_node.next[level]
+                if next_node:
                     next_node.previous[level] = new_node
 
-        # promotions - 1 because by default it will be in the bottom list
-        return (steps, promotions - 1)
+    def finger_insert(self, value):
+        """
+        Inserts a value starting from where the previous finger_insert or
+        finger_search ended rather than from the head. The search climbs
+        from the bottom level only as high as it needs to, so a value d
+        positions away from the previous one takes O(log d) expected
+        steps: O(1) for values arriving in order.
+
+        Parameters:
+        - value: The value to be inserted.
+        """
+        height = self._get_new_height()
+        if self._key is None:
+            new_node = SkipNode(height, value, self.back_pointers)
+        else:
+            new_node = KeyedSkipNode(height, self._key(value), self.back_pointers, value)
+        self.max_height = max(self.max_height, height)
+        while len(self.head.next) < height:
+            self._add_head_level()
+
+        predecessors, positions, visits = self._finger_locate(new_node.value)
+        # the links above the node now jump over it as well
+        for level in range(height, self.max_height):
+            if predecessors[level].next[level]:
+                predecessors[level].width[level] += 1
+        self._link(new_node, predecessors, positions, positions[0] + 1)
+        self.len += 1
+        # nothing before the new node moved, so the finger still holds
+        self._finger = (predecessors, positions)
+        if self.stats is not None:
+            self.stats.record(comparisons = visits + self.max_height, visits = visits,
+                              promotions = height - 1)
+
+    def finger_search(self, value):
+        """
+        Search for a value starting from where the previous finger_insert
+        or finger_search ended, in O(log d) expected steps for a value d
+        positions away.
+
+        Returns:
+        - True if found and False if otherwise
+        """
+        value = self._query_key(value)
+        predecessors, positions, visits = self._finger_locate(value)
+        self._finger = (predecessors, positions)
+        if self.stats is not None:
+            self.stats.record(comparisons = visits + self.max_height, visits = visits)
+        node = predecessors[0].next[0] if predecessors else None
+        return node is not None and node.value == value
+
+    def _finger_locate(self, value):
+        # the last node before value on every level, their positions and
+        # the number of forward hops, starting from the finger
+        head = self.head
+        max_height = self.max_height
+        if self._finger is None:
+            predecessors = [head] * max_height
+            positions = [0] * max_height
+            top = max_height
+        else:
+            predecessors, positions = self._finger
+            # levels added since hold nothing before the finger but the head
+            predecessors.extend([head] * (max_height - len(predecessors)))
+            positions.extend([0] * (max_height - len(positions)))
+            # climb to the lowest level whose finger node is still the last
+            # one before value; the finger nodes above it are as well
+            top = 0
+            while top < max_height:
+                node = predecessors[top]
+                if node is head or node.value < value:
+                    next_node = node.next[top]
+                    if next_node is None or not next_node.value < value:
+                        break
+                top += 1
+
+        visits = 0
+        current_node = predecessors[top] if top < max_height else head
+        position = positions[top] if top < max_height else 0
+        for level in reversed(range(top)):
+            # the finger node of this level may already be further along
+            node = predecessors[level]
+            if positions[level] > position and node.value < value:
+                current_node = node
+                position = positions[level]
+            while current_node.next[level] and current_node.next[level].value < value:
+                position += current_node.width[level]
+                current_node = current_node.next[level]
+                visits += 1
+            predecessors[level] = current_node
+            positions[level] = position
+        return predecessors, positions, visits
+
+    def delete(self, value):
+        """
+        Removes one occurrence of value from the skip list.
+
+        Parameters:
+        - value: The value to remove.
+
+        Returns:
+        True if the value was found and removed, False otherwise.
+        """
+        return self._delete(value)[0]
+
+    def delete_steps_and_demotions(self, value):
+        """
+        Removes one occurrence of value and returns the number of
+        horizontal steps taken and the number of levels the removed node
+        occupied above the bottom one.
+        """
+        return self._delete(value)[1:]
+
+    def _delete(self, value):
+        self._finger = None
+        value = self._query_key(value)
+        steps = 0
+        predecessors = [self.head] * self.max_height
+        current_node = self.head
+        for level in reversed(range(self.max_height)):
+            while current_node.next[level] and current_node.next[level].value < value:
+                current_node = current_node.next[level]
+                steps += 1
+            predecessors[level] = current_node
+
+        target = current_node.next[0]
+        if self.stats is not None:
+            self.stats.record(comparisons = steps + self.max_height, visits = steps)
+        if target is None or target.value != value:
+            return (False, steps, 0)
+
+        # unlink the node on its levels and shorten the links above it
+        height = len(target.next)
+        for level, current_node in enumerate(predecessors):
+            if level < height:
+                next_node = target.next[level]
+                current_node.width[level] += target.width[level] - 1
+                current_node.next[level] = next_node
+                if self.back_pointers and next_node:
+                    next_node.previous[level] = current_node
+            elif current_node.next[level]:
+                current_node.width[level] -= 1
+
+        while self.max_height and not self.head.next[self.max_height - 1]:
+            self.max_height -= 1
+        self.len -= 1
+        return (True, steps, height - 1)
+
+    def rank(self, value):
+        """
+        Returns the number of values strictly smaller than value, in
+        O(log n) using the link widths.
+
+        Parameters:
+        - value: The value to rank.
+        """
+        value = self._query_key(value)
+        rank = 0
+        current_node = self.head
+        for level in reversed(range(self.max_height)):
+            while current_node.next[level] and current_node.next[level].value < value:
+                rank += current_node.width[level]
+                current_node = current_node.next[level]
+        return rank
+
+    def select(self, index):
+        """
+        Returns the value at position index of the sorted order, in
+        O(log n).
+
+        Parameters:
+        - index (int): The zero based position.
+
+        Raises:
+        - IndexError: If index is not in range(len(self)).
+        """
+        if not 0 <= index < self.len:
+            raise IndexError("skip list index out of range")
+
+        # positions are counted from 1, the head being position 0
+        target = index + 1
+        position = 0
+        current_node = self.head
+        for level in reversed(range(self.max_height)):
+            while (current_node.next[level]
+                   and position + current_node.width[level] <= target):
+                position += current_node.width[level]
+                current_node = current_node.next[level]
+            if position == target:
+                break
+        return self._item(current_node)
+
+    def count_range(self, low, high):
+        """
+        Returns the number of values v with low <= v < high, in O(log n).
+        """
+        return max(0, self.rank(high) - self.rank(low))
@@ -6,11 +6,15 @@ class AVLNode:
     """
     
     """
+    __slots__ = ("key", "left", "right", "height", "size")
+
     def __init__(self, key):
         self.key = key
         self.left = None
         self.right = None
-        self.height = 0
+        self.height = 1
+        # number of nodes in the subtree rooted here
+        self.size = 1
 
     def __str__(self):
         return f"{self.key}"
@@ -22,10 +26,38 @@ class AVLNode:
         self.height = new_height
 
 
+class KeyedAVLNode(AVLNode):
+    """
+    Node that holds an item besides its key: the item a key function was
+    applied to, key caching the result, or the value of an OrderedMap entry.
+    """
+    __slots__ = ("item",)
+
+    def __init__(self, key, item):
+        super().__init__(key)
+        self.item = item
+
+
 class AVLTree(BinaryTree):
     """
     
     """
+    _snapshot_kind = "avl"
+    _snapshot_attributes = ("height",)
+
+    def __init__(self, key = None, cmp = None):
+        """
+        Parameters:
+        - key, cmp: Order the items by a key function or a comparison
+        function instead of by themselves, see BinaryTree.
+        """
+        super().__init__(key, cmp)
+        # search path of the current insert or delete, reused to avoid allocations
+        self._path = []
+        # the right spine as of the last finger_insert, None once anything
+        # else may have changed it
+        self._spine = None
+
     def insert(self, key):
         """
         Inserts a new key into the Tree.
@@ -33,45 +65,368 @@ class AVLTree(BinaryTree):
         Args:
             key: The key to be inserted into the Tree.
         """
-        self.root = self._insert(self.root, key)
-
-    def _insert(self, node, key):
-        # Rec cases
-        if node is None:
-            return AVLNode(key)
-        if key < node.key:
-            node.left = self._insert(node.left, key)
+        self._insert(key)
+
+    def _insert(self, item):
+        return self._insert_node(self._new_node(item))
+
+    def _new_node(self, item):
+        if self._key is None:
+            return AVLNode(item)
+        return KeyedAVLNode(self._key(item), item)
+
+    def _insert_entry(self, key, item):
+        # inserts a node holding item under key
+        return self._insert_node(KeyedAVLNode(key, item))
+
+    def _insert_node(self, new_node):
+        self._spine = None
+        key = new_node.key
+        # Walk down iteratively, recording the path for the retrace
+        path = self._path
+        path.clear()
+        node = self.root
+        while node:
+            path.append(node)
+            node = node.left if key < node.key else node.right
+        return self._attach(new_node, len(path))
+
+    def _attach(self, new_node, comparisons):
+        # hangs new_node below the end of self._path and rebalances
+        path = self._path
+        key = new_node.key
+        if not path:
+            self.root = new_node
+            self._leaf_count = 1
+            if self.stats is not None:
+                self.stats.record()
+            return (0, 0)
+
+        steps = len(path)
+        for node in path:
+            node.size += 1
+        parent = path[-1]
+        # the new node is a leaf, and only replaces one if the parent was
+        if parent.left or parent.right:
+            self._leaf_count += 1
+        if key < parent.key:
+            parent.left = new_node
+        else:
+            parent.right = new_node
+
+        rotations = self._retrace_insert(key)
+        if self.stats is not None:
+            self.stats.record(comparisons = comparisons, visits = steps, rotations = rotations)
+        return (steps, rotations)
+
+    def finger_insert(self, key):
+        """
+        Inserts a key, searching for its place from the largest key up
+        rather than from the root down. The right spine, the path from the
+        root to the largest key, is kept between finger inserts, so
+        appending a key no smaller than any in the tree takes one
+        comparison and no search, and a key that k keys in the tree are
+        larger than takes O(log k) comparisons. A rotation on the spine
+        has only the part below it walked again. Sorted and nearly sorted
+        streams insert faster than through insert; the subtree sizes on
+        the path are still updated.
+
+        Parameters:
+        - key: The key to be inserted into the tree.
+        """
+        new_node = self._new_node(key)
+        key = new_node.key
+        spine = self._spine
+        if spine is None:
+            spine = self._spine = []
+            node = self.root
+            while node:
+                spine.append(node)
+                node = node.right
+        path = self._path
+        path[:] = spine
+        if not spine or not key < spine[-1].key:
+            comparisons = 1 if spine else 0
+            end = len(spine)
+            spine.append(new_node)
+        else:
+            # the spine keys grow downwards, so compare them from the bottom
+            # up until one is no larger than key, then descend left of the
+            # one below it
+            comparisons = 1
+            end = len(path) - 1
+            while end and key < path[end - 1].key:
+                end -= 1
+                comparisons += 1
+            del path[end + 1:]
+            node = path[-1].left
+            while node:
+                path.append(node)
+                comparisons += 1
+                node = node.left if key < node.key else node.right
+
+        # the retrace leaves the path above the rotated node, if any
+        if self._attach(new_node, comparisons)[1] and len(path) <= end:
+            if spine[end] is new_node:
+                # an append only rotates left, taking that node off the spine
+                del spine[len(path)]
+                return
+            del spine[len(path):]
+            node = spine[-1].right if spine else self.root
+            while node:
+                spine.append(node)
+                node = node.right
+
+    def _retrace_insert(self, key):
+        path = self._path
+        while path:
+            node = path.pop()
+            # Adjust heights of nodes after insertion and check balancing condition
+            height_left = self._get_height(node.left)
+            height_right = self._get_height(node.right)
+            bal_factor = height_left - height_right
+
+            # Perform rotations if required, which restores the height the
+            # subtree had before the insert so nothing above can change
+            if bal_factor > 1:
+                # LL or LR
+                if not key < node.left.key:
+                    node.left = self._rotate_left(node.left)
+                    self._replace_child(node, self._rotate_right(node))
+                    return 2
+                self._replace_child(node, self._rotate_right(node))
+                return 1
+            if bal_factor < -1:
+                # RR or RL
+                if key < node.right.key:
+                    node.right = self._rotate_right(node.right)
+                    self._replace_child(node, self._rotate_left(node))
+                    return 2
+                self._replace_child(node, self._rotate_left(node))
+                return 1
+
+            # stop early once the subtree height no longer changes
+            new_height = 1 + max(height_left, height_right)
+            if new_height == node.height:
+                return 0
+            node.set_height(new_height)
+
+        return 0
+
+    def delete(self, key):
+        """
+        Removes one occurrence of key from the tree.
+
+        Parameters:
+        - key: The key to remove.
+
+        Returns:
+        True if the key was found and removed, False otherwise.
+        """
+        return self._delete(key)[0]
+
+    def delete_steps_and_rotations(self, key):
+        """
+        Removes one occurrence of key and returns the number of steps taken
+        and the number of rebalancing rotations performed.
+
+        Parameters:
+        - key: The key to remove.
+
+        Returns:
+        A tuple containing the number of steps taken during the deletion
+        and the number of rotations, a double rotation counting as two.
+        """
+        return self._delete(key)[1:]
+
+    def _delete(self, key):
+        self._spine = None
+        key = self._query_key(key)
+        path = self._path
+        path.clear()
+        node = self.root
+        while node and key != node.key:
+            path.append(node)
+            node = node.left if key < node.key else node.right
+        if not node:
+            if self.stats is not None:
+                self.stats.record(comparisons = len(path), visits = len(path))
+            return (False, len(path), 0)
+
+        # a node with two children takes its successor's key instead
+        if node.left and node.right:
+            path.append(node)
+            successor = node.right
+            while successor.left:
+                path.append(successor)
+                successor = successor.left
+            node.key = successor.key
+            if isinstance(node, KeyedAVLNode):
+                node.item = successor.item
+            node = successor
+
+        steps = len(path)
+        for ancestor in path:
+            ancestor.size -= 1
+        if not node.left and not node.right:
+            # a leaf goes, and its parent becomes one if it has no other child
+            self._leaf_count -= 1
+            if path and not (path[-1].left and path[-1].right):
+                self._leaf_count += 1
+        self._replace_child(node, node.left or node.right)
+        rotations = self._retrace_delete()
+        if self.stats is not None:
+            self.stats.record(comparisons = steps, visits = steps, rotations = rotations)
+        return (True, steps, rotations)
+
+    def _retrace_delete(self):
+        path = self._path
+        rotations = 0
+        while path:
+            node = path.pop()
+            old_height = node.height
+            height_left = self._get_height(node.left)
+            height_right = self._get_height(node.right)
+            bal_factor = height_left - height_right
+
+            if bal_factor > 1:
+                child = node.left
+                if self._get_height(child.left) < self._get_height(child.right):
+                    node.left = self._rotate_left(child)
+                    rotations += 1
+                node = self._replace_child(node, self._rotate_right(node))
+                rotations += 1
+            elif bal_factor < -1:
+                child = node.right
+                if self._get_height(child.right) < self._get_height(child.left):
+                    node.right = self._rotate_right(child)
+                    rotations += 1
+                node = self._replace_child(node, self._rotate_left(node))
+                rotations += 1
+            else:
+                node.set_height(1 + max(height_left, height_right))
+
+            # a subtree that kept its height leaves everything above unchanged
+            if node.height == old_height:
+                break
+
+        return rotations
+
+    def _replace_child(self, node, subtree):
+        # attach subtree where node was, the parent being the top of the path
+        if not self._path:
+            self.root = subtree
+        elif self._path[-1].left is node:
+            self._path[-1].left = subtree
         else:
-            node.right = self._insert(node.right, key)
-
-        # Adjust heights of nodes after insertion and check balancing condition
-        height_left = self._get_height(node.left)
-        height_right = self._get_height(node.right)
-        node.set_height(1 + max(height_left, height_right))
-        bal_factor = height_left - height_right
-
-        # Perform rotations if required
-        if bal_factor > 1:
-            # LL or LR
-            if key < node.left.key:
-                return self._rotate_right(node)
-
-            node.left = self._rotate_left(node.left)
-            return self._rotate_right(node)
-        if bal_factor < -1:
-            # RR or RL
-            if key >= node.right.key:
-                return self._rotate_left(node)
-
-            node.right = self._rotate_right(node.right)
-            return self._rotate_left(node)
+            self._path[-1].right = subtree
+        return subtree
+
+    def _build_from_sorted(self, keys):
+        self._spine = None
+        self._leaf_count = 0
+        self.root = self._build_balanced(keys, 0, len(keys))
+
+    def _build_balanced(self, keys, low, high):
+        # the middle key becomes the root so both halves differ by at most one
+        if low >= high:
+            return None
+        mid = (low + high) // 2
+        if self._key is None:
+            node = AVLNode(keys[mid])
+        else:
+            node = KeyedAVLNode(self._key(keys[mid]), keys[mid])
+        if high - low == 1:
+            self._leaf_count += 1
+        node.left = self._build_balanced(keys, low, mid)
+        node.right = self._build_balanced(keys, mid + 1, high)
+        node.set_height(1 + max(self._get_height(node.left), self._get_height(node.right)))
+        node.size = high - low
+        return node
+
+    def _set_root(self, node):
+        super()._set_root(node)
+        self._spine = None
+
+    def _rank(self, node):
+        return self._get_height(node)
+
+    def _detach(self, node, rank):
+        left, right = node.left, node.right
+        node.left = node.right = None
+        return (left, self._get_height(left)), (right, self._get_height(right))
+
+    def _join(self, left, node, right):
+        left, left_height = left
+        right, right_height = right
+        if left_height > right_height + 1:
+            node = self._join_right(left, node, right, right_height)
+        elif right_height > left_height + 1:
+            node = self._join_left(left, node, right, left_height)
+        else:
+            self._link(node, left, right)
+        return node, node.height
+
+    def _link(self, node, left, right):
+        # makes left and right the children of node and updates it
+        node.left = left
+        node.right = right
+        if left is None:
+            node.size = 1 + (right.size if right else 0)
+            node.height = 1 + (right.height if right else 0)
+        elif right is None:
+            node.size = 1 + left.size
+            node.height = 1 + left.height
+        else:
+            node.size = 1 + left.size + right.size
+            node.height = 1 + (left.height if left.height > right.height else right.height)
+        return node
 
+    def _join_right(self, tree, node, right, right_height):
+        # hangs node, with right below it, from the right spine of the
+        # taller tree where the heights match, rotating on the way back up
+        inner = tree.right
+        if self._get_height(inner) <= right_height + 1:
+            joined = self._link(node, inner, right)
+            if joined.height <= self._get_height(tree.left) + 1:
+                return self._link(tree, tree.left, joined)
+            self._link(tree, tree.left, self._rotate_right(joined))
+            return self._rotate_left(tree)
+        joined = self._join_right(inner, node, right, right_height)
+        self._link(tree, tree.left, joined)
+        if joined.height <= self._get_height(tree.left) + 1:
+            return tree
+        return self._rotate_left(tree)
+
+    def _join_left(self, left, node, tree, left_height):
+        # the mirror image of _join_right
+        inner = tree.left
+        if self._get_height(inner) <= left_height + 1:
+            joined = self._link(node, left, inner)
+            if joined.height <= self._get_height(tree.right) + 1:
+                return self._link(tree, joined, tree.right)
+            self._link(tree, self._rotate_left(joined), tree.right)
+            return self._rotate_right(tree)
+        joined = self._join_left(left, node, inner, left_height)
+        self._link(tree, joined, tree.right)
+        if joined.height <= self._get_height(tree.right) + 1:
+            return tree
+        return self._rotate_right(tree)
+
+    def _snapshot_node(self, key, height):
+        node = AVLNode(key)
+        node.height = height
         return node
 
     def _rotate_left(self, node):
         right_tree = node.right
+        # only node and right_tree can change between leaf and inner node
+        self._leaf_count += ((not node.left and not right_tree.left)
+                             - (not right_tree.left and not right_tree.right))
         node.right = right_tree.left
         right_tree.left = node
+        right_tree.size = node.size
+        node.size = 1 + self._get_size(node.left) + self._get_size(node.right)
 
         # Reset heights
         node.set_height(1 + max(self._get_height(node.left), self._get_height(node.right)))
@@ -82,8 +437,13 @@ class AVLTree(BinaryTree):
 
     def _rotate_right(self, node):
         left_tree = node.left
+        # only node and left_tree can change between leaf and inner node
+        self._leaf_count += ((not node.right and not left_tree.right)
+                             - (not left_tree.left and not left_tree.right))
         node.left = left_tree.right
         left_tree.right = node
+        left_tree.size = node.size
+        node.size = 1 + self._get_size(node.left) + self._get_size(node.right)
 
         # Reset heights
         node.height = 1 + max(self._get_height(node.left), self._get_height(node.right))
@@ -95,76 +455,31 @@ class AVLTree(BinaryTree):
     def insertion_steps_and_rotation(self, key):
         """
         Perform an insertion of a key into the tree and return the number 
-        of steps taken and whether a rotation was performed or not.
+        of steps taken and the number of rotations performed.
 
         Parameters:
         - key: The key to be inserted into the tree.
 
         Returns:
-        A tuple containing the number of steps taken during the 
-        insertion process and 1 if a rotation occured or 0 otherwise.
+        A tuple containing the number of nodes visited during the 
+        insertion process and the number of rotations, 0, 1 or 2 for a
+        double rotation.
         """
-        self.root, steps, rotation = self._insert_steps_and_rotation(self.root, key)
-        return (steps, rotation)
-
-    def _insert_steps_and_rotation(self, node, key):
-        # Rec cases
-        if node is None:
-            return (AVLNode(key), 0, 0)
-        if key < node.key:
-            (node.left, steps, rotation) = self._insert_steps_and_rotation(node.left, key)
-        else:
-            (node.right, steps, rotation) = self._insert_steps_and_rotation(node.right, key)
-
-        # Adjust heights of nodes after insertion and check balancing condition
-        height_left = self._get_height(node.left)
-        height_right = self._get_height(node.right)
-        node.set_height(1 + max(height_left, height_right))
-        bal_factor = height_left - height_right
-
-        # Perform rotations if required
-        if bal_factor > 1:
-            # LL or LR
-            if key < node.left.key:
-                return (self._rotate_right(node), steps + 1, rotation + 1)
-
-            node.left = self._rotate_left(node.left)
-            return (self._rotate_right(node), steps + 1, rotation + 1)
-        if bal_factor < -1:
-            # RR or RL
-            if key >= node.right.key:
-                return (self._rotate_left(node), steps + 1, rotation + 1)
-
-            node.right = self._rotate_right(node.right)
-            return (self._rotate_left(node), steps + 1, rotation + 1)
-
-        return (node, steps + 1, rotation)
+        return self._insert(key)
 
     def is_avl_tree(self):
-        return self._is_avl_tree(self.root)
-
-    def _is_avl_tree(self, node):
-        # subtree is empty
-        if not node:
-            return True
-
-        # check node has correct height
-        height_left = self._get_height(node.left)
-        height_right = self._get_height(node.right)
-        if node.height != 0:
-            if node.height != 1 + max(height_left, height_right):
-                return False
-
-        # check balance factor of the node
-        bal_factor = height_left - height_right
-        if not (bal_factor >= -1 and bal_factor <= 1):
-            return False
-
-        # check circular references
-        if node.left is node or node.right is node:
-            return False
-
-        left_tree = self._is_avl_tree(node.left)
-        right_tree = self._is_avl_tree(node.right)
-
-        return all([left_tree, right_tree])
+        return self.validate()
+
+    # the summary of a subtree is its (height, size)
+    _empty_summary = (0, 0)
+
+    def _check_node(self, node, left, right):
+        height_left, size_left = left
+        height_right, size_right = right
+        if node.height != 1 + max(height_left, height_right):
+            return None
+        if not -1 <= height_left - height_right <= 1:
+            return None
+        if node.size != 1 + size_left + size_right:
+            return None
+        return (node.height, node.size)
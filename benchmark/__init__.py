@@ -0,0 +1,9 @@
+"""
+Benchmark harness for the search structures.
+
+Run ``python -m benchmark --help`` from the repository root for the
+command line interface.
+"""
+from benchmark.workloads import DISTRIBUTIONS, knuth_shuffle, make_keys
+from benchmark.structures import STRUCTURES
+from benchmark.runner import make_trial, run_sweep, run_trial, write_csv, write_json
@@ -0,0 +1,81 @@
+"""
+Command line entry point: python -m benchmark
+"""
+import argparse
+from itertools import product
+from benchmark.profiling import profile_trial
+from benchmark.runner import run_sweep, write_csv, write_json
+from benchmark.structures import STRUCTURES
+from benchmark.workloads import DISTRIBUTIONS
+
+def parse_args(argv = None):
+    parser = argparse.ArgumentParser(
+        prog = "python -m benchmark",
+        description = "Sweep structures, key distributions and sizes.")
+    parser.add_argument("--structures", nargs = "+", choices = list(STRUCTURES),
+                        default = ["avl", "rb", "skip_list"])
+    parser.add_argument("--distributions", nargs = "+", choices = list(DISTRIBUTIONS),
+                        default = ["shuffled"])
+    parser.add_argument("--sizes", nargs = "+", type = lambda text: int(float(text)),
+                        default = [1000, 10000, 100000],
+                        help = "initial load sizes, 1e3 style accepted")
+    parser.add_argument("--batch", type = int, default = 1001,
+                        help = "keys in the measured batch of each trial")
+    parser.add_argument("--trials", type = int, default = 3)
+    parser.add_argument("--seed", type = int, default = 0)
+    parser.add_argument("--workers", type = int, default = None)
+    parser.add_argument("--json", help = "write the results to this JSON file")
+    parser.add_argument("--csv", help = "write the results to this CSV file")
+    parser.add_argument("--profile", choices = ["sample", "cprofile"],
+                        help = "profile the load and the batch of one trial of every "
+                               "configuration instead of running the sweep")
+    parser.add_argument("--profile-dir", default = "profiles",
+                        help = "where the profiles, collapsed stacks and snapshots go")
+    parser.add_argument("--profile-repeats", type = int, default = 20,
+                        help = "the least runs of each profiled phase")
+    parser.add_argument("--profile-samples", type = int, default = 500,
+                        help = "samples each phase is repeated for, up to a minute more")
+    parser.add_argument("--top", type = int, default = 15,
+                        help = "rows of the per-function tables")
+    parser.add_argument("--no-memory", action = "store_true",
+                        help = "skip the tracemalloc snapshots of the profiles")
+    return parser.parse_args(argv)
+
+def profile(args):
+    for structure, distribution, n in product(args.structures, args.distributions, args.sizes):
+        report = profile_trial(structure, distribution, n, args.batch, args.seed,
+                               mode = args.profile, directory = args.profile_dir,
+                               top = args.top, repeats = args.profile_repeats,
+                               samples = args.profile_samples,
+                               memory = not args.no_memory)
+        for phase, result in report.items():
+            print(f"== {structure} {distribution} n={n}: {phase}")
+            print(result["table"])
+            if "memory" in result:
+                print(result["memory"])
+            print(f"wrote {', '.join(result['files'])}\n")
+
+def main(argv = None):
+    args = parse_args(argv)
+    if args.profile:
+        profile(args)
+        return
+    results = run_sweep(args.structures, args.distributions, args.sizes,
+                        batch = args.batch, trials = args.trials,
+                        seed = args.seed, workers = args.workers)
+    if args.json:
+        write_json(results, args.json)
+    if args.csv:
+        write_csv(results, args.csv)
+
+    print(f"{'structure':<22}{'distribution':<12}{'n':>10}{'trial':>6}"
+          f"{'build ops/s':>14}{'mean steps':>12}{'peak MB':>9}")
+    for result in results:
+        mean_steps = result["mean_steps"]
+        print(f"{result['structure']:<22}{result['distribution']:<12}{result['n']:>10}"
+              f"{result['trial']:>6}{result['build_ops_per_sec']:>14,.0f}"
+              f"{mean_steps if mean_steps is not None else float('nan'):>12.2f}"
+              f"{result['peak_rss_kb'] / 1024:>9.1f}")
+
+if __name__ == "__main__":
+    main()
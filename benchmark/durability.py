@@ -0,0 +1,149 @@
+"""
+Durability checks for wal.DurableIndex: what group commit costs against
+plain inserts, and a crash-injection test that kills a writer with SIGKILL
+and checks that no acknowledged key was lost.
+
+Run with python -m benchmark.durability from the repository root.
+"""
+import argparse
+import os
+import random
+import signal
+from multiprocessing import Pipe, Process
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from benchmark.structures import STRUCTURES
+from wal import DurableIndex
+
+# the structures that can be saved to and loaded from snapshots
+DURABLE_STRUCTURES = ("avl", "array_avl", "rb", "skip_list")
+
+def measure_overhead(structure, n, batch_size = 4096, flush_interval = 0.01, seed = 0,
+                     repeats = 3):
+    """
+    Inserts the same n keys into a plain and a durable index, keeping the
+    best of repeats runs of each to filter out noise from other processes.
+
+    Returns:
+    A dict with both throughputs and the fraction of throughput lost to
+    logging.
+    """
+    constructor = STRUCTURES[structure][0]
+    keys = random.Random(seed).sample(range(1, 20 * n), n)
+    raw_seconds = durable_seconds = float("inf")
+    for _ in range(repeats):
+        index = constructor()
+        start = perf_counter()
+        for key in keys:
+            index.insert(key)
+        raw_seconds = min(raw_seconds, perf_counter() - start)
+        # a live first index would make the collector slower during the second run
+        del index
+
+        with TemporaryDirectory() as directory:
+            with DurableIndex(directory, constructor, batch_size, flush_interval) as durable:
+                start = perf_counter()
+                for key in keys:
+                    durable.insert(key)
+                durable.commit()
+                durable_seconds = min(durable_seconds, perf_counter() - start)
+            del durable
+
+    return {
+        "structure": structure,
+        "n": n,
+        "raw_ops_per_sec": n / raw_seconds,
+        "durable_ops_per_sec": n / durable_seconds,
+        "overhead": 1 - raw_seconds / durable_seconds,
+    }
+
+def _crash_writer(directory, structure, keys, checkpoint_every, connection):
+    # reports every new durable sequence number, which acknowledges the keys up to it
+    index = DurableIndex(directory, STRUCTURES[structure][0])
+    acknowledged = 0
+    for position, key in enumerate(keys, 1):
+        index.insert(key)
+        if position % checkpoint_every == 0:
+            index.checkpoint()
+        if index.durable_sequence > acknowledged:
+            acknowledged = index.durable_sequence
+            connection.send(acknowledged)
+    index.commit()
+    connection.send(index.durable_sequence)
+
+def crash_test(structure = "avl", n = 200000, trials = 5, seed = 0):
+    """
+    Runs a writer process that inserts n keys, checkpointing now and then,
+    kills it with SIGKILL at a random moment, recovers the index from its
+    directory and checks that every acknowledged key is there.
+
+    Returns:
+    A list with a tuple per trial containing the number of acknowledged
+    keys and the number of recovered keys.
+
+    Raises:
+    - AssertionError: If an acknowledged key was lost or a key that was
+    never inserted appeared.
+    """
+    rng = random.Random(seed)
+    results = []
+    for _ in range(trials):
+        keys = rng.sample(range(1, 20 * n), n)
+        with TemporaryDirectory() as directory:
+            receiver, sender = Pipe(duplex = False)
+            writer = Process(target = _crash_writer,
+                             args = (directory, structure, keys, n // 3, sender))
+            writer.start()
+            sender.close()
+
+            acknowledged = 0
+            deadline = perf_counter() + rng.uniform(0.05, 1.0)
+            killed = False
+            while True:
+                if not killed and perf_counter() >= deadline:
+                    os.kill(writer.pid, signal.SIGKILL)
+                    killed = True
+                try:
+                    # once the writer is gone this drains what it sent, then fails
+                    if receiver.poll(0.001):
+                        acknowledged = receiver.recv()
+                except EOFError:
+                    break
+            writer.join()
+
+            with DurableIndex(directory, STRUCTURES[structure][0]) as recovered:
+                lost = [key for key in keys[:acknowledged] if not recovered.search(key)]
+                assert not lost, f"{len(lost)} acknowledged keys were lost"
+                assert len(recovered) <= n and set(recovered) <= set(keys), \
+                    "recovery produced keys that were never inserted"
+                results.append((acknowledged, len(recovered)))
+    return results
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(
+        prog = "python -m benchmark.durability",
+        description = "Measure write-ahead logging overhead and test crash recovery.")
+    parser.add_argument("--structures", nargs = "+", choices = DURABLE_STRUCTURES,
+                        default = ["avl", "rb", "skip_list"])
+    parser.add_argument("--n", type = lambda text: int(float(text)), default = 200000)
+    parser.add_argument("--batch-size", type = int, default = 4096)
+    parser.add_argument("--flush-interval", type = float, default = 0.01)
+    parser.add_argument("--trials", type = int, default = 5)
+    parser.add_argument("--seed", type = int, default = 0)
+    args = parser.parse_args(argv)
+
+    print(f"{'structure':<12}{'raw ops/s':>12}{'durable ops/s':>15}{'overhead':>10}")
+    for structure in args.structures:
+        result = measure_overhead(structure, args.n, args.batch_size,
+                                  args.flush_interval, args.seed)
+        print(f"{structure:<12}{result['raw_ops_per_sec']:>12,.0f}"
+              f"{result['durable_ops_per_sec']:>15,.0f}{result['overhead']:>10.1%}")
+
+    for structure in args.structures:
+        results = crash_test(structure, args.n, args.trials, args.seed)
+        print(f"{structure}: no acknowledged key lost in {len(results)} crashes "
+              f"(acknowledged/recovered: "
+              f"{', '.join(f'{acked}/{recovered}' for acked, recovered in results)})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Finger operations against the plain ones on sorted and nearly sorted
+streams: the time to insert a stream of keys through insert and through
+finger_insert, then to look every key up again, in stream order, through
+search and through finger_search, with the comparisons each made.
+
+Run with python -m benchmark.finger from the repository root.
+"""
+import argparse
+import random
+from time import perf_counter
+from benchmark.structures import SEEDED, STRUCTURES
+from benchmark.workloads import make_keys
+from stats import Stats
+
+FINGERED = ("avl", "rb", "skip_list")
+
+def _new(structure, seed):
+    constructor = STRUCTURES[structure][0]
+    return constructor(seed = seed) if structure in SEEDED else constructor()
+
+def measure_finger(structure = "avl", distribution = "nearly_sorted", n = 100000, seed = 0):
+    """
+    Inserts n keys of a distribution into two empty structures, one
+    through insert and one through finger_insert, and searches for them
+    all again the same two ways. The comparisons are counted in a second,
+    untimed run.
+
+    Parameters:
+    - structure (str): One of FINGERED.
+    - distribution (str): A key of DISTRIBUTIONS.
+    - n (int): The number of keys.
+    - seed (int): Seeds the keys and the structure.
+
+    Returns:
+    A dict with the operations per second and the comparisons per
+    operation of insert, finger_insert, search and, where the structure
+    has it, finger_search.
+    """
+    keys = make_keys(distribution, n, random.Random(seed))
+    result = {"structure": structure, "distribution": distribution}
+    for operations in (("insert", "search"), ("finger_insert", "finger_search")):
+        operations = [operation for operation in operations
+                      if hasattr(STRUCTURES[structure][0], operation)]
+        index = _new(structure, seed)
+        for operation in operations:
+            run = getattr(index, operation)
+            start = perf_counter()
+            for key in keys:
+                run(key)
+            result[f"{operation}_ops_per_sec"] = n / (perf_counter() - start)
+
+        index = _new(structure, seed)
+        for operation in operations:
+            run = getattr(index, operation)
+            index.stats = Stats()
+            for key in keys:
+                run(key)
+            result[f"{operation}_comparisons"] = index.stats.comparisons / n
+    return result
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(
+        prog = "python -m benchmark.finger",
+        description = "Compare finger inserts and searches with the plain ones.")
+    parser.add_argument("--structures", nargs = "+", choices = FINGERED, default = list(FINGERED))
+    parser.add_argument("--distributions", nargs = "+",
+                        default = ["sorted", "nearly_sorted", "shuffled"])
+    parser.add_argument("--n", type = lambda text: int(float(text)), default = 100000)
+    parser.add_argument("--seed", type = int, default = 0)
+    args = parser.parse_args(argv)
+
+    print(f"{'structure':<11}{'distribution':<15}{'operation':<15}{'ops/s':>11}"
+          f"{'cmp/op':>8}{'speedup':>9}")
+    for structure in args.structures:
+        for distribution in args.distributions:
+            result = measure_finger(structure, distribution, args.n, args.seed)
+            for plain, finger in (("insert", "finger_insert"), ("search", "finger_search")):
+                for operation in (plain, finger):
+                    if f"{operation}_ops_per_sec" not in result:
+                        continue
+                    speedup = (result[f"{operation}_ops_per_sec"]
+                               / result[f"{plain}_ops_per_sec"])
+                    print(f"{structure:<11}{distribution:<15}{operation:<15}"
+                          f"{result[f'{operation}_ops_per_sec']:>11,.0f}"
+                          f"{result[f'{operation}_comparisons']:>8.1f}{speedup:>8.2f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+AVLTree's iterative insert against the recursive one it replaced: the
+seconds and inserts per second of each for n keys inserted one by one.
+The recursive insert is kept here, as it was, for reference only.
+
+Run with python -m benchmark.iterative from the repository root.
+"""
+import argparse
+import random
+from time import perf_counter
+from avl import AVLTree
+from benchmark.workloads import DISTRIBUTIONS, make_keys
+
+class _RecursiveNode:
+    def __init__(self, key):
+        self.key = key
+        self.left = None
+        self.right = None
+        self.height = 0
+
+def _height(node):
+    return node.height if node else -1
+
+def _rotate_left(node):
+    right_tree = node.right
+    node.right = right_tree.left
+    right_tree.left = node
+    node.height = 1 + max(_height(node.left), _height(node.right))
+    right_tree.height = 1 + max(_height(right_tree.left), _height(right_tree.right))
+    return right_tree
+
+def _rotate_right(node):
+    left_tree = node.left
+    node.left = left_tree.right
+    left_tree.right = node
+    node.height = 1 + max(_height(node.left), _height(node.right))
+    left_tree.height = 1 + max(_height(left_tree.left), _height(left_tree.right))
+    return left_tree
+
+def _recursive_insert(node, key):
+    # the root of the subtree with key inserted, rebalanced on the way back up
+    if node is None:
+        return _RecursiveNode(key)
+    if key < node.key:
+        node.left = _recursive_insert(node.left, key)
+    else:
+        node.right = _recursive_insert(node.right, key)
+
+    height_left = _height(node.left)
+    height_right = _height(node.right)
+    node.height = 1 + max(height_left, height_right)
+    balance = height_left - height_right
+    if balance > 1:
+        if key >= node.left.key:
+            node.left = _rotate_left(node.left)
+        return _rotate_right(node)
+    if balance < -1:
+        if key < node.right.key:
+            node.right = _rotate_right(node.right)
+        return _rotate_left(node)
+    return node
+
+def measure_iterative(distribution = "shuffled", n = 1000000, seed = 0):
+    """
+    Inserts n keys of a distribution one by one with the recursive insert
+    and into an AVLTree.
+
+    Parameters:
+    - distribution (str): A key of DISTRIBUTIONS.
+    - n (int): The number of keys.
+    - seed (int): Seeds the keys.
+
+    Returns:
+    A dict with the seconds and inserts per second of the recursive and
+    the iterative insert.
+    """
+    keys = make_keys(distribution, n, random.Random(seed))
+    result = {"distribution": distribution, "n": n}
+
+    root = None
+    start = perf_counter()
+    for key in keys:
+        root = _recursive_insert(root, key)
+    result["recursive_seconds"] = perf_counter() - start
+    del root
+
+    tree = AVLTree()
+    start = perf_counter()
+    for key in keys:
+        tree.insert(key)
+    result["iterative_seconds"] = perf_counter() - start
+    del tree
+
+    for insert in ("recursive", "iterative"):
+        result[f"{insert}_inserts_per_sec"] = n / result[f"{insert}_seconds"]
+    return result
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(
+        prog = "python -m benchmark.iterative",
+        description = "Compare the iterative AVL insert with the recursive one it replaced.")
+    parser.add_argument("--distributions", nargs = "+", choices = list(DISTRIBUTIONS),
+                        default = ["shuffled"])
+    parser.add_argument("--n", type = lambda text: int(float(text)), default = 1000000)
+    parser.add_argument("--seed", type = int, default = 0)
+    args = parser.parse_args(argv)
+
+    print(f"{'distribution':<15}{'insert':<11}{'seconds':>9}{'inserts/s':>11}")
+    for distribution in args.distributions:
+        result = measure_iterative(distribution, args.n, args.seed)
+        for insert in ("recursive", "iterative"):
+            print(f"{distribution:<15}{insert:<11}{result[f'{insert}_seconds']:>9.1f}"
+                  f"{result[f'{insert}_inserts_per_sec']:>11,.0f}")
+
+if __name__ == "__main__":
+    main()
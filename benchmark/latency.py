@@ -0,0 +1,139 @@
+"""
+Latency of the AsyncIndex server against its batch window: a load
+generator opens many client connections, each sending requests one after
+the other, and reports the 50th and 99th percentile latencies and the
+throughput for every window.
+
+Run with python -m benchmark.latency from the repository root.
+"""
+import argparse
+import asyncio
+import os
+import random
+from multiprocessing import Pipe, Process
+from statistics import quantiles
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from AsyncIndex import AsyncIndex, serve
+from benchmark.structures import STRUCTURES
+
+def _run_server(structure, n, batch_size, window, path, connection):
+    # builds the index, then reports the port, or 0 for a Unix socket, once listening
+    async def main():
+        index = STRUCTURES[structure][0].from_sorted(range(0, 2 * n, 2))
+        server = await serve(AsyncIndex(index, batch_size, window), path = path)
+        connection.send(0 if path else server.sockets[0].getsockname()[1])
+        async with server:
+            await server.serve_forever()
+
+    asyncio.run(main())
+
+async def _client(address, n, requests, seed, latencies):
+    if isinstance(address, str):
+        reader, writer = await asyncio.open_unix_connection(address)
+    else:
+        reader, writer = await asyncio.open_connection(*address)
+    rng = random.Random(seed)
+    for _ in range(requests):
+        # mostly lookups, with some inserts and short ranges
+        key = rng.randrange(2 * n)
+        choice = rng.random()
+        if choice < 0.8:
+            line = f"contains {key}\n"
+        elif choice < 0.95:
+            line = f"insert {key}\n"
+        else:
+            line = f"range {key} {key + 20}\n"
+        start = perf_counter()
+        writer.write(line.encode())
+        await reader.readline()
+        latencies.append(perf_counter() - start)
+    writer.write(b"stats\n")
+    stats = await reader.readline()
+    writer.close()
+    await writer.wait_closed()
+    return stats
+
+async def _load(address, n, clients, requests, seed):
+    latencies = []
+    start = perf_counter()
+    replies = await asyncio.gather(*(_client(address, n, requests, f"{seed}-{client}", latencies)
+                                     for client in range(clients)))
+    seconds = perf_counter() - start
+    # the last client to finish saw the final counts
+    batches, served = map(int, max(replies, key = lambda reply: int(reply.split()[1])).split())
+    return latencies, seconds, batches, served
+
+def measure_latency(structure = "avl", n = 100000, window = 0.0005, batch_size = 256,
+                    clients = 64, requests = 500, unix = False, seed = 0):
+    """
+    Starts an AsyncIndex server in its own process and runs the load
+    generator against it, from this process.
+
+    Parameters:
+    - structure (str): A key of STRUCTURES, the structure served.
+    - n (int): The number of keys the index starts with.
+    - window (float): The batch window of the server, in seconds.
+    - batch_size (int): The batch size that flushes a batch early.
+    - clients (int): The number of concurrent connections.
+    - requests (int): The number of requests each client sends in turn.
+    - unix (bool): Whether to connect over a Unix socket instead of TCP.
+    - seed (int): Seeds the requests.
+
+    Returns:
+    A dict with the p50 and p99 latencies in microseconds, the requests
+    per second and the mean number of requests per batch.
+    """
+    with TemporaryDirectory() as directory:
+        path = os.path.join(directory, "index.sock") if unix else None
+        receiver, sender = Pipe(duplex = False)
+        server = Process(target = _run_server,
+                         args = (structure, n, batch_size, window, path, sender), daemon = True)
+        server.start()
+        try:
+            port = receiver.recv()
+            address = path if unix else ("127.0.0.1", port)
+            latencies, seconds, batches, served = asyncio.run(
+                _load(address, n, clients, requests, seed))
+        finally:
+            server.terminate()
+            server.join()
+
+    percentiles = quantiles(latencies, n = 100)
+    return {
+        "structure": structure,
+        "window_us": window * 1e6,
+        "p50_us": percentiles[49] * 1e6,
+        "p99_us": percentiles[98] * 1e6,
+        "requests_per_sec": len(latencies) / seconds,
+        "mean_batch": served / batches if batches else 0,
+    }
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(
+        prog = "python -m benchmark.latency",
+        description = "Measure AsyncIndex server latency against the batch window.")
+    parser.add_argument("--structures", nargs = "+", choices = ["avl", "rb", "skip_list"],
+                        default = ["avl"])
+    parser.add_argument("--windows", nargs = "+", type = float, default = [0, 0.0002, 0.001, 0.005],
+                        help = "batch windows in seconds")
+    parser.add_argument("--batch-size", type = int, default = 256)
+    parser.add_argument("--n", type = lambda text: int(float(text)), default = 100000)
+    parser.add_argument("--clients", type = int, default = 64)
+    parser.add_argument("--requests", type = int, default = 500)
+    parser.add_argument("--unix", action = "store_true", help = "use a Unix socket")
+    parser.add_argument("--seed", type = int, default = 0)
+    args = parser.parse_args(argv)
+
+    print(f"{'structure':<12}{'window us':>10}{'p50 us':>9}{'p99 us':>9}"
+          f"{'requests/s':>12}{'batch':>7}")
+    for structure in args.structures:
+        for window in args.windows:
+            result = measure_latency(structure, args.n, window, args.batch_size,
+                                     args.clients, args.requests, args.unix, args.seed)
+            print(f"{structure:<12}{result['window_us']:>10.0f}{result['p50_us']:>9.0f}"
+                  f"{result['p99_us']:>9.0f}{result['requests_per_sec']:>12,.0f}"
+                  f"{result['mean_batch']:>7.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Level generation of SkipList: how much faster drawing one random word per
+node is than flipping a coin per level, and a chi-square test that the
+levels follow the geometric distribution they should.
+
+Run with python -m benchmark.levels from the repository root.
+"""
+import argparse
+import random
+from collections import Counter
+from statistics import NormalDist
+from time import perf_counter
+from SkipList import SkipList
+
+class CoinFlipSkipList(SkipList):
+    """
+    SkipList with its former level generator, one randint call per level
+    on the global generator, kept for comparison.
+    """
+    def _get_new_height(self):
+        height = 1
+        while random.randint(0, 1) == 0:
+            height += 1
+        return height
+
+def _best_seconds(function, repeats):
+    best = float("inf")
+    for _ in range(repeats):
+        start = perf_counter()
+        function()
+        best = min(best, perf_counter() - start)
+    return best
+
+def compare_insert_speed(n = 100000, seed = 0, repeats = 3):
+    """
+    Times level generation alone and whole inserts of n shuffled keys with
+    the coin flip and the random word generators, best of repeats runs.
+
+    Returns:
+    A dict with the nanoseconds per level drawn and the inserts per second
+    of both, and the speedups.
+    """
+    keys = random.Random(seed).sample(range(1, 20 * n), n)
+    results = {}
+    for name, constructor in (("coin_flip", CoinFlipSkipList), ("random_word", SkipList)):
+        draw = constructor(seed = seed)._get_new_height
+
+        def draw_levels():
+            for _ in range(n):
+                draw()
+
+        def insert_keys():
+            skip_list = constructor(seed = seed)
+            for key in keys:
+                skip_list.insert(key)
+
+        results[f"{name}_ns_per_level"] = _best_seconds(draw_levels, repeats) / n * 1e9
+        results[f"{name}_inserts_per_sec"] = n / _best_seconds(insert_keys, repeats)
+
+    results["level_speedup"] = results["coin_flip_ns_per_level"] / results["random_word_ns_per_level"]
+    results["insert_speedup"] = (results["random_word_inserts_per_sec"]
+                                 / results["coin_flip_inserts_per_sec"])
+    return results
+
+def chi_square_levels(p = 0.5, samples = 100000, seed = 0, expected_n = None):
+    """
+    Draws levels from a SkipList's generator and compares their counts with
+    the geometric distribution, P(level = h) = (1 - p) * p**(h - 1), by a
+    chi-square goodness of fit test. Levels are binned so that every bin
+    expects at least five draws, the last bin holding every higher level.
+
+    Returns:
+    A dict with the statistic, the degrees of freedom and the p-value,
+    from the Wilson-Hilferty approximation of the chi-square distribution.
+    """
+    skip_list = SkipList(seed = seed, p = p, expected_n = expected_n)
+    counts = Counter(skip_list._get_new_height() for _ in range(samples))
+
+    bins = []
+    level = 1
+    while (level < skip_list.max_level
+           and samples * (1 - p) * p ** (level - 1) >= 5 and samples * p ** level >= 5):
+        bins.append((counts[level], samples * (1 - p) * p ** (level - 1)))
+        level += 1
+    # the capped top level holds everything that would have gone higher
+    bins.append((sum(count for height, count in counts.items() if height >= level),
+                 samples * p ** (level - 1)))
+
+    statistic = sum((observed - expected) ** 2 / expected for observed, expected in bins)
+    freedom = len(bins) - 1
+    normal = ((statistic / freedom) ** (1 / 3) - (1 - 2 / (9 * freedom))) / (2 / (9 * freedom)) ** 0.5
+    return {
+        "p": p,
+        "samples": samples,
+        "statistic": statistic,
+        "degrees_of_freedom": freedom,
+        "p_value": 1 - NormalDist().cdf(normal),
+    }
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(
+        prog = "python -m benchmark.levels",
+        description = "Time skip list level generation and test its distribution.")
+    parser.add_argument("--n", type = lambda text: int(float(text)), default = 100000)
+    parser.add_argument("--p", nargs = "+", type = float, default = [0.5, 0.25, 0.3])
+    parser.add_argument("--samples", type = lambda text: int(float(text)), default = 1000000)
+    parser.add_argument("--repeats", type = int, default = 3)
+    parser.add_argument("--seed", type = int, default = 0)
+    args = parser.parse_args(argv)
+
+    speed = compare_insert_speed(args.n, args.seed, args.repeats)
+    print(f"{'generator':<14}{'ns/level':>10}{'inserts/s':>12}")
+    for name in ("coin_flip", "random_word"):
+        print(f"{name:<14}{speed[f'{name}_ns_per_level']:>10.0f}"
+              f"{speed[f'{name}_inserts_per_sec']:>12,.0f}")
+    print(f"level generation {speed['level_speedup']:.1f}x faster, "
+          f"inserts {speed['insert_speedup']:.2f}x faster\n")
+
+    print(f"{'p':>6}{'chi-square':>12}{'dof':>5}{'p-value':>9}")
+    for p in args.p:
+        result = chi_square_levels(p, args.samples, args.seed)
+        print(f"{p:>6}{result['statistic']:>12.2f}{result['degrees_of_freedom']:>5}"
+              f"{result['p_value']:>9.3f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+"""
+Profiling of benchmark trials: where the time of the initial load and of
+the measured batch goes, under cProfile or a sampling profiler, and what
+each of them allocates, under tracemalloc.
+
+Run with python -m benchmark --profile sample (or cprofile) from the
+repository root.
+"""
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import tracemalloc
+from collections import Counter
+from time import perf_counter
+from benchmark.runner import make_trial
+
+PHASES = ("load", "batch")
+
+# the seconds of repeats a sampled profile may add to reach its samples
+MAX_SECONDS = 60
+
+def _frame_label(code):
+    return f"{code.co_qualname} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+class StackSampler:
+    """
+    Sampling profiler for the thread that starts it. A background thread
+    looks at that thread's stack every interval seconds through
+    sys._current_frames and counts every distinct stack, so the profiled
+    code runs unmodified and the overhead is one stack walk per sample.
+
+    Stacks are recorded below the function that started the sampler, with
+    the phase name as their root, and written in the collapsed format
+    that flamegraph.pl, speedscope and inferno read.
+    """
+    def __init__(self, interval = 0.0005):
+        """
+        Parameters:
+        - interval (float): The seconds between samples.
+        """
+        self.interval = interval
+        self.counts = Counter()
+        self._phase = None
+        self._thread = None
+        self._stop = threading.Event()
+        # the sampled thread, the depth of its stack when sampling started
+        # and the switch interval to restore, all set by start
+        self._target = None
+        self._base = 0
+        self._switch_interval = sys.getswitchinterval()
+
+    def start(self, phase):
+        """
+        Starts sampling the calling thread, labelling its stacks with phase.
+        """
+        self._phase = phase
+        self._target = threading.get_ident()
+        # the frames that already exist, from the caller up, are not recorded
+        self._base = 0
+        frame = sys._getframe(1)
+        while frame:
+            self._base += 1
+            frame = frame.f_back
+        # a waiting thread only gets the interpreter at the switch interval
+        self._switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(min(self._switch_interval, self.interval))
+        self._stop.clear()
+        self._thread = threading.Thread(target = self._run, daemon = True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stops sampling.
+        """
+        self._stop.set()
+        self._thread.join()
+        sys.setswitchinterval(self._switch_interval)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._target)
+            stack = []
+            while frame:
+                stack.append(frame.f_code)
+                frame = frame.f_back
+            # stack runs from the innermost frame out
+            stack = stack[:len(stack) - self._base]
+            if stack and stack[-1] is StackSampler.stop.__code__:
+                # caught between the end of the phase and the stop event
+                continue
+            labels = [_frame_label(code) for code in reversed(stack)]
+            self.counts[";".join([self._phase] + labels)] += 1
+
+    @property
+    def samples(self):
+        """
+        The number of samples taken so far.
+        """
+        return sum(self.counts.values())
+
+    def write_collapsed(self, path):
+        """
+        Writes one "frame;frame;... count" line per distinct stack.
+        """
+        with open(path, "w", encoding = "utf-8") as file:
+            for stack, count in sorted(self.counts.items()):
+                file.write(f"{stack} {count}\n")
+
+    def top(self, n = 15):
+        """
+        Returns the n functions that were on the stack the most, as tuples
+        of the function, the samples where it was running itself and the
+        samples where it was anywhere on the stack, most own samples first.
+        """
+        own = Counter()
+        total = Counter()
+        for stack, count in self.counts.items():
+            frames = stack.split(";")[1:]
+            if frames:
+                own[frames[-1]] += count
+            for frame in set(frames):
+                total[frame] += count
+        return [(frame, samples, total[frame]) for frame, samples in own.most_common(n)]
+
+def _run_phase(index, keys):
+    insert = index.insert
+    for key in keys:
+        insert(key)
+
+def _make_phases(structure, distribution, n, batch, seed):
+    # the empty structure, and the keys of each phase
+    index, keys, batch_keys = make_trial(structure, distribution, n, batch, 0, seed)
+    return index, {"load": keys, "batch": batch_keys}
+
+def profile_trial(structure, distribution = "shuffled", n = 5000, batch = 1001, seed = 0,
+                  mode = "sample", directory = "profiles", top = 15, interval = 0.0005,
+                  repeats = 20, samples = 500, memory = True):
+    """
+    Profiles the two phases of a benchmark trial, the initial load of n
+    keys and the measured batch, each repeated on fresh structures so
+    that short phases still collect enough samples. In mode "sample" the
+    trial is repeated until every phase has samples samples, or for at
+    most MAX_SECONDS more once repeats runs are done.
+
+    For every phase this writes, into directory:
+    - with mode "sample", the collapsed stacks, <name>-<phase>.collapsed;
+    - with mode "cprofile", the profile, <name>-<phase>.prof, for pstats
+    or snakeviz;
+    - with memory, a tracemalloc snapshot, <name>-<phase>.tracemalloc,
+    taken at the end of the phase, for tracemalloc.Snapshot.load.
+
+    Parameters:
+    - structure, distribution, n, batch, seed: As for run_trial.
+    - mode (str): "sample" or "cprofile".
+    - directory: Where the files go, created if missing.
+    - top (int): The number of rows of the function tables.
+    - interval (float): The seconds between samples of mode "sample".
+    - repeats (int): How many times each phase is run at least.
+    - samples (int): The samples every phase needs in mode "sample".
+    - memory (bool): Whether to take the allocation snapshots, in an
+    extra run since tracemalloc slows everything down.
+
+    Returns:
+    A dict mapping each phase to a dict with its "table", a printable
+    top-N table of functions, its "memory" table, if taken, and the
+    "files" written.
+
+    Raises:
+    - ValueError: If mode is not "sample" or "cprofile".
+    """
+    if mode not in ("sample", "cprofile"):
+        raise ValueError(f"unknown profiling mode {mode!r}")
+    os.makedirs(directory, exist_ok = True)
+    name = f"{structure}-{distribution}-{n}"
+    report = {phase: {"files": []} for phase in PHASES}
+
+    profilers = {phase: StackSampler(interval) if mode == "sample" else cProfile.Profile()
+                 for phase in PHASES}
+    runs = 0
+    deadline = perf_counter() + MAX_SECONDS
+    while runs < repeats or (mode == "sample" and perf_counter() < deadline
+                             and any(profiler.samples < samples
+                                     for profiler in profilers.values())):
+        index, keys = _make_phases(structure, distribution, n, batch, seed)
+        for phase in PHASES:
+            profiler = profilers[phase]
+            if mode == "cprofile":
+                profiler.runcall(_run_phase, index, keys[phase])
+            elif runs < repeats or profiler.samples < samples:
+                profiler.start(phase)
+                _run_phase(index, keys[phase])
+                profiler.stop()
+            else:
+                # the batch runs on a loaded structure even once the load has
+                # enough samples
+                _run_phase(index, keys[phase])
+        runs += 1
+        if runs == repeats:
+            deadline = perf_counter() + MAX_SECONDS
+
+    for phase, profiler in profilers.items():
+        path = os.path.join(directory, f"{name}-{phase}")
+        if mode == "sample":
+            profiler.write_collapsed(path + ".collapsed")
+            report[phase]["files"].append(path + ".collapsed")
+            rows = [f"{profiler.samples} samples",
+                    f"{'own':>7}{'total':>7}  function"]
+            rows += [f"{own:>7}{total:>7}  {frame}" for frame, own, total in profiler.top(top)]
+            report[phase]["table"] = "\n".join(rows)
+        else:
+            profiler.dump_stats(path + ".prof")
+            report[phase]["files"].append(path + ".prof")
+            stream = io.StringIO()
+            pstats.Stats(profiler, stream = stream).sort_stats("tottime").print_stats(top)
+            report[phase]["table"] = stream.getvalue().strip()
+
+    if memory:
+        index, keys = _make_phases(structure, distribution, n, batch, seed)
+        snapshots = []
+        tracemalloc.start()
+        for phase in PHASES:
+            tracemalloc.reset_peak()
+            _run_phase(index, keys[phase])
+            snapshots.append((phase, tracemalloc.take_snapshot(), tracemalloc.get_traced_memory()))
+        tracemalloc.stop()
+
+        # filtered once tracing is off, so that the filters' own allocations are not seen
+        ignored = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+        previous = None
+        for phase, snapshot, (current, peak) in snapshots:
+            snapshot = snapshot.filter_traces(ignored)
+            path = os.path.join(directory, f"{name}-{phase}.tracemalloc")
+            snapshot.dump(path)
+            report[phase]["files"].append(path)
+            # what the phase added, on top of what the phases before it kept
+            statistics = (snapshot.compare_to(previous, "lineno") if previous
+                          else snapshot.statistics("lineno"))
+            rows = [f"traced {current / 1024:,.0f} KiB, peak {peak / 1024:,.0f} KiB"]
+            rows += [str(statistic) for statistic in statistics[:top]]
+            report[phase]["memory"] = "\n".join(rows)
+            previous = snapshot
+    return report
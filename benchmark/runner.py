@@ -0,0 +1,141 @@
+"""
+Runs benchmark trials, in parallel worker processes, and writes results.
+"""
+import csv
+import json
+import random
+import resource
+from concurrent.futures import ProcessPoolExecutor
+from itertools import product
+from statistics import mean
+from time import perf_counter
+from benchmark.structures import SEEDED, SETS, STRUCTURES
+from benchmark.workloads import REPEATING, make_keys
+from stats import Stats
+
+def run_trial(structure, distribution, n, batch, trial, seed):
+    """
+    Builds the structure from n keys of the distribution, then inserts a
+    measured batch of random keys with a stats collector attached.
+
+    Parameters:
+    - structure (str): A key of STRUCTURES.
+    - distribution (str): A key of DISTRIBUTIONS.
+    - n (int): The number of keys in the initial load.
+    - batch (int): The number of keys in the measured batch.
+    - trial (int): The trial number, mixed into the seed.
+    - seed (int): The base seed, so runs can be reproduced.
+
+    Returns:
+    A dict with the configuration and the measurements of the trial.
+    """
+    counted = STRUCTURES[structure][1]
+    index, keys, batch_keys = make_trial(structure, distribution, n, batch, trial, seed)
+    start = perf_counter()
+    for key in keys:
+        index.insert(key)
+    build_seconds = perf_counter() - start
+
+    steps = []
+    stats = Stats()
+    start = perf_counter()
+    if counted:
+        index.stats = stats
+        for key in batch_keys:
+            visits = stats.visits
+            index.insert(key)
+            steps.append(stats.visits - visits)
+        index.stats = None
+    else:
+        for key in batch_keys:
+            index.insert(key)
+    batch_seconds = perf_counter() - start
+
+    footprint = index.memory_footprint() if hasattr(index, "memory_footprint") else None
+    result = {
+        "structure": structure,
+        "distribution": distribution,
+        "n": n,
+        "batch": batch,
+        "trial": trial,
+        "seed": seed,
+        "build_seconds": build_seconds,
+        "build_ops_per_sec": n / build_seconds if build_seconds else None,
+        "batch_seconds": batch_seconds,
+        "batch_ops_per_sec": batch / batch_seconds if batch_seconds else None,
+        "mean_steps": mean(steps) if steps else None,
+        "max_steps": max(steps) if steps else None,
+        "comparisons": stats.comparisons if counted else None,
+        "rotations": stats.rotations if counted else None,
+        "recolorings": stats.recolorings if counted else None,
+        "promotions": stats.promotions if counted else None,
+        "splits": stats.splits if counted else None,
+        # kilobytes on Linux; each trial runs in a fresh process
+        "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "bytes_per_key": footprint["bytes_per_key"] if footprint else None,
+    }
+    return result
+
+def make_trial(structure, distribution, n, batch, trial, seed):
+    """
+    Creates the empty structure and the keys of a trial, the same for
+    every run with the same arguments.
+
+    Returns:
+    A tuple containing the structure, the n keys of the initial load and
+    the batch keys.
+    """
+    constructor = STRUCTURES[structure][0]
+    # the keys depend on the workload only, so every structure sees the same
+    rng = random.Random(f"{seed}-{distribution}-{n}-{trial}")
+    keys = make_keys(distribution, n, rng)
+    batch_keys = [rng.randint(1, 20 * n) for _ in range(batch)]
+
+    index = constructor(seed = rng.getrandbits(64)) if structure in SEEDED else constructor()
+    return index, keys, batch_keys
+
+def run_sweep(structures, distributions, sizes, batch = 1001, trials = 1,
+              seed = 0, workers = None):
+    """
+    Runs every combination of structure, distribution, size and trial as an
+    independent process and returns the results in a stable order. The
+    structures in SETS sit out the distributions in REPEATING, whose
+    repeated keys they would not store.
+
+    Parameters:
+    - structures, distributions, sizes: The values to sweep over.
+    - batch (int): The size of the measured batch of each trial.
+    - trials (int): The number of trials of each combination.
+    - seed (int): The base seed.
+    - workers (int): The number of worker processes, one per CPU by default.
+
+    Returns:
+    A list of the dicts returned by run_trial.
+    """
+    configurations = [(structure, distribution, n, trial)
+                      for structure, distribution, n, trial
+                      in product(structures, distributions, sizes, range(trials))
+                      if not (structure in SETS and distribution in REPEATING)]
+    # a fresh process per trial keeps peak memory readings independent
+    with ProcessPoolExecutor(max_workers = workers, max_tasks_per_child = 1) as executor:
+        futures = [executor.submit(run_trial, structure, distribution, n, batch, trial, seed)
+                   for structure, distribution, n, trial in configurations]
+        return [future.result() for future in futures]
+
+def write_json(results, path):
+    """
+    Writes the results to path as a JSON list.
+    """
+    with open(path, "w", encoding = "utf-8") as file:
+        json.dump(results, file, indent = 2)
+
+def write_csv(results, path):
+    """
+    Writes the results to path as CSV with one row per trial.
+    """
+    if not results:
+        return
+    with open(path, "w", newline = "", encoding = "utf-8") as file:
+        writer = csv.DictWriter(file, fieldnames = list(results[0]))
+        writer.writeheader()
+        writer.writerows(results)
@@ -0,0 +1,97 @@
+"""
+Set operations on two indexes of very different sizes: union,
+intersection and difference of a large structure and a small one against
+inserting, searching for or deleting the small one's keys one by one.
+
+Run with python -m benchmark.set_operations from the repository root.
+"""
+import argparse
+import random
+from time import perf_counter
+from benchmark.structures import SEEDED, STRUCTURES
+
+SET_STRUCTURES = ("avl", "rb", "skip_list")
+
+def _build(structure, keys, seed):
+    constructor = STRUCTURES[structure][0]
+    options = {"seed": seed} if structure in SEEDED else {}
+    return constructor.from_sorted(sorted(keys), **options)
+
+def _key_by_key(operation, index, keys):
+    # what the set operation replaces: one call per key of the small index
+    if operation == "union":
+        for key in keys:
+            index.insert(key)
+    elif operation == "intersection":
+        kept = [key for key in keys if index.search(key)]
+        index = type(index).from_sorted(sorted(kept))
+    else:
+        for key in keys:
+            while index.delete(key):
+                pass
+    return index
+
+def measure_set_operations(structure = "avl", n = 200000, m = 1000, processes = None, seed = 0):
+    """
+    Times every set operation of an index of n random keys with one of m
+    random keys, and the same result reached one key at a time.
+
+    Parameters:
+    - structure (str): One of SET_STRUCTURES.
+    - n, m (int): The numbers of keys of the large and the small index.
+    - processes (int): Passed to the set operations of the trees.
+    - seed (int): Seeds the keys.
+
+    Returns:
+    A list with a dict per operation holding the seconds it took and
+    the seconds of the key by key equivalent.
+    """
+    rng = random.Random(seed)
+    keys = [rng.randrange(4 * n) for _ in range(n)]
+    other_keys = [rng.randrange(4 * n) for _ in range(m)]
+    options = {"processes": processes} if processes and structure != "skip_list" else {}
+    results = []
+    for operation in ("union", "intersection", "difference"):
+        index = _build(structure, keys, seed)
+        other = _build(structure, other_keys, seed)
+        start = perf_counter()
+        getattr(index, operation)(other, **options)
+        seconds = perf_counter() - start
+
+        index = _build(structure, keys, seed)
+        start = perf_counter()
+        _key_by_key(operation, index, other_keys)
+        key_by_key_seconds = perf_counter() - start
+        results.append({
+            "structure": structure,
+            "operation": operation,
+            "n": n,
+            "m": m,
+            "seconds": seconds,
+            "key_by_key_seconds": key_by_key_seconds,
+        })
+    return results
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(
+        prog = "python -m benchmark.set_operations",
+        description = "Time union, intersection and difference against key by key updates.")
+    parser.add_argument("--structures", nargs = "+", choices = SET_STRUCTURES,
+                        default = list(SET_STRUCTURES))
+    parser.add_argument("--n", type = lambda text: int(float(text)), default = 200000)
+    parser.add_argument("--m", nargs = "+", type = lambda text: int(float(text)),
+                        default = [100, 10000, 200000])
+    parser.add_argument("--processes", type = int, help = "worker processes for the trees")
+    parser.add_argument("--seed", type = int, default = 0)
+    args = parser.parse_args(argv)
+
+    print(f"{'structure':<11}{'operation':<14}{'n':>9}{'m':>9}{'set op ms':>11}"
+          f"{'key by key ms':>15}")
+    for structure in args.structures:
+        for m in args.m:
+            for result in measure_set_operations(structure, args.n, m, args.processes, args.seed):
+                print(f"{structure:<11}{result['operation']:<14}{result['n']:>9}{result['m']:>9}"
+                      f"{result['seconds'] * 1e3:>11.1f}{result['key_by_key_seconds'] * 1e3:>15.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Throughput of ShardedIndex against the number of shards: how bulk builds,
+batched inserts, batched searches and batched range queries scale from one
+worker process to many.
+
+Run with python -m benchmark.sharding from the repository root.
+"""
+import argparse
+import os
+import random
+from time import perf_counter
+from benchmark.structures import STRUCTURES
+from ShardedIndex import ShardedIndex
+
+def measure_scaling(structure = "avl", n = 1000000, batch = 100000, ranges = 1000,
+                    shard_counts = (1, 2, 4), seed = 0):
+    """
+    Builds a ShardedIndex of n random keys for every number of shards and
+    times each kind of batched operation on it.
+
+    Parameters:
+    - structure (str): A key of STRUCTURES, the structure of every shard.
+    - n (int): The number of keys built.
+    - batch (int): The number of keys inserted and searched for.
+    - ranges (int): The number of range queries, each covering about a
+    thousand keys.
+    - shard_counts: The numbers of shards to try.
+    - seed (int): Seeds the keys.
+
+    Returns:
+    A list with a dict per number of shards holding the operations per
+    second of build, insert, search and range, the last in keys returned.
+    """
+    rng = random.Random(seed)
+    keys = [rng.randrange(1 << 40) for _ in range(n)]
+    inserted = [rng.randrange(1 << 40) for _ in range(batch)]
+    searched = [rng.choice(keys) if rng.random() < 0.5 else rng.randrange(1 << 40)
+                for _ in range(batch)]
+    width = (1 << 40) * 1000 // n
+    queries = [(low, low + width) for low in (rng.randrange(1 << 40) for _ in range(ranges))]
+
+    results = []
+    for shards in shard_counts:
+        with ShardedIndex(shards, STRUCTURES[structure][0]) as index:
+            start = perf_counter()
+            index.build(keys)
+            build_seconds = perf_counter() - start
+
+            start = perf_counter()
+            index.insert_many(inserted)
+            insert_seconds = perf_counter() - start
+
+            start = perf_counter()
+            index.search_many(searched)
+            search_seconds = perf_counter() - start
+
+            start = perf_counter()
+            returned = sum(map(len, index.range_many(queries)))
+            range_seconds = perf_counter() - start
+
+        results.append({
+            "structure": structure,
+            "shards": shards,
+            "build_keys_per_sec": n / build_seconds,
+            "insert_ops_per_sec": batch / insert_seconds,
+            "search_ops_per_sec": batch / search_seconds,
+            "range_keys_per_sec": returned / range_seconds,
+        })
+    return results
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(
+        prog = "python -m benchmark.sharding",
+        description = "Measure how ShardedIndex throughput scales with the number of shards.")
+    parser.add_argument("--structures", nargs = "+",
+                        choices = [name for name in STRUCTURES if name != "concurrent_skip_list"],
+                        default = ["avl", "skip_list"])
+    parser.add_argument("--n", type = lambda text: int(float(text)), default = 1000000)
+    parser.add_argument("--batch", type = lambda text: int(float(text)), default = 100000)
+    parser.add_argument("--ranges", type = int, default = 1000)
+    parser.add_argument("--shards", nargs = "+", type = int,
+                        default = sorted({1, 2, 4, os.cpu_count() or 1}))
+    parser.add_argument("--seed", type = int, default = 0)
+    args = parser.parse_args(argv)
+
+    print(f"{os.cpu_count()} CPUs")
+    print(f"{'structure':<12}{'shards':>7}{'build keys/s':>14}{'insert/s':>12}"
+          f"{'search/s':>12}{'range keys/s':>14}")
+    for structure in args.structures:
+        for result in measure_scaling(structure, args.n, args.batch, args.ranges,
+                                      args.shards, args.seed):
+            print(f"{structure:<12}{result['shards']:>7}{result['build_keys_per_sec']:>14,.0f}"
+                  f"{result['insert_ops_per_sec']:>12,.0f}{result['search_ops_per_sec']:>12,.0f}"
+                  f"{result['range_keys_per_sec']:>14,.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,26 @@
+"""
+The structures the benchmarks can run, and whether they can be instrumented.
+"""
+from avl import AVLTree
+from ArrayAVL import ArrayAVLTree
+from BTree import BTree
+from ConcurrentSkipList import ConcurrentSkipList
+from RedBlack import RedBlackTree
+from SkipList import SkipList
+
+# name -> (constructor, whether it reports to a stats.Stats collector)
+STRUCTURES = {
+    "avl": (AVLTree, True),
+    "array_avl": (ArrayAVLTree, True),
+    "rb": (RedBlackTree, True),
+    "skip_list": (SkipList, True),
+    "btree": (BTree, True),
+    "concurrent_skip_list": (ConcurrentSkipList, False),
+}
+
+# structures that draw random levels and take a seed for them
+SEEDED = {"skip_list", "concurrent_skip_list"}
+
+# structures that store every key at most once, so a workload repeating
+# keys would leave them smaller than the others
+SETS = {"concurrent_skip_list"}
@@ -0,0 +1,108 @@
+"""
+Persistent trees against the mutable ones they are built on: the inserts
+per second of each, and the bytes every insert allocates, measured with
+tracemalloc, both when only the latest version is kept and when every
+version is.
+
+Run with python -m benchmark.versions from the repository root.
+"""
+import argparse
+import random
+import tracemalloc
+from time import perf_counter
+from avl import AVLTree
+from benchmark.workloads import DISTRIBUTIONS, make_keys
+from PersistentTree import PersistentAVLTree, PersistentRedBlackTree
+from RedBlack import RedBlackTree
+
+VERSIONED = {
+    "avl": (AVLTree, PersistentAVLTree),
+    "rb": (RedBlackTree, PersistentRedBlackTree),
+}
+
+def _insert_all(tree, keys, persistent, versions):
+    # the last tree, with every version appended to versions if it is a list
+    for key in keys:
+        if persistent:
+            tree = tree.insert(key)
+        else:
+            tree.insert(key)
+        if versions is not None:
+            versions.append(tree)
+    return tree
+
+def _allocated(cls, keys, persistent, keep):
+    # the bytes still allocated after the inserts
+    tracemalloc.start()
+    try:
+        start = tracemalloc.get_traced_memory()[0]
+        versions = [] if keep else None
+        tree = _insert_all(cls(), keys, persistent, versions)
+        allocated = tracemalloc.get_traced_memory()[0] - start
+    finally:
+        tracemalloc.stop()
+    del tree, versions
+    return allocated
+
+def measure_versions(structure = "avl", distribution = "shuffled", n = 100000, seed = 0):
+    """
+    Inserts n keys of a distribution one by one into the mutable tree and
+    into its persistent counterpart. The allocations are measured in
+    separate, untimed runs, since tracemalloc slows everything down.
+
+    Parameters:
+    - structure (str): A key of VERSIONED.
+    - distribution (str): A key of DISTRIBUTIONS.
+    - n (int): The number of keys.
+    - seed (int): Seeds the keys.
+
+    Returns:
+    A list with a dict for the mutable and the persistent tree holding
+    the inserts per second, the bytes per insert with only the latest
+    version kept, and the bytes per insert with every version kept; for
+    the mutable tree the last two are the same.
+    """
+    keys = make_keys(distribution, n, random.Random(seed))
+    results = []
+    for persistent, cls in enumerate(VERSIONED[structure]):
+        start = perf_counter()
+        _insert_all(cls(), keys, persistent, None)
+        seconds = perf_counter() - start
+
+        latest = _allocated(cls, keys, persistent, False)
+        # the list of versions itself is not the trees' doing
+        every = _allocated(cls, keys, persistent, True) - 8 * n
+        results.append({
+            "structure": structure,
+            "tree": cls.__name__,
+            "inserts_per_sec": n / seconds,
+            "latest_bytes_per_insert": latest / n,
+            "every_bytes_per_insert": every / n if persistent else latest / n,
+        })
+    return results
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(
+        prog = "python -m benchmark.versions",
+        description = "Compare persistent trees with the mutable ones.")
+    parser.add_argument("--structures", nargs = "+", choices = list(VERSIONED),
+                        default = list(VERSIONED))
+    parser.add_argument("--distributions", nargs = "+", choices = list(DISTRIBUTIONS),
+                        default = ["shuffled", "sorted"])
+    parser.add_argument("--n", type = lambda text: int(float(text)), default = 100000)
+    parser.add_argument("--seed", type = int, default = 0)
+    args = parser.parse_args(argv)
+
+    print(f"{'tree':<24}{'distribution':<15}{'inserts/s':>11}{'slowdown':>10}"
+          f"{'B/insert latest':>17}{'B/insert all':>14}")
+    for structure in args.structures:
+        for distribution in args.distributions:
+            mutable, persistent = measure_versions(structure, distribution, args.n, args.seed)
+            for result in (mutable, persistent):
+                slowdown = mutable["inserts_per_sec"] / result["inserts_per_sec"]
+                print(f"{result['tree']:<24}{distribution:<15}{result['inserts_per_sec']:>11,.0f}"
+                      f"{slowdown:>9.2f}x{result['latest_bytes_per_insert']:>17.0f}"
+                      f"{result['every_bytes_per_insert']:>14.0f}")
+
+if __name__ == "__main__":
+    main()
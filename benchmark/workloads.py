@@ -0,0 +1,80 @@
+"""
+Key sequences the benchmarks insert.
+"""
+import random
+from itertools import accumulate
+
+def knuth_shuffle(array, rng = random):
+    """
+    Shuffles the elements of the given array using the Knuth Shuffle algorithm.
+
+    Parameters:
+    array (list): The array to be shuffled.
+    rng: The random number generator to draw from, the random module by
+    default.
+
+    Returns:
+    None. The array is shuffled in-place.
+    """
+    for index in range(len(array) - 1, 0, -1):
+        swap_index = rng.randint(0, index)
+        array[index], array[swap_index] = array[swap_index], array[index]
+
+def _shuffled(n, rng):
+    keys = list(range(1, n + 1))
+    knuth_shuffle(keys, rng)
+    return keys
+
+def _sorted(n, rng):
+    return list(range(1, n + 1))
+
+def _reverse(n, rng):
+    return list(range(n, 0, -1))
+
+def _nearly_sorted(n, rng, window = 16):
+    # ascending, but every key may swap with one of the next window keys,
+    # as timestamps arriving slightly out of order
+    keys = list(range(1, n + 1))
+    for index in range(n - 1):
+        swap_index = rng.randint(index, min(n - 1, index + window))
+        keys[index], keys[swap_index] = keys[swap_index], keys[index]
+    return keys
+
+def _zipfian(n, rng, exponent = 1.1):
+    # rank r is drawn with probability proportional to 1 / r ** exponent
+    weights = accumulate(1 / rank ** exponent for rank in range(1, n + 1))
+    return rng.choices(range(1, n + 1), cum_weights = list(weights), k = n)
+
+def _duplicates(n, rng):
+    # on average every key appears a hundred times
+    distinct = max(1, n // 100)
+    return [rng.randint(1, distinct) for _ in range(n)]
+
+DISTRIBUTIONS = {
+    "shuffled": _shuffled,
+    "sorted": _sorted,
+    "reverse": _reverse,
+    "nearly_sorted": _nearly_sorted,
+    "zipfian": _zipfian,
+    "duplicates": _duplicates,
+}
+
+# distributions that repeat keys
+REPEATING = {"zipfian", "duplicates"}
+
+def make_keys(distribution, n, rng):
+    """
+    Returns n keys drawn from the named distribution.
+
+    Parameters:
+    - distribution (str): One of the keys of DISTRIBUTIONS.
+    - n (int): The number of keys.
+    - rng (random.Random): The generator to draw from.
+
+    Raises:
+    - ValueError: If the distribution is unknown.
+    """
+    if distribution not in DISTRIBUTIONS:
+        raise ValueError(f"unknown distribution {distribution!r}, "
+                         f"expected one of {', '.join(DISTRIBUTIONS)}")
+    return DISTRIBUTIONS[distribution](n, rng)
@@ -1,26 +1,28 @@
 """
     ICS2210 Project
+
+    Runs the single coursework trial. Use python -m benchmark for sweeps
+    over sizes, key distributions and structures.
 """
 
 from random import randint
 from statistics import mean, stdev, median
-from AVL import AVLTree
+from avl import AVLTree
 from RedBlack import RedBlackTree
 from SkipList import SkipList
+from benchmark.workloads import knuth_shuffle
 
-def knuth_shuffle(array):
+def print_statistics(title, values):
     """
-    Shuffles the elements of the given array using the Knuth Shuffle algorithm.
-    
-    Parameters:
-    array (list): The array to be shuffled.
-    
-    Returns:
-    None. The array is shuffled in-place.
+    Prints the minimum, maximum, mean, standard deviation and median of
+    values under the given title.
     """
-    for index in range(len(array) - 1, 0, -1):
-        swap_index = randint(0, index)
-        array[index], array[swap_index] = array[swap_index], array[index]
+    print(f"{title} Statistics:")
+    print(f"Minimum: {min(values)}")
+    print(f"Maximum: {max(values)}")
+    print(f"Mean: {mean(values)}")
+    print(f"Standard Deviation: {stdev(values)}")
+    print(f"Median: {median(values)}\n")
 
 if __name__ == "__main__":
     integers = list(range(1, 5001))
@@ -38,7 +40,6 @@ if __name__ == "__main__":
     # Insertion of Second array
     second_integers = [randint(1, 100000) for _ in range(1001)]
 
-    # AVL Tree section
     insertion_steps = {
         "avl": [],
         "rb": [],
@@ -62,53 +63,16 @@ if __name__ == "__main__":
         insertion_steps["skip_list"].append(steps)
         promotions.append(promotion)
 
-
-    print("AVL Tree Insertion Steps Statistics:")
-    print(f"Minimum: {min(insertion_steps["avl"])}")
-    print(f"Maximum: {max(insertion_steps["avl"])}")
-    print(f"Mean: {mean(insertion_steps["avl"])}")
-    print(f"Standard Deviation: {stdev(insertion_steps["avl"])}")
-    print(f"Median: {median(insertion_steps["avl"])}\n")
-
-    print("AVL Tree Rotations Statistics:")
-    print(f"Minimum: {min(rotations["avl"])}")
-    print(f"Maximum: {max(rotations["avl"])}")
-    print(f"Mean: {mean(rotations["avl"])}")
-    print(f"Standard Deviation: {stdev(rotations["avl"])}")
-    print(f"Median: {median(rotations["avl"])}\n")
-
+    print_statistics("AVL Tree Insertion Steps", insertion_steps["avl"])
+    print_statistics("AVL Tree Rotations", rotations["avl"])
     print(f"AVL Tree Height: {avl_tree.root.height}")
     print(f"AVL Tree Leaves: {avl_tree.get_leaves()}\n")
 
-    print("RB Tree Insertion Steps Statistics:")
-    print(f"Minimum: {min(insertion_steps["rb"])}")
-    print(f"Maximum: {max(insertion_steps["rb"])}")
-    print(f"Mean: {mean(insertion_steps["rb"])}")
-    print(f"Standard Deviation: {stdev(insertion_steps["rb"])}")
-    print(f"Median: {median(insertion_steps["rb"])}\n")
-
-    print("RB Tree Rotations Statistics:")
-    print(f"Minimum: {min(rotations["rb"])}")
-    print(f"Maximum: {max(rotations["rb"])}")
-    print(f"Mean: {mean(rotations["rb"])}")
-    print(f"Standard Deviation: {stdev(rotations["rb"])}")
-    print(f"Median: {median(rotations["rb"])}\n")
-
+    print_statistics("RB Tree Insertion Steps", insertion_steps["rb"])
+    print_statistics("RB Tree Rotations", rotations["rb"])
     print(f"RB Tree Height: {rb_tree.get_height()}")
-    print(f"RB Tree Leaves: {rb_tree.get_leaves()}")
-
-    print("Skip List Insertion Steps Statistics:")
-    print(f"Minimum: {min(insertion_steps["skip_list"])}")
-    print(f"Maximum: {max(insertion_steps["skip_list"])}")
-    print(f"Mean: {mean(insertion_steps["skip_list"])}")
-    print(f"Standard Deviation: {stdev(insertion_steps["skip_list"])}")
-    print(f"Median: {median(insertion_steps["skip_list"])}\n")
-
-    print("Skip List Promotions Statistics:")
-    print(f"Minimum: {min(promotions)}")
-    print(f"Maximum: {max(promotions)}")
-    print(f"Mean: {mean(promotions)}")
-    print(f"Standard Deviation: {stdev(promotions)}")
-    print(f"Median: {median(promotions)}\n")
+    print(f"RB Tree Leaves: {rb_tree.get_leaves()}\n")
 
+    print_statistics("Skip List Insertion Steps", insertion_steps["skip_list"])
+    print_statistics("Skip List Promotions", promotions)
     print(f"Skip List Levels: {skip_list.max_height}")
@@ -0,0 +1,34 @@
+"""
+Custom orderings for the trees and the skip list.
+"""
+from functools import cmp_to_key
+
+def make_key(key = None, cmp = None):
+    """
+    Combines a key function and an old style comparison function into the
+    one function that turns a stored item into what is compared. Each
+    structure calls it once per item and caches the result in the node.
+
+    Parameters:
+    - key: A function of one item, as for sorted().
+    - cmp: A function of two keys returning a negative number, zero or a
+    positive number, as for functools.cmp_to_key. With key as well it
+    compares the results of key.
+
+    Returns:
+    The function, or None if items are compared as they are.
+    """
+    if cmp is None:
+        return key
+    wrap = cmp_to_key(cmp)
+    if key is None:
+        return wrap
+    return lambda item: wrap(key(item))
+
+def make_query(cmp = None):
+    """
+    Returns the function that turns a key passed to a lookup, which is
+    already a key rather than an item, into what is compared, or None if
+    it is compared as it is.
+    """
+    return None if cmp is None else cmp_to_key(cmp)
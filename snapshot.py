@@ -0,0 +1,177 @@
+"""
+Compact binary snapshots of the search structures.
+
+A snapshot holds the keys in sorted order as signed 64 bit integers,
+followed by one byte per key for every piece of structure metadata (AVL
+heights, red-black heights and colours, skip list levels), so that a
+structure can be rebuilt with exactly the same shape. The file can also
+be memory mapped and queried in place through SnapshotView, without
+building any node.
+"""
+import mmap
+import os
+import struct
+import sys
+from bisect import bisect_left, bisect_right
+
+MAGIC = b"DSA2SNAP"
+VERSION = 1
+# magic, version, kind, little endian flag, metadata arrays, key count
+HEADER = struct.Struct("<8sHBBIQ")
+
+KINDS = {"avl": 1, "rb": 2, "skip_list": 3}
+
+def write_snapshot(path, kind, keys, metadata = ()):
+    """
+    Writes a snapshot file, replacing path atomically.
+
+    Parameters:
+    - path: The file to write.
+    - kind (str): The structure the snapshot describes, a key of KINDS.
+    - keys (array): The sorted keys, as an array('q').
+    - metadata: Arrays of unsigned bytes, one entry per key each.
+
+    Raises:
+    - ValueError: If a metadata array does not have one entry per key.
+    """
+    if any(len(values) != len(keys) for values in metadata):
+        raise ValueError("every metadata array needs one entry per key")
+
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "wb") as file:
+        file.write(HEADER.pack(MAGIC, VERSION, KINDS[kind], sys.byteorder == "little",
+                               len(metadata), len(keys)))
+        keys.tofile(file)
+        for values in metadata:
+            values.tofile(file)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporary_path, path)
+
+class SnapshotView:
+    """
+    Read-only view of a snapshot file. The file is memory mapped and the
+    keys are read straight from the mapping, so opening is O(1) whatever
+    the size of the snapshot and pages are only loaded as they are touched.
+
+    Use it as a context manager, or call close() when done.
+    """
+    def __init__(self, path):
+        """
+        Parameters:
+        - path: The snapshot file to open.
+
+        Raises:
+        - ValueError: If the file is not a snapshot this code can read.
+        """
+        with open(path, "rb") as file:
+            size = os.fstat(file.fileno()).st_size
+            if size < HEADER.size:
+                raise ValueError(f"{path} is not a snapshot file")
+            self._map = mmap.mmap(file.fileno(), 0, access = mmap.ACCESS_READ)
+
+        magic, version, kind, little_endian, metadata_count, count = HEADER.unpack_from(self._map)
+        if magic != MAGIC or version != VERSION:
+            self._map.close()
+            raise ValueError(f"{path} is not a version {VERSION} snapshot file")
+        if little_endian != (sys.byteorder == "little"):
+            self._map.close()
+            raise ValueError(f"{path} was written on a machine of the other byte order")
+
+        self.kind = next(name for name, code in KINDS.items() if code == kind)
+        self._view = memoryview(self._map)
+        start = HEADER.size
+        self.keys = self._view[start:start + 8 * count].cast("q")
+        start += 8 * count
+        self.metadata = []
+        for _ in range(metadata_count):
+            self.metadata.append(self._view[start:start + count])
+            start += count
+
+    def close(self):
+        """
+        Releases the mapping. Keys read from the view stay valid.
+        """
+        for values in self.metadata:
+            values.release()
+        self.keys.release()
+        self._view.release()
+        self._map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __iter__(self):
+        return iter(self.keys)
+
+    def __reversed__(self):
+        return reversed(self.keys)
+
+    def search(self, key):
+        """
+        Search for a key by binary search over the mapped keys.
+
+        Returns:
+        - True if found and False if otherwise
+        """
+        index = bisect_left(self.keys, key)
+        return index < len(self.keys) and self.keys[index] == key
+
+    def search_many(self, keys):
+        """
+        Searches for a batch of keys.
+
+        Returns:
+        A list of booleans, True where the key at the same position of
+        keys is in the snapshot.
+        """
+        return [self.search(key) for key in keys]
+
+    def iter_from(self, key):
+        """
+        Iterates in ascending order over the keys greater than or equal to key.
+        """
+        for index in range(bisect_left(self.keys, key), len(self.keys)):
+            yield self.keys[index]
+
+    def range(self, low, high):
+        """
+        Iterates in ascending order over the keys k with low <= k < high.
+        """
+        for index in range(bisect_left(self.keys, low), bisect_left(self.keys, high)):
+            yield self.keys[index]
+
+    def rank(self, key):
+        """
+        Returns the number of keys strictly smaller than key.
+        """
+        return bisect_left(self.keys, key)
+
+    def select(self, index):
+        """
+        Returns the key at position index of the sorted order.
+
+        Raises:
+        - IndexError: If index is not in range(len(self)).
+        """
+        if not 0 <= index < len(self.keys):
+            raise IndexError("snapshot index out of range")
+        return self.keys[index]
+
+    def count_range(self, low, high):
+        """
+        Returns the number of keys k with low <= k < high.
+        """
+        return max(0, bisect_left(self.keys, high) - bisect_left(self.keys, low))
+
+    def count(self, key):
+        """
+        Returns the number of times key occurs.
+        """
+        return bisect_right(self.keys, key) - bisect_left(self.keys, key)
@@ -0,0 +1,87 @@
+"""
+Optional counters of the work the structures do, comparable across them.
+"""
+
+class Stats:
+    """
+    Collects what the operations of a structure cost. Attach one by setting
+    the structure's stats attribute; while it is None nothing is counted.
+    Every insert, search and delete records once, when it finishes.
+
+    The counters mean the same for every structure:
+    - comparisons: Key comparisons, a three-way comparison counting once.
+    - visits: Nodes whose key was looked at on the way to the position, the
+    path length of a tree and the forward hops of a skip list.
+    - rotations: Single rotations, a double rotation counting as two.
+    - recolorings: Red-black colour changes.
+    - splits, merges: B-tree nodes split by inserts or merged by deletes.
+    - promotions: Skip list levels of new nodes above the bottom one.
+    """
+    __slots__ = ("operations", "comparisons", "visits", "rotations", "recolorings",
+                 "splits", "merges", "promotions")
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """
+        Sets every counter back to zero.
+        """
+        for name in self.__slots__:
+            setattr(self, name, 0)
+
+    def record(self, comparisons = 0, visits = 0, rotations = 0, recolorings = 0,
+               splits = 0, merges = 0, promotions = 0):
+        """
+        Adds the counts of one finished operation.
+        """
+        self.operations += 1
+        self.comparisons += comparisons
+        self.visits += visits
+        self.rotations += rotations
+        self.recolorings += recolorings
+        self.splits += splits
+        self.merges += merges
+        self.promotions += promotions
+
+    def merge(self, other):
+        """
+        Adds every counter of another Stats to this one.
+        """
+        for name in self.__slots__:
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+
+    def as_dict(self):
+        """
+        Returns the counters as a dict.
+        """
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __repr__(self):
+        counters = ", ".join(f"{name}={value}" for name, value in self.as_dict().items())
+        return f"Stats({counters})"
+
+def measure(structure, operation, *args):
+    """
+    Runs one operation of a structure with a fresh collector attached and
+    returns it, adding its counts to the structure's own collector, if it
+    has one, as well.
+
+    Parameters:
+    - structure: The structure, which has a stats attribute.
+    - operation (str): The name of the method to call, such as "insert".
+    - args: The arguments of the method.
+
+    Returns:
+    The Stats of the operation.
+    """
+    stats = Stats()
+    previous = structure.stats
+    structure.stats = stats
+    try:
+        getattr(structure, operation)(*args)
+    finally:
+        structure.stats = previous
+    if previous is not None:
+        previous.merge(stats)
+    return stats
@@ -0,0 +1,914 @@
+"""
+Tests, run with python -m pytest test.py or python -m unittest test from
+the repository root.
+"""
+import asyncio
+import os
+import sys
+import unittest
+from bisect import bisect_left
+from itertools import islice
+from random import Random
+from tempfile import TemporaryDirectory
+from threading import Barrier, Thread
+from AsyncIndex import AsyncIndex, serve
+from benchmark.iterative import _recursive_insert
+from benchmark.workloads import make_keys
+from ArrayAVL import ArrayAVLTree
+from avl import AVLNode, AVLTree
+from BTree import BTree
+from ConcurrentSkipList import ConcurrentSkipList
+from OrderedMap import BACKENDS, OrderedMap
+from PersistentTree import PersistentAVLTree, PersistentRedBlackTree
+from RedBlack import RedBlackTree
+from ShardedIndex import ShardedIndex
+from SkipList import SkipList
+from stats import Stats
+from wal import DurableIndex
+
+# name -> (class, constructor arguments), small nodes and fixed seeds
+# where a structure has them
+STRUCTURES = {
+    "avl": (AVLTree, {}),
+    "rb": (RedBlackTree, {}),
+    "skip_list": (SkipList, {"seed": 0}),
+    "array_avl": (ArrayAVLTree, {}),
+    "btree": (BTree, {"order": 4}),
+}
+
+def _new(name):
+    cls, options = STRUCTURES[name]
+    return cls(**options)
+
+def _from_sorted(name, keys):
+    cls, options = STRUCTURES[name]
+    return cls.from_sorted(keys, **options)
+
+def _random_keys(count, high, seed = 0):
+    rng = Random(seed)
+    return [rng.randrange(high) for _ in range(count)]
+
+class StructureTest(unittest.TestCase):
+    def assert_matches(self, structure, reference):
+        # the contents against a sorted list, then the structure's own checks
+        reference = sorted(reference)
+        self.assertEqual(list(structure), reference)
+        self.assertEqual(len(structure), len(reference))
+        self.assertTrue(structure.validate())
+
+class BulkLoadTest(StructureTest):
+    def test_from_sorted(self):
+        for name in STRUCTURES:
+            for count in (0, 1, 2, 7, 1000):
+                keys = sorted(_random_keys(count, 300))
+                with self.subTest(structure = name, count = count):
+                    self.assert_matches(_from_sorted(name, keys), keys)
+
+    def test_from_sorted_rejects_unsorted_keys(self):
+        for name in STRUCTURES:
+            with self.subTest(structure = name):
+                with self.assertRaises(ValueError):
+                    _from_sorted(name, [1, 3, 2])
+
+    def test_bulk_insert(self):
+        for name in STRUCTURES:
+            with self.subTest(structure = name):
+                structure = _new(name)
+                first = _random_keys(300, 500, seed = 1)
+                for key in first:
+                    structure.insert(key)
+                second = _random_keys(700, 500, seed = 2)
+                structure.bulk_insert(second)
+                self.assert_matches(structure, first + second)
+
+                empty = _new(name)
+                empty.bulk_insert(second)
+                self.assert_matches(empty, second)
+
+def _shape(node):
+    # the keys in pre-order, which pins down the shape of a search tree
+    shape = []
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if node:
+            shape.append(node.key)
+            stack.extend((node.right, node.left))
+    return shape
+
+class IterativeInsertTest(StructureTest):
+    def test_insert_and_search(self):
+        keys = _random_keys(3000, 1000)
+        tree = AVLTree()
+        for key in keys:
+            tree.insert(key)
+        self.assert_matches(tree, keys)
+        present = set(keys)
+        self.assertEqual([tree.search(key) for key in range(-5, 1005)],
+                         [key in present for key in range(-5, 1005)])
+
+    def test_same_tree_as_the_recursive_insert(self):
+        keys = _random_keys(2000, 500, seed = 3)
+        tree = AVLTree()
+        root = None
+        for key in keys:
+            tree.insert(key)
+            root = _recursive_insert(root, key)
+        self.assertEqual(_shape(tree.root), _shape(root))
+
+    def test_sorted_keys_stay_balanced(self):
+        tree = AVLTree()
+        for key in range(20000):
+            tree.insert(key)
+        self.assert_matches(tree, range(20000))
+        # an AVL tree of n nodes is at most about 1.44 log2 n high
+        self.assertLessEqual(tree.height, 1.45 * (20000).bit_length())
+
+    def test_insertion_steps_and_rotation(self):
+        tree = AVLTree()
+        for key in _random_keys(2000, 700, seed = 4):
+            path = 0
+            node = tree.root
+            while node:
+                path += 1
+                node = node.left if key < node.key else node.right
+            steps, rotations = tree.insertion_steps_and_rotation(key)
+            self.assertEqual(steps, path)
+            self.assertIn(rotations, (0, 1, 2))
+        self.assertTrue(tree.validate())
+
+class SearchManyTest(StructureTest):
+    def test_search_many_matches_search(self):
+        keys = _random_keys(1500, 1000)
+        # unsorted, repeated and missing keys, in the order given
+        queries = _random_keys(800, 1100, seed = 5) + [-1, 0, 999, 999]
+        present = set(keys)
+        for name in STRUCTURES:
+            structure = _from_sorted(name, sorted(keys))
+            with self.subTest(structure = name):
+                found = structure.search_many(queries)
+                self.assertEqual(list(found), [query in present for query in queries])
+                self.assertEqual(list(found), [structure.search(query) for query in queries])
+                self.assertEqual(list(structure.search_many([])), [])
+                self.assertEqual(list(_new(name).search_many([1, 2])), [False, False])
+                self.assert_matches(structure, keys)
+
+class OrderedIterationTest(StructureTest):
+    def test_range_iter_from_and_reversed(self):
+        keys = _random_keys(1200, 400, seed = 6)
+        reference = sorted(keys)
+        bounds = [(-5, 3), (0, 400), (17, 17), (30, 20), (100, 101), (250, 1000), (399, 400)]
+        for name in STRUCTURES:
+            structure = _new(name)
+            for key in keys:
+                structure.insert(key)
+            with self.subTest(structure = name):
+                for low, high in bounds:
+                    self.assertEqual(list(structure.range(low, high)),
+                                     [key for key in reference if low <= key < high])
+                for start in (-1, 0, 57, 399, 400):
+                    self.assertEqual(list(structure.iter_from(start)),
+                                     [key for key in reference if key >= start])
+                self.assertEqual(list(reversed(structure)), reference[::-1])
+                self.assert_matches(structure, keys)
+
+    def test_iterators_are_lazy(self):
+        for name in STRUCTURES:
+            structure = _from_sorted(name, range(100000))
+            with self.subTest(structure = name):
+                self.assertEqual(list(islice(structure.iter_from(500), 3)), [500, 501, 502])
+                self.assertEqual(next(iter(structure.range(99990, 10 ** 9))), 99990)
+                self.assertEqual(list(islice(reversed(structure), 2)), [99999, 99998])
+
+class OrderStatisticsTest(StructureTest):
+    RANKED = ("avl", "rb", "skip_list", "array_avl")
+
+    def test_rank_select_and_count_range(self):
+        keys = _random_keys(1000, 300, seed = 7)
+        reference = sorted(keys)
+        for name in self.RANKED:
+            structure = _new(name)
+            for key in keys:
+                structure.insert(key)
+            with self.subTest(structure = name):
+                for key in range(-2, 303, 7):
+                    self.assertEqual(structure.rank(key), bisect_left(reference, key))
+                self.assertEqual([structure.select(index) for index in range(len(reference))],
+                                 reference)
+                for low, high in ((0, 300), (-10, 5), (40, 41), (120, 80), (299, 1000)):
+                    self.assertEqual(structure.count_range(low, high),
+                                     sum(low <= key < high for key in reference))
+                for index in (-1, len(reference)):
+                    with self.assertRaises(IndexError):
+                        structure.select(index)
+                self.assert_matches(structure, keys)
+
+class DeleteTest(StructureTest):
+    def test_delete_against_a_list(self):
+        keys = _random_keys(1500, 500, seed = 8)
+        deletes = _random_keys(2000, 550, seed = 9)
+        for name in STRUCTURES:
+            structure = _new(name)
+            for key in keys:
+                structure.insert(key)
+            reference = sorted(keys)
+            with self.subTest(structure = name):
+                for step, key in enumerate(deletes):
+                    expected = key in reference
+                    if expected:
+                        reference.remove(key)
+                    self.assertIs(structure.delete(key), expected)
+                    if step % 250 == 0:
+                        self.assert_matches(structure, reference)
+                self.assert_matches(structure, reference)
+                for key in list(reference):
+                    self.assertTrue(structure.delete(key))
+                self.assert_matches(structure, [])
+                self.assertFalse(structure.delete(0))
+
+    def test_delete_keeps_order_statistics(self):
+        reference = list(range(0, 400, 2))
+        for name in OrderStatisticsTest.RANKED:
+            structure = _from_sorted(name, reference)
+            with self.subTest(structure = name):
+                for key in range(0, 400, 6):
+                    structure.delete(key)
+                remaining = [key for key in reference if key % 6]
+                self.assertEqual([structure.select(index) for index in range(len(remaining))],
+                                 remaining)
+                self.assertEqual(structure.rank(200), bisect_left(remaining, 200))
+
+def _max_node(node):
+    while node.right:
+        node = node.right
+    return node
+
+class ValidatorTest(StructureTest):
+    def test_valid_trees_pass(self):
+        keys = _random_keys(2000, 800, seed = 10)
+        for cls in (AVLTree, RedBlackTree, ArrayAVLTree):
+            tree = cls()
+            for key in keys:
+                tree.insert(key)
+            with self.subTest(tree = cls.__name__):
+                self.assertTrue(tree.validate())
+                self.assertTrue(tree.validate(time_budget = 0.01, seed = 0, sample_size = 64))
+                self.assertTrue(tree.is_binary_tree())
+                self.assertTrue(tree.is_rb_tree() if cls is RedBlackTree else tree.is_avl_tree())
+
+    def test_key_out_of_an_ancestors_bounds(self):
+        for cls in (AVLTree, RedBlackTree):
+            tree = cls.from_sorted(range(100))
+            # in order against its parent, but larger than the root above it
+            _max_node(tree.root.left).key = tree.root.key + 0.5
+            with self.subTest(tree = cls.__name__):
+                self.assertFalse(tree.is_binary_tree())
+                self.assertFalse(tree.validate())
+
+    def test_wrong_size_and_height(self):
+        for cls in (AVLTree, RedBlackTree):
+            tree = cls.from_sorted(range(100))
+            _max_node(tree.root).size += 1
+            with self.subTest(tree = cls.__name__, field = "size"):
+                self.assertFalse(tree.validate())
+            tree = cls.from_sorted(range(100))
+            _max_node(tree.root).height += 1
+            with self.subTest(tree = cls.__name__, field = "height"):
+                self.assertFalse(tree.validate())
+
+    def test_red_black_colours(self):
+        tree = RedBlackTree.from_sorted(range(100))
+        tree.root.left.red = not tree.root.left.red
+        self.assertFalse(tree.validate())
+        tree = RedBlackTree.from_sorted(range(100))
+        tree.root.red = True
+        self.assertFalse(tree.validate())
+        self.assertTrue(tree.is_binary_tree())
+
+    def test_cycle_ends_the_walk(self):
+        tree = AVLTree.from_sorted(range(100))
+        _max_node(tree.root).right = tree.root.right
+        self.assertFalse(tree.validate())
+        self.assertFalse(tree.is_binary_tree())
+
+    def test_deep_tree_without_recursion(self):
+        tree = AVLTree()
+        count = 20000
+        nodes = [AVLNode(key) for key in range(count)]
+        for node, child in zip(nodes, nodes[1:]):
+            node.right = child
+        for height, node in enumerate(reversed(nodes), 1):
+            node.size = node.height = height
+        tree.root = nodes[0]
+        self.assertTrue(tree.is_binary_tree())
+        self.assertFalse(tree.validate())
+
+def _recount(root):
+    # (size, height, leaves) of a binary tree, counted from scratch
+    size = leaves = height = 0
+    stack = [(root, 1)]
+    while stack:
+        node, depth = stack.pop()
+        if node:
+            size += 1
+            height = max(height, depth)
+            leaves += not node.left and not node.right
+            stack.extend(((node.left, depth + 1), (node.right, depth + 1)))
+    return size, height, leaves
+
+class CachedStatisticsTest(StructureTest):
+    def test_size_height_and_leaves_follow_updates(self):
+        inserts = _random_keys(1500, 600, seed = 11)
+        deletes = _random_keys(1000, 600, seed = 12)
+        for cls in (AVLTree, RedBlackTree):
+            tree = cls()
+            with self.subTest(tree = cls.__name__):
+                self.assertEqual((tree.size, tree.height, tree.leaf_count), (0, 0, 0))
+                for step, key in enumerate(inserts + deletes):
+                    if step < len(inserts):
+                        tree.insert(key)
+                    else:
+                        tree.delete(key)
+                    if step % 100 == 0:
+                        self.assertEqual((tree.size, tree.height, tree.leaf_count),
+                                         _recount(tree.root))
+                self.assertEqual((tree.size, tree.height, tree.get_leaves()), _recount(tree.root))
+                tree.bulk_insert(deletes)
+                self.assertEqual((tree.size, tree.height, tree.leaf_count), _recount(tree.root))
+
+    def test_skip_list_and_b_tree(self):
+        for name in ("skip_list", "btree"):
+            structure = _new(name)
+            for key in _random_keys(1000, 300, seed = 13):
+                structure.insert(key)
+            for key in range(0, 300, 3):
+                structure.delete(key)
+            with self.subTest(structure = name):
+                self.assertEqual(structure.size, len(list(structure)))
+                self.assertGreater(structure.height, 1)
+                self.assertTrue(structure.validate())
+
+class SnapshotTest(StructureTest):
+    SAVED = ("avl", "rb", "skip_list", "array_avl")
+
+    def setUp(self):
+        directory = TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "index.snap")
+
+    def test_load_gives_back_the_same_structure(self):
+        keys = _random_keys(3000, 1000, seed = 14)
+        for name in self.SAVED:
+            structure = _new(name)
+            for key in keys:
+                structure.insert(key)
+            for key in keys[::3]:
+                structure.delete(key)
+            structure.save(self.path)
+            loaded = STRUCTURES[name][0].load(self.path)
+            with self.subTest(structure = name):
+                self.assert_matches(loaded, list(structure))
+                self.assertEqual(loaded.height, structure.height)
+                if name in ("avl", "rb"):
+                    self.assertEqual(_shape(loaded.root), _shape(structure.root))
+                    self.assertEqual(loaded.leaf_count, structure.leaf_count)
+                # a loaded structure takes updates like any other
+                loaded.insert(-1)
+                loaded.delete(keys[1])
+                self.assertTrue(loaded.validate())
+
+    def test_lazy_view_answers_queries(self):
+        keys = sorted(_random_keys(2000, 700, seed = 15))
+        AVLTree.from_sorted(keys).save(self.path)
+        view = AVLTree.load(self.path, lazy = True)
+        with view:
+            self.assertEqual(len(view), len(keys))
+            self.assertEqual(list(view.range(100, 200)), [key for key in keys if 100 <= key < 200])
+            self.assertEqual(list(view.iter_from(650)), [key for key in keys if key >= 650])
+            self.assertEqual(view.rank(300), bisect_left(keys, 300))
+            self.assertEqual(view.select(1234), keys[1234])
+            self.assertEqual(view.count_range(50, 60), sum(50 <= key < 60 for key in keys))
+            present = set(keys)
+            self.assertEqual([view.search(key) for key in range(700)],
+                             [key in present for key in range(700)])
+            with self.assertRaises(IndexError):
+                view.select(len(keys))
+
+    def test_wrong_kind_or_file_is_rejected(self):
+        RedBlackTree.from_sorted(range(10)).save(self.path)
+        with self.assertRaises(ValueError):
+            AVLTree.load(self.path)
+        with open(self.path, "wb") as file:
+            file.write(b"not a snapshot at all")
+        with self.assertRaises(ValueError):
+            RedBlackTree.load(self.path)
+
+class BTreeTest(StructureTest):
+    def test_updates_at_every_order(self):
+        inserts = _random_keys(2000, 700, seed = 16)
+        deletes = _random_keys(2500, 750, seed = 17)
+        for order in (3, 4, 5, 8, 64):
+            tree = BTree(order)
+            reference = []
+            with self.subTest(order = order):
+                for step, key in enumerate(inserts):
+                    tree.insert(key)
+                    reference.append(key)
+                    if step % 200 == 0:
+                        self.assert_matches(tree, reference)
+                reference.sort()
+                for step, key in enumerate(deletes):
+                    expected = key in reference
+                    if expected:
+                        reference.remove(key)
+                    self.assertIs(tree.delete(key), expected)
+                    if step % 200 == 0:
+                        self.assert_matches(tree, reference)
+                self.assert_matches(tree, reference)
+                self.assertEqual(list(reversed(tree)), reference[::-1])
+
+    def test_wide_nodes_keep_the_tree_shallow(self):
+        tree = BTree.from_sorted(range(100000))
+        self.assertLessEqual(tree.height, 3)
+        self.assertTrue(tree.validate())
+        for key in range(-1, 100001, 997):
+            self.assertIs(tree.search(key), 0 <= key < 100000)
+
+    def test_order_must_be_at_least_three(self):
+        with self.assertRaises(ValueError):
+            BTree(2)
+
+class CustomOrderingTest(StructureTest):
+    ORDERED = ("avl", "rb", "skip_list")
+
+    def _new_ordered(self, name, **ordering):
+        cls, options = STRUCTURES[name]
+        return cls(**options, **ordering)
+
+    def test_key_function(self):
+        records = [(key, f"record {number}") for number, key
+                   in enumerate(_random_keys(800, 200, seed = 18))]
+        calls = []
+
+        def key(record):
+            calls.append(record)
+            return record[0]
+
+        for name in self.ORDERED:
+            calls.clear()
+            structure = self._new_ordered(name, key = key)
+            for record in records:
+                structure.insert(record)
+            with self.subTest(structure = name):
+                # computed once per item, on insert
+                self.assertEqual(len(calls), len(records))
+                self.assertEqual([record[0] for record in structure],
+                                 sorted(record[0] for record in records))
+                self.assertEqual(sorted(structure), sorted(records))
+                self.assertTrue(structure.validate())
+                # lookups take keys, not items
+                self.assertEqual(sorted(structure.range(50, 52)),
+                                 sorted(record for record in records if 50 <= record[0] < 52))
+                self.assertEqual(structure.search(records[0][0]), True)
+                self.assertTrue(structure.delete(records[0][0]))
+                self.assertEqual(len(structure), len(records) - 1)
+
+    def test_cmp_function(self):
+        keys = _random_keys(600, 300, seed = 19)
+        reverse = sorted(keys, reverse = True)
+        for name in self.ORDERED:
+            structure = self._new_ordered(name, cmp = lambda a, b: (a < b) - (a > b))
+            for key in keys:
+                structure.insert(key)
+            with self.subTest(structure = name):
+                self.assertEqual(list(structure), reverse)
+                self.assertTrue(structure.validate())
+                self.assertEqual(list(structure.range(250, 240)),
+                                 [key for key in reverse if 240 < key <= 250])
+                self.assertEqual(structure.rank(100), sum(key > 100 for key in keys))
+                self.assertTrue(structure.search(keys[5]))
+                self.assertFalse(structure.search(-7))
+
+    def test_strings_and_tuples(self):
+        words = ["pear", "apple", "fig", "kiwi", "banana", "apple"]
+        for name in self.ORDERED:
+            structure = _new(name)
+            for word in words:
+                structure.insert(word)
+            with self.subTest(structure = name):
+                self.assert_matches(structure, words)
+                self.assertEqual(list(structure.range("b", "g")), ["banana", "fig"])
+
+class OrderedMapTest(unittest.TestCase):
+    def test_against_dict(self):
+        rng = Random(20)
+        for backend in BACKENDS:
+            mapping = OrderedMap(backend = backend, **({"seed": 0} if backend == "skip_list" else {}))
+            reference = {}
+            for step in range(3000):
+                key = rng.randrange(400)
+                if rng.random() < 0.25:
+                    self.assertEqual(mapping.pop(key, None), reference.pop(key, None))
+                else:
+                    mapping[key] = reference[key] = step
+            with self.subTest(backend = backend):
+                keys = sorted(reference)
+                self.assertEqual(list(mapping), keys)
+                self.assertEqual(list(reversed(mapping)), keys[::-1])
+                self.assertEqual(list(mapping.items()), [(key, reference[key]) for key in keys])
+                self.assertEqual(list(mapping.values()), [reference[key] for key in keys])
+                self.assertEqual(len(mapping), len(reference))
+                self.assertTrue(mapping._index.validate())
+                for key in range(-1, 402):
+                    self.assertEqual(mapping.get(key, "missing"), reference.get(key, "missing"))
+                    self.assertEqual(key in mapping, key in reference)
+                    position = bisect_left(keys, key)
+                    ceiling = keys[position] if position < len(keys) else None
+                    if position < len(keys) and keys[position] == key:
+                        floor = key
+                    else:
+                        floor = keys[position - 1] if position else None
+                    self.assertEqual(mapping.floor(key), floor)
+                    self.assertEqual(mapping.ceiling(key), ceiling)
+
+    def test_missing_keys_and_defaults(self):
+        for backend in BACKENDS:
+            mapping = OrderedMap({3: "c", 1: "a"}, backend = backend)
+            with self.subTest(backend = backend):
+                self.assertEqual(mapping.setdefault(2, "b"), "b")
+                self.assertEqual(mapping.setdefault(2, "other"), "b")
+                self.assertEqual(list(mapping.items()), [(1, "a"), (2, "b"), (3, "c")])
+                with self.assertRaises(KeyError):
+                    mapping[5]
+                with self.assertRaises(KeyError):
+                    mapping.pop(5)
+                with self.assertRaises(KeyError):
+                    del mapping[5]
+                del mapping[1]
+                self.assertEqual(dict(mapping), {2: "b", 3: "c"})
+                mapping.clear()
+                self.assertEqual(len(mapping), 0)
+                self.assertIsNone(mapping.floor(10))
+        with self.assertRaises(ValueError):
+            OrderedMap(backend = "hash")
+
+class FingerTest(StructureTest):
+    FINGERED = ("avl", "rb", "skip_list")
+    SEARCHABLE = ("rb", "skip_list")
+    STREAMS = ("sorted", "nearly_sorted", "shuffled", "duplicates")
+
+    def test_finger_insert(self):
+        for name in self.FINGERED:
+            for distribution in self.STREAMS:
+                keys = make_keys(distribution, 3000, Random(23))
+                structure = _new(name)
+                for key in keys:
+                    structure.finger_insert(key)
+                with self.subTest(structure = name, distribution = distribution):
+                    self.assert_matches(structure, keys)
+
+    def test_mixed_with_other_updates(self):
+        # inserts and deletes in between may move or reset the finger
+        rng = Random(23)
+        for name in self.FINGERED:
+            structure = _new(name)
+            reference = []
+            for step in range(4000):
+                key = step // 2 + rng.randrange(-20, 20)
+                choice = rng.random()
+                if choice < 0.7:
+                    structure.finger_insert(key)
+                    reference.append(key)
+                elif choice < 0.85:
+                    structure.insert(key)
+                    reference.append(key)
+                elif key in reference:
+                    self.assertTrue(structure.delete(key))
+                    reference.remove(key)
+            with self.subTest(structure = name):
+                self.assert_matches(structure, reference)
+
+    def test_finger_search(self):
+        for name in self.SEARCHABLE:
+            for distribution in ("sorted", "nearly_sorted", "shuffled"):
+                keys = [2 * key for key in make_keys(distribution, 2000, Random(23))]
+                structure = _new(name)
+                for key in keys:
+                    structure.finger_insert(key)
+                with self.subTest(structure = name, distribution = distribution):
+                    for key in keys:
+                        self.assertTrue(structure.finger_search(key))
+                        self.assertFalse(structure.finger_search(key + 1))
+                    self.assertFalse(structure.finger_search(-1))
+                    self.assert_matches(structure, keys)
+
+    def test_append_costs_one_comparison(self):
+        for name in self.FINGERED:
+            structure = _new(name)
+            for key in range(100):
+                structure.finger_insert(key)
+            structure.stats = Stats()
+            for key in range(100, 1100):
+                structure.finger_insert(key)
+            with self.subTest(structure = name):
+                self.assertEqual(structure.stats.operations, 1000)
+                self.assert_matches(structure, range(1100))
+                if name != "skip_list":
+                    self.assertEqual(structure.stats.comparisons, 1000)
+
+class SplitJoinTest(StructureTest):
+    SPLITTABLE = ("avl", "rb")
+
+    def test_split(self):
+        keys = _random_keys(2000, 500, seed = 24)
+        for name in self.SPLITTABLE:
+            for at in (-1, 0, 137, 250, 499, 600):
+                structure = _new(name)
+                for key in keys:
+                    structure.insert(key)
+                low, high = structure.split(at)
+                with self.subTest(structure = name, key = at):
+                    self.assert_matches(low, [key for key in keys if key < at])
+                    self.assert_matches(high, [key for key in keys if key >= at])
+                    self.assertEqual(len(structure), 0)
+
+    def test_join(self):
+        rng = Random(24)
+        for name in self.SPLITTABLE:
+            cls = STRUCTURES[name][0]
+            # trees of very different heights are joined down the taller spine
+            for left_size, right_size in ((0, 0), (0, 50), (50, 0), (1000, 3), (3, 1000), (400, 400)):
+                left_keys = sorted(rng.randrange(1000) for _ in range(left_size))
+                right_keys = sorted(rng.randrange(1001, 2000) for _ in range(right_size))
+                left = _new(name)
+                right = _new(name)
+                for key in left_keys:
+                    left.insert(key)
+                for key in right_keys:
+                    right.insert(key)
+                joined = cls.join(left, 1000, right)
+                with self.subTest(structure = name, sizes = (left_size, right_size)):
+                    self.assert_matches(joined, left_keys + [1000] + right_keys)
+                    self.assertEqual(len(left) + len(right), 0)
+            with self.subTest(structure = name, case = "key out of place"):
+                left = _from_sorted(name, [1, 2, 3])
+                with self.assertRaises(ValueError):
+                    cls.join(left, 2, _from_sorted(name, [5]))
+
+    def test_split_then_join(self):
+        keys = _random_keys(3000, 10 ** 6, seed = 25)
+        for name in self.SPLITTABLE:
+            cls = STRUCTURES[name][0]
+            structure = _new(name)
+            for key in keys:
+                structure.insert(key)
+            low, high = structure.split(500000)
+            middle = min(high)
+            high.delete(middle)
+            with self.subTest(structure = name):
+                self.assert_matches(cls.join(low, middle, high), keys)
+
+    def test_mismatched_types(self):
+        with self.assertRaises(TypeError):
+            AVLTree.join(_new("rb"), 1, _new("rb"))
+        with self.assertRaises(TypeError):
+            AVLTree.join(_new("avl"), 1, _new("rb"))
+        with self.assertRaises(TypeError):
+            _new("avl").union(_new("rb"))
+        with self.assertRaises(TypeError):
+            _new("rb").intersection(_new("avl"))
+        with self.assertRaises(TypeError):
+            _new("skip_list").difference(_new("avl"))
+
+class SetOperationTest(StructureTest):
+    OPERATED = ("avl", "rb", "skip_list")
+    # this many keys against this many, the small side below the sixteenth
+    # that union simply inserts
+    SIZES = ((0, 0), (2000, 0), (0, 2000), (2000, 2000), (3000, 100), (100, 3000), (5000, 50))
+
+    def _operands(self, name, size, other_size, seed):
+        keys = _random_keys(size, 4000, seed = seed)
+        other_keys = _random_keys(other_size, 4000, seed = seed + 1)
+        structure = _new(name)
+        other = _new(name)
+        for key in keys:
+            structure.insert(key)
+        for key in other_keys:
+            other.insert(key)
+        return structure, keys, other, other_keys
+
+    @staticmethod
+    def _intersection(keys, other_keys):
+        kept = set(other_keys)
+        return [key for key in keys if key in kept]
+
+    @staticmethod
+    def _difference(keys, other_keys):
+        removed = set(other_keys)
+        return [key for key in keys if key not in removed]
+
+    def _check(self, operation, expected, processes = None):
+        options = {} if processes is None else {"processes": processes}
+        for name in self.OPERATED:
+            if processes is not None and name == "skip_list":
+                continue
+            for size, other_size in self.SIZES:
+                structure, keys, other, other_keys = self._operands(name, size, other_size, size)
+                getattr(structure, operation)(other, **options)
+                with self.subTest(structure = name, sizes = (size, other_size)):
+                    self.assert_matches(structure, expected(keys, other_keys))
+                    self.assertEqual(len(other), 0)
+                    self.assertEqual(list(other), [])
+
+    def test_union(self):
+        self._check("union", lambda keys, other_keys: keys + other_keys)
+
+    def test_intersection(self):
+        self._check("intersection", self._intersection)
+
+    def test_difference(self):
+        self._check("difference", self._difference)
+
+    def test_in_processes(self):
+        self._check("union", lambda keys, other_keys: keys + other_keys, processes = 2)
+        self._check("difference", self._difference, processes = 3)
+
+class AsyncIndexTest(unittest.TestCase):
+    def test_unorderable_batch_resolves_every_future(self):
+        async def main():
+            index = AsyncIndex(AVLTree.from_sorted(range(10)), window = 0.001)
+            return await asyncio.wait_for(
+                asyncio.gather(index.contains(3), index.contains("3"), index.contains(11),
+                               return_exceptions = True), 1)
+
+        found, failed, missing = asyncio.run(main())
+        self.assertIs(found, True)
+        self.assertIsInstance(failed, TypeError)
+        self.assertIs(missing, False)
+
+    def test_batch_sorted_by_index_ordering(self):
+        async def main():
+            reverse = SkipList(cmp = lambda a, b: (a < b) - (a > b), seed = 0)
+            index = AsyncIndex(reverse, window = 0.001)
+            await asyncio.gather(*(index.insert(key) for key in (2, 5, 1, 4)))
+            return list(reverse), await index.range(5, 1)
+
+        self.assertEqual(asyncio.run(main()), ([5, 4, 2, 1], [5, 4, 2]))
+
+    def test_cancelled_requests_are_not_applied(self):
+        async def main():
+            tree = AVLTree()
+            index = AsyncIndex(tree, window = 0.001)
+            cancelled = asyncio.create_task(index.insert(5))
+            kept = asyncio.create_task(index.insert(6))
+            # both are queued, then one caller gives up before the batch runs
+            await asyncio.sleep(0)
+            cancelled.cancel()
+            await kept
+            return list(tree), index.requests, cancelled.cancelled()
+
+        self.assertEqual(asyncio.run(main()), ([6], 1, True))
+
+    def test_blank_line_gets_an_error_reply(self):
+        async def main():
+            server = await serve(AsyncIndex(AVLTree(), window = 0))
+            async with server:
+                reader, writer = await asyncio.open_connection(*server.sockets[0].getsockname())
+                writer.write(b"\n  \ninsert 4\ncontains 4\n")
+                replies = [await reader.readline() for _ in range(4)]
+                writer.close()
+                await writer.wait_closed()
+            return replies
+
+        self.assertEqual(asyncio.run(main()),
+                         [b"error empty command\n", b"error empty command\n", b"ok\n", b"1\n"])
+
+class ConcurrentSkipListTest(unittest.TestCase):
+    def setUp(self):
+        # switch threads often so that writers interleave inside insert and delete
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        self.addCleanup(sys.setswitchinterval, interval)
+
+    def test_concurrent_writers_and_readers(self):
+        writers, readers, keys_per_writer = 4, 4, 3000
+        skip_list = ConcurrentSkipList(seed = 0)
+        errors = []
+        remaining = []
+        done = []
+
+        def write(offset):
+            keys = list(range(offset, writers * keys_per_writer, writers))
+            Random(offset).shuffle(keys)
+            for key in keys:
+                if not skip_list.insert(key):
+                    errors.append(("insert", key))
+            for key in keys[::2]:
+                if not skip_list.delete(key):
+                    errors.append(("delete", key))
+            remaining.extend(keys[1::2])
+
+        def read():
+            while not done:
+                previous = None
+                for value in skip_list:
+                    if previous is not None and value <= previous:
+                        errors.append(("order", previous, value))
+                    previous = value
+
+        reader_threads = [Thread(target = read) for _ in range(readers)]
+        writer_threads = [Thread(target = write, args = (offset,)) for offset in range(writers)]
+        for thread in reader_threads + writer_threads:
+            thread.start()
+        for thread in writer_threads:
+            thread.join()
+        done.append(True)
+        for thread in reader_threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(list(skip_list), sorted(remaining))
+        self.assertEqual(len(skip_list), len(remaining))
+
+    def test_racing_inserts_of_one_value_add_it_once(self):
+        skip_list = ConcurrentSkipList(seed = 0)
+        threads = 8
+        barrier = Barrier(threads)
+        added = []
+
+        def insert():
+            barrier.wait()
+            added.extend(skip_list.insert(key) for key in range(200))
+
+        workers = [Thread(target = insert) for _ in range(threads)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        self.assertEqual(added.count(True), 200)
+        self.assertEqual(list(skip_list), list(range(200)))
+        self.assertEqual(len(skip_list), 200)
+
+class PersistentTreeTest(unittest.TestCase):
+    UPDATES = ("delete", "delete_steps_and_rotations", "insertion_steps_and_rotation",
+               "finger_insert", "split", "union", "intersection", "difference")
+
+    def test_in_place_updates_raise_type_error(self):
+        for cls in (PersistentAVLTree, PersistentRedBlackTree):
+            tree = cls().insert(1).insert(2)
+            for update in self.UPDATES:
+                with self.subTest(cls = cls.__name__, update = update):
+                    with self.assertRaises(TypeError):
+                        getattr(tree, update)(1)
+            with self.assertRaises(TypeError):
+                cls.join(cls(), 0, tree)
+            self.assertEqual(list(tree), [1, 2])
+
+    def test_insert_leaves_old_versions_alone(self):
+        for cls in (PersistentAVLTree, PersistentRedBlackTree):
+            versions = [cls()]
+            for key in (5, 3, 8, 1, 4, 7, 9, 2, 6):
+                versions.append(versions[-1].insert(key))
+            for count, version in enumerate(versions):
+                self.assertEqual(list(version), sorted((5, 3, 8, 1, 4, 7, 9, 2, 6)[:count]))
+                self.assertTrue(version.validate())
+
+class _NoInsertTree(AVLTree):
+    def insert(self, key):
+        raise ValueError(f"cannot insert {key}")
+
+class ShardedIndexTest(unittest.TestCase):
+    def test_shard_errors_are_raised_in_the_caller(self):
+        with ShardedIndex(2, _NoInsertTree) as index:
+            index.build(range(100))
+            with self.assertRaisesRegex(ValueError, "cannot insert"):
+                index.insert_many([3, 70])
+            # the shards are still there and in step
+            self.assertEqual(len(index), 100)
+            self.assertEqual(index.search_many([3, 70, 500]), [True, True, False])
+
+    def test_unknown_operation_gets_an_error_reply(self):
+        with ShardedIndex(2) as index:
+            index.build(range(10))
+            index._connections[1].send(("compact",))
+            with self.assertRaisesRegex(ValueError, "unknown shard operation"):
+                index._gather([1])
+            self.assertEqual(index.range(0, 10), list(range(10)))
+
+class DurableIndexTest(unittest.TestCase):
+    def test_open_removes_temporary_snapshots(self):
+        with TemporaryDirectory() as directory:
+            with DurableIndex(directory) as index:
+                for key in range(100):
+                    index.insert(key)
+                index.checkpoint()
+                index.insert(500)
+            # as left by a crash in the middle of the next checkpoint
+            with open(os.path.join(directory, "snapshot-2.snap.tmp"), "wb") as file:
+                file.write(b"torn")
+            with DurableIndex(directory) as index:
+                self.assertEqual(list(index), list(range(100)) + [500])
+            self.assertEqual(sorted(os.listdir(directory)), ["snapshot-1.snap", "wal-1.log"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,260 @@
+"""
+Write-ahead logging so that inserted keys survive a crash.
+"""
+import os
+import struct
+from array import array
+from pathlib import Path
+from time import perf_counter
+from zlib import crc32
+from avl import AVLTree
+
+# magic, number of keys, crc32 of the keys
+RECORD = struct.Struct("<4sII")
+MAGIC = b"WAL1"
+
+def sync_directory(path):
+    """
+    Fsyncs a directory, so that files created, renamed or removed in it
+    survive a crash.
+    """
+    descriptor = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(descriptor)
+    finally:
+        os.close(descriptor)
+
+class WriteAheadLog:
+    """
+    Append-only log of inserted keys with group commit. Keys are buffered
+    and written as one checksummed record, followed by a single fsync, once
+    batch_size keys are waiting or flush_interval seconds have passed since
+    the last commit, so the cost of the fsync is shared by the whole batch.
+
+    A key is durable once durable_sequence has reached the sequence number
+    append returned for it; call commit() to force that.
+    """
+    def __init__(self, path, batch_size = 4096, flush_interval = 0.01, sequence = 0):
+        """
+        Parameters:
+        - path: The log file, created if missing and appended to otherwise.
+        - batch_size (int): The number of buffered keys that forces a commit.
+        - flush_interval (float): The seconds after which buffered keys are
+        committed by the next append.
+        - sequence (int): The sequence number to continue from.
+        """
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        created = not os.path.exists(path)
+        self._file = open(path, "ab")
+        if created:
+            sync_directory(os.path.dirname(os.path.abspath(path)))
+        self._pending = array("q")
+        self._last_commit = perf_counter()
+        # number of keys appended, and how many of them are on disk
+        self.sequence = sequence
+        self.durable_sequence = sequence
+
+    def append(self, key):
+        """
+        Logs one inserted key.
+
+        Parameters:
+        - key (int): The key, which must fit in 64 bits.
+
+        Returns:
+        The sequence number of the key.
+        """
+        self._pending.append(key)
+        self.sequence += 1
+        if (len(self._pending) >= self.batch_size
+                or perf_counter() - self._last_commit >= self.flush_interval):
+            self.commit()
+        return self.sequence
+
+    def commit(self):
+        """
+        Writes the buffered keys as one record and fsyncs the log.
+        """
+        if self._pending:
+            payload = self._pending.tobytes()
+            self._file.write(RECORD.pack(MAGIC, len(self._pending), crc32(payload)))
+            self._file.write(payload)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._pending = array("q")
+            self.durable_sequence = self.sequence
+        self._last_commit = perf_counter()
+
+    def close(self):
+        """
+        Commits the buffered keys and closes the log.
+        """
+        self.commit()
+        self._file.close()
+
+    @staticmethod
+    def replay(path):
+        """
+        Reads back every complete record of a log. A record torn by a crash
+        can only be the last one, and it and anything after it is ignored.
+
+        Parameters:
+        - path: The log file.
+
+        Returns:
+        A tuple containing an array of the logged keys, in the order they
+        were appended, and the length in bytes of the intact prefix of the
+        file.
+        """
+        keys = array("q")
+        with open(path, "rb") as file:
+            data = file.read()
+        offset = 0
+        while offset + RECORD.size <= len(data):
+            magic, count, checksum = RECORD.unpack_from(data, offset)
+            end = offset + RECORD.size + 8 * count
+            payload = data[offset + RECORD.size:end]
+            if magic != MAGIC or end > len(data) or crc32(payload) != checksum:
+                break
+            keys.frombytes(payload)
+            offset = end
+        return keys, offset
+
+class DurableIndex:
+    """
+    Wraps an index so that every insert is logged before it is applied.
+
+    The directory holds the latest snapshot and the logs written since. On
+    start the snapshot is loaded, the logs are replayed in one bulk_insert
+    and any temporary file left by a crashed checkpoint is removed;
+    checkpoint() writes a new snapshot and drops the logs it covers. Files
+    are numbered by generation: snapshot-G covers every log older than G,
+    so a crash at any point of a checkpoint leaves either the old or the
+    new snapshot with all the logs it still needs.
+
+    Only inserts are logged, and keys must be integers that fit in 64 bits.
+    """
+    def __init__(self, directory, structure = AVLTree, batch_size = 4096, flush_interval = 0.01):
+        """
+        Parameters:
+        - directory: Where the snapshot and logs are kept, created if missing.
+        - structure: The index class, one with load, save and bulk_insert
+        such as AVLTree, RedBlackTree or SkipList.
+        - batch_size, flush_interval: The group commit settings of the log.
+        """
+        self.directory = Path(directory)
+        self.directory.mkdir(parents = True, exist_ok = True)
+        self.structure = structure
+        self._log_options = {"batch_size": batch_size, "flush_interval": flush_interval}
+
+        # a checkpoint that crashed while saving leaves its temporary file
+        for path in self.directory.glob("snapshot-*.snap.tmp"):
+            path.unlink()
+        self.generation = self._latest("snapshot-*.snap")
+        snapshot = self._snapshot_path(self.generation)
+        self.index = structure.load(snapshot) if snapshot.exists() else structure()
+        keys = array("q")
+        for generation in self._log_generations():
+            if generation < self.generation:
+                self._log_path(generation).unlink()
+                continue
+            logged, intact = WriteAheadLog.replay(self._log_path(generation))
+            keys.extend(logged)
+            # cut off a torn record so the log can be appended to again
+            os.truncate(self._log_path(generation), intact)
+        if keys:
+            self.index.bulk_insert(keys)
+
+        self.generation = max(self.generation, self._latest("wal-*.log"))
+        self.log = WriteAheadLog(self._log_path(self.generation), **self._log_options)
+
+    def _snapshot_path(self, generation):
+        return self.directory / f"snapshot-{generation}.snap"
+
+    def _log_path(self, generation):
+        return self.directory / f"wal-{generation}.log"
+
+    def _log_generations(self):
+        return sorted(int(path.stem.split("-")[1]) for path in self.directory.glob("wal-*.log"))
+
+    def _latest(self, pattern):
+        return max((int(path.stem.split("-")[1]) for path in self.directory.glob(pattern)),
+                   default = 0)
+
+    def insert(self, key):
+        """
+        Logs and inserts a key. The key is acknowledged, and survives a
+        crash, once durable_sequence reaches the returned sequence number.
+        Nothing commits in the background: a key stays buffered until a
+        later insert fills the batch or finds flush_interval passed, or
+        until commit() is called.
+
+        Returns:
+        The sequence number of the key, counting from when the index was
+        opened.
+        """
+        sequence = self.log.append(key)
+        self.index.insert(key)
+        return sequence
+
+    @property
+    def durable_sequence(self):
+        """
+        The sequence number of the last key that is on disk.
+        """
+        return self.log.durable_sequence
+
+    def commit(self):
+        """
+        Makes every insert so far durable.
+        """
+        self.log.commit()
+
+    def checkpoint(self):
+        """
+        Writes a snapshot of the index and removes the logs it covers, so
+        the next recovery has less to replay.
+        """
+        # a new log first: if the snapshot never makes it to disk the old
+        # snapshot and both logs still hold everything
+        self.log.close()
+        self.generation += 1
+        self.log = WriteAheadLog(self._log_path(self.generation), sequence = self.log.sequence,
+                                 **self._log_options)
+        self.index.save(self._snapshot_path(self.generation))
+        sync_directory(self.directory)
+        for path in self.directory.glob("snapshot-*.snap"):
+            if int(path.stem.split("-")[1]) < self.generation:
+                path.unlink()
+        for generation in self._log_generations():
+            if generation < self.generation:
+                self._log_path(generation).unlink()
+
+    def close(self):
+        """
+        Commits and closes the log.
+        """
+        self.log.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return len(self.index)
+
+    def __iter__(self):
+        return iter(self.index)
+
+    def search(self, key):
+        """
+        Search for a key in the index.
+
+        Returns:
+        - True if found and False if otherwise
+        """
+        return self.index.search(key)